@@ -8,6 +8,7 @@ function App() {
   const [mode, setMode] = useState("");
   const [dragOver, setDragOver] = useState(false);
   const [isLoading, setIsLoading] = useState(false);
+  const [progress, setProgress] = useState([]);
   const [result, setResult] = useState(null);
   const [popupImageIndex, setPopupImageIndex] = useState(null);
   const [customGraphLimit, setCustomGraphLimit] = useState("");
@@ -53,6 +54,18 @@ function App() {
     setMode(value);
   };
 
+  const waitForJob = async (jobId) => {
+    while (true) {
+      await new Promise((resolve) => setTimeout(resolve, 2000));
+      const response = await fetch(`${BASE_URL}/jobs/${jobId}`);
+      if (!response.ok) throw new Error("Job status request failed.");
+      const job = await response.json();
+      setProgress(job.stages);
+      if (job.status === "done") return job.result;
+      if (job.status === "failed") throw new Error(job.error);
+    }
+  };
+
   const handleSubmit = async () => {
     if (!selectedFile || !mode) {
       alert("Please select a video file and an option.");
@@ -63,6 +76,7 @@ function App() {
     formData.append("video", selectedFile);
     formData.append("mode", mode);
     setIsLoading(true);
+    setProgress([]);
     setResult(null);
     setCustomGraphUrl(null);
 
@@ -73,9 +87,15 @@ function App() {
       });
 
       if (response.ok) {
-        const data = await response.json();
+        let data = await response.json();
+        // שרת ה-Python מחזיר jobId מיד - ממתינים עד שהעבודה מסתיימת
+        if (data.jobId) {
+          data = await waitForJob(data.jobId);
+        }
         console.log("📹 Video path:", data.video);
         setResult({ ...data, mode }); // 🧠 שומר את מצב המצב
+      } else if (response.status === 503) {
+        alert("The server is busy, please try again in a few minutes.");
       } else {
         alert("Upload failed.");
       }
@@ -186,7 +206,9 @@ function App() {
 
       <div className="buttons">
         <button onClick={handleSubmit} disabled={isLoading}>
-          {isLoading ? "Processing..." : "Submit"}
+          {isLoading
+            ? `Processing...${progress.length ? ` (${progress[progress.length - 1]} done)` : ""}`
+            : "Submit"}
         </button>
         <button onClick={handleClear}>Clear</button>
       </div>
@@ -1,82 +1,63 @@
 import pandas as pd
-import numpy as np
 import os
 import sys
-
-def classify_speed(avg_velocity):
-    if avg_velocity < 4:
-        return "slow"
-    elif avg_velocity < 12:
-        return "medium"
-    else:
-        return "fast"
-
-def compute_curvature_deviation(points):
-    if len(points) < 3:
-        return 0.0
-    p0, p1 = points[0], points[-1]
-    line_vec = p1 - p0
-    line_len = np.linalg.norm(line_vec)
-    if line_len == 0:
-        return 0.0
-    unit_line_vec = line_vec / line_len
-    deviations = []
-    for pt in points:
-        vec = pt - p0
-        projection_len = np.dot(vec, unit_line_vec)
-        proj_point = p0 + projection_len * unit_line_vec
-        deviation = np.linalg.norm(pt - proj_point)
-        deviations.append(deviation)
-    return round(np.mean(deviations), 2)
-
-def extract_tracks_summary_readable(csv_path, video_name, output_path):
-    df = pd.read_csv(csv_path)
-
+from track_kinematics import compute_track_kinematics
+from track_table_io import read_table
+
+def _readable_columns(df, starts):
+    """
+    Build the per-track text columns (coordinates, frames_present, velocity_by_frames).
+    Only needed for the human-readable CSV.
+    """
+    xs = df["x_center"].tolist()
+    ys = df["y_center"].tolist()
+    frames = df["frame"].tolist()
+    velocities = df["velocity"].tolist()
+    bounds = list(starts[1:]) + [len(df)]
+
+    coordinates, frames_present, velocity_by_frames = [], [], []
+    for start, end in zip(starts, bounds):
+        coordinates.append(" , ".join([f"({round(x, 1)}, {round(y, 1)})" for x, y in zip(xs[start:end], ys[start:end])]))
+        frames_present.append(", ".join(map(str, frames[start:end])))
+        velocity_by_frames.append([
+            (frames[i - 1], frames[i], round(velocities[i], 2))
+            for i in range(start + 1, end)
+            if not pd.isna(velocities[i])
+        ])
+    return coordinates, frames_present, velocity_by_frames
+
+def summarize_tracks(df, video_name, readable=True):
+    """
+    Build the per-track summary table, plus mean rows per speed category.
+
+    Args:
+        df (pd.DataFrame): Tracks with frame, track_id, x_center, y_center columns.
+        video_name (str): Name written into the video_name column.
+        readable (bool): Add the text columns (coordinates, frames_present,
+                         velocity_by_frames) of the human-readable CSV.
+
+    Returns:
+        pd.DataFrame: Per-track rows followed by the mean_<category> rows.
+    """
     required_cols = {"frame", "track_id", "x_center", "y_center"}
     if not required_cols.issubset(df.columns):
         raise ValueError(" חסרות עמודות דרושות בקובץ הקלט")
 
-    df = df.sort_values(by=["track_id", "frame"]).reset_index(drop=True)
-    df[['dx', 'dy']] = df.groupby('track_id')[['x_center', 'y_center']].diff()
-    df['velocity'] = np.sqrt(df['dx']**2 + df['dy']**2)
-
-    output_data = []
-
-    for track_id, group in df.groupby("track_id"):
-        group_sorted = group.sort_values("frame")
-        avg_velocity = group_sorted["velocity"].mean()
-        max_velocity = group_sorted["velocity"].max()
-        speed_category = classify_speed(avg_velocity)
-
-        frames = group_sorted["frame"].tolist()
-        velocities = group_sorted["velocity"].tolist()
-        velocity_by_frames = []
-        for i in range(1, len(frames)):
-            v = velocities[i]
-            if not pd.isna(v):
-                velocity_by_frames.append((frames[i-1], frames[i], round(v, 2)))
-
-        coords = list(zip(group_sorted["x_center"], group_sorted["y_center"]))
-        coord_str = " , ".join([f"({round(x, 1)}, {round(y, 1)})" for x, y in coords])
-        frames_str = ", ".join(map(str, frames))
-        duration = len(set(frames))
-        curvature = compute_curvature_deviation(np.array(coords))
-
-        output_data.append({
-            "track_id": track_id,
-            "coordinates": coord_str,
-            "duration_frames": duration,
-            "frames_present": frames_str,
-            "velocity_by_frames": velocity_by_frames,
-            "avg_velocity": round(avg_velocity, 2),
-            "max_velocity": round(max_velocity, 2),
-            "speed_category": speed_category,
-            "curvature_deviation": curvature,
-            "video_name": video_name
-        })
-
-    # הפיכה ל־DataFrame
-    output_df = pd.DataFrame(output_data)
+    df, starts, kinematics = compute_track_kinematics(df)
+
+    output_df = pd.DataFrame({"track_id": kinematics["track_id"]})
+    if readable:
+        coordinates, frames_present, velocity_by_frames = _readable_columns(df, starts)
+        output_df["coordinates"] = coordinates
+    output_df["duration_frames"] = kinematics["duration_frames"]
+    if readable:
+        output_df["frames_present"] = frames_present
+        output_df["velocity_by_frames"] = velocity_by_frames
+    output_df["avg_velocity"] = kinematics["avg_velocity"].round(2)
+    output_df["max_velocity"] = kinematics["max_velocity"].round(2)
+    output_df["speed_category"] = kinematics["speed_category"]
+    output_df["curvature_deviation"] = kinematics["curvature_deviation"].round(2)
+    output_df["video_name"] = video_name
 
     # טבלת ממוצעים לפי קטגוריה
     summary_rows = []
@@ -99,7 +80,10 @@ def extract_tracks_summary_readable(csv_path, video_name, output_path):
 
     # סדר עמודות אחיד ואיחוד עם הטבלה הראשית
     summary_df = summary_df[output_df.columns]
-    final_df = pd.concat([output_df, summary_df], ignore_index=True)
+    return pd.concat([output_df, summary_df], ignore_index=True)
+
+def extract_tracks_summary_readable(csv_path, video_name, output_path):
+    final_df = summarize_tracks(read_table(csv_path), video_name)
 
     # שמירה לקובץ
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
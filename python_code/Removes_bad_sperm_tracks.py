@@ -1,52 +1,92 @@
-import pandas as pd
 import numpy as np
 import os
 import sys
+from track_table_io import ensure_centers, read_table, write_table
 
 # ⚙️ פרמטרים כלליים
 MAX_ANGLE = 120  # זווית חדה מדי תגרום לחיתוך המסלול
 MIN_FRAMES = 3   # רק מסלולים עם לפחות X פריימים ייכנסו לפלט
 
-def cut_track_by_angle(points, group_sorted, angle_thresh=MAX_ANGLE):
-    deltas = np.diff(points, axis=0)
-    speeds = np.linalg.norm(deltas, axis=1)
-    unit_deltas = deltas / (speeds[:, None] + 1e-6)
+def filter_tracks(df, max_angle=MAX_ANGLE, min_frames=MIN_FRAMES):
+    """
+    Cut every track at its first sharp turn and drop tracks that end up too short.
 
-    for i in range(len(unit_deltas) - 1):
-        dot = np.dot(unit_deltas[i], unit_deltas[i+1])
-        angle_rad = np.arccos(np.clip(dot, -1.0, 1.0))
-        angle_deg = np.degrees(angle_rad)
-        if angle_deg > angle_thresh:
-            return group_sorted.iloc[:i + 2]  # חותך עד לנקודה שלפני הזווית החריפה
-    return group_sorted
+    Args:
+        df (pd.DataFrame): Tracked boxes with frame, track_id, x1, y1, x2, y2 columns.
+        max_angle (float): Turning angle (degrees) above which a track is cut.
+        min_frames (int): Minimum number of rows a track needs to be kept.
 
-def filter_tracks_by_angle(input_csv, output_csv):
-    if not os.path.exists(input_csv):
-        raise FileNotFoundError(f"Input file not found: {input_csv}")
+    Returns:
+        pd.DataFrame: Surviving rows with x_center/y_center added (may be empty).
+    """
+    # מרכזי התיבות נשמרים כבר בטבלת המסלולים; מחושבים רק אם חסרים
+    df = ensure_centers(df)
+
+    # מיון אחד של כל הטבלה לפי (track_id, frame) - כל מסלול הוא קטע רציף
+    df = df.sort_values(by=["track_id", "frame"], kind="stable")
+    keep = angle_cut_mask(df["track_id"].to_numpy(),
+                          df[["x_center", "y_center"]].to_numpy(),
+                          max_angle, min_frames)
+    return df[keep]
+
+def angle_cut_mask(track_ids, points, max_angle=MAX_ANGLE, min_frames=MIN_FRAMES):
+    """
+    Which rows of a (track_id, frame)-sorted table survive the angle filter.
+
+    The turning angle at every inner point of a track (between the step into it
+    and the step out of it) is computed in one pass. Each track is cut right
+    after the point of its first turn sharper than max_angle, so that point is
+    the last one kept, and tracks shorter than min_frames (before or after the
+    cut) are dropped.
 
-    df = pd.read_csv(input_csv)
+    Args:
+        track_ids (np.ndarray): Track ID per row, rows grouped by track and sorted by frame.
+        points (np.ndarray): (n, 2) centers per row.
+        max_angle (float): Turning angle (degrees) above which a track is cut.
+        min_frames (int): Minimum number of rows a track needs to be kept.
 
-    # חישוב מרכזי תיבות
-    df["x_center"] = (df["x1"] + df["x2"]) / 2
-    df["y_center"] = (df["y1"] + df["y2"]) / 2
+    Returns:
+        np.ndarray: Boolean mask of the rows that survive.
+    """
+    n = len(track_ids)
+    if n == 0:
+        return np.zeros(0, dtype=bool)
 
-    valid_tracks = []
-    for track_id, group in df.groupby("track_id"):
-        group_sorted = group.sort_values("frame")
-        points = group_sorted[["x_center", "y_center"]].to_numpy()
+    first_row = np.r_[True, track_ids[1:] != track_ids[:-1]]
+    last_row = np.r_[first_row[1:], True]
+    starts = np.flatnonzero(first_row)
+    counts = np.diff(np.append(starts, n))
+    position = np.arange(n) - np.repeat(starts, counts)
 
-        if len(points) < MIN_FRAMES:
-            continue
+    # וקטור יחידה של הצעד שמגיע לכל שורה (לא מוגדר בשורה הראשונה של מסלול)
+    deltas = np.diff(points, axis=0, prepend=points[:1])
+    speeds = np.linalg.norm(deltas, axis=1)
+    unit_deltas = deltas / (speeds[:, None] + 1e-6)
+
+    # זווית הפנייה בנקודה r: בין הצעד שנכנס אליה לצעד שיוצא ממנה
+    incoming = unit_deltas[:-1]
+    outgoing = unit_deltas[1:]
+    dot = incoming[:, 0] * outgoing[:, 0] + incoming[:, 1] * outgoing[:, 1]
+    angle_deg = np.degrees(np.arccos(np.clip(dot, -1.0, 1.0)))
+    sharp = np.zeros(n, dtype=bool)
+    sharp[:-1] = (angle_deg > max_angle) & ~first_row[:-1] & ~last_row[:-1]
+
+    # מיקום החיתוך הראשון בכל מסלול (ברירת מחדל: סוף המסלול)
+    cut_position = np.where(sharp, position, n)
+    first_cut = np.minimum.reduceat(cut_position, starts)
+    kept_length = np.minimum(first_cut + 1, counts)
 
-        partial_track = cut_track_by_angle(points, group_sorted)
-        if len(partial_track) >= MIN_FRAMES:
-            valid_tracks.append(partial_track)
+    long_enough = (counts >= min_frames) & (kept_length >= min_frames)
+    return np.repeat(long_enough, counts) & (position < np.repeat(kept_length, counts))
+
+def filter_tracks_by_angle(input_csv, output_csv):
+    if not os.path.exists(input_csv):
+        raise FileNotFoundError(f"Input file not found: {input_csv}")
 
-    os.makedirs(os.path.dirname(output_csv), exist_ok=True)
+    clean_df = filter_tracks(read_table(input_csv))
 
-    if valid_tracks:
-        clean_df = pd.concat(valid_tracks)
-        clean_df.to_csv(output_csv, index=False)
+    if not clean_df.empty:
+        write_table(clean_df, output_csv)
         print(f" Cleaned tracks saved to:\n{output_csv}")
     else:
         print(" No valid tracks found after filtering — result not saved.")
@@ -1,90 +1,268 @@
 import pandas as pd
 import numpy as np
+from scipy.spatial import cKDTree
 from scipy.spatial.distance import cdist
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
 import sys
 import os
+from track_store import TrackStore
+from track_table_io import ensure_centers, read_table, write_table, TRACK_SCHEMA
 
-def track_with_euclidean(input_csv, output_csv, distance_threshold=30):
+TRACK_COLUMNS = ['frame', 'track_id', 'x1', 'y1', 'x2', 'y2', 'x_center', 'y_center']
+TRACKER_MODES = ('greedy', 'hungarian', 'predictive')
+
+def track_detections(df, distance_threshold=30, mode='greedy', max_gap=2, velocity_gain=0.7):
+    """
+    Track detections held in memory using Euclidean distance between frames.
+
+    Args:
+        df (pd.DataFrame): YOLO detections with frame, x1, y1, x2, y2 columns.
+        distance_threshold (float): Maximum distance to consider match.
+        mode (str): "greedy" (nearest detection per track, in track order),
+                    "hungarian" (KD-tree gating + optimal assignment) or
+                    "predictive" (like hungarian, but gated on a constant-velocity
+                    prediction and tolerant to missed detections).
+        max_gap (int): predictive mode only - frames a track may go undetected
+                       before it is closed.
+        velocity_gain (float): predictive mode only - weight of the newly measured
+                               velocity against the previous estimate (1.0 = no smoothing).
+
+    Returns:
+        pd.DataFrame: Tracked boxes with columns frame, track_id, x1, y1, x2, y2.
+    """
+    tracker = make_tracker(mode, distance_threshold, max_gap, velocity_gain)
+    frames, boxes, centers = _detection_arrays(df)
+    frame_keys, starts = np.unique(frames, return_index=True)
+    ends = np.append(starts[1:], len(frames))
+
+    track_ids = np.zeros(len(frames), dtype=np.int64)
+    rows = []
+    for frame, start, end in zip(frame_keys, starts, ends):
+        ids, order = tracker.step(frame, centers[start:end])
+        track_ids[start:end] = ids
+        rows.append(start + order)
+
+    rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+    return _tracks_frame(frames[rows], track_ids[rows], boxes[rows], centers[rows])
+
+def make_tracker(mode='greedy', distance_threshold=30, max_gap=2, velocity_gain=0.7):
+    """
+    Online tracker for `mode` (see track_detections). Feed it one frame at a time
+    with tracker.step(frame, centers); frames without detections can be skipped.
+    """
+    if mode == 'greedy':
+        return GreedyTracker(distance_threshold)
+    if mode == 'hungarian':
+        return HungarianTracker(distance_threshold)
+    if mode == 'predictive':
+        return PredictiveTracker(distance_threshold, max_gap, velocity_gain)
+    raise ValueError(f"Unknown tracker mode: {mode}")
+
+def _detection_arrays(df):
+    """
+    Frame-sorted frames, boxes and centers of a detections table. Stored centers
+    are reused; they are only derived from the boxes when missing.
+    """
+    df = ensure_centers(df).sort_values(by='frame', kind='stable')
+    return (df['frame'].to_numpy(),
+            df[['x1', 'y1', 'x2', 'y2']].to_numpy(),
+            df[['x_center', 'y_center']].to_numpy())
+
+def _tracks_frame(frames, track_ids, boxes, centers):
+    return pd.DataFrame({
+        'frame': frames,
+        'track_id': track_ids,
+        'x1': boxes[:, 0],
+        'y1': boxes[:, 1],
+        'x2': boxes[:, 2],
+        'y2': boxes[:, 3],
+        'x_center': centers[:, 0],
+        'y_center': centers[:, 1],
+    }, columns=TRACK_COLUMNS)
+
+def gate_and_assign(track_centers, detections, distance_threshold):
+    """
+    Optimal one-to-one matching of tracks to detections closer than distance_threshold.
+
+    Candidate pairs come from a KD-tree, so only nearby pairs are ever scored.
+    The pairs are split into connected components and linear_sum_assignment runs
+    on each component separately; isolated pairs are matched directly.
+
+    Returns:
+        tuple: (track_idx, det_idx) arrays of the matched pairs.
+    """
+    empty = (np.empty(0, dtype=int), np.empty(0, dtype=int))
+    if len(track_centers) == 0 or len(detections) == 0:
+        return empty
+
+    pairs = cKDTree(track_centers).sparse_distance_matrix(
+        cKDTree(detections), distance_threshold, output_type='ndarray')
+    pairs = pairs[pairs['v'] < distance_threshold]
+    if len(pairs) == 0:
+        return empty
+
+    t_idx, d_idx, dist = pairs['i'], pairs['j'], pairs['v']
+    n_tracks = len(track_centers)
+    n_nodes = n_tracks + len(detections)
+    graph = coo_matrix((np.ones(len(pairs)), (t_idx, n_tracks + d_idx)), shape=(n_nodes, n_nodes))
+    _, labels = connected_components(graph, directed=False)
+    edge_comp = labels[t_idx]
+    edges_per_comp = np.bincount(edge_comp)
+
+    single = edges_per_comp[edge_comp] == 1
+    matched_t = [t_idx[single]]
+    matched_d = [d_idx[single]]
+
+    multi = ~single
+    if multi.any():
+        order = np.argsort(edge_comp[multi], kind='stable')
+        comp_t, comp_d, comp_dist = t_idx[multi][order], d_idx[multi][order], dist[multi][order]
+        bounds = np.flatnonzero(np.diff(edge_comp[multi][order])) + 1
+        for t, d, c in zip(np.split(comp_t, bounds), np.split(comp_d, bounds), np.split(comp_dist, bounds)):
+            rows, t_local = np.unique(t, return_inverse=True)
+            cols, d_local = np.unique(d, return_inverse=True)
+            # pairs outside the gate get a cost no valid matching would pick
+            cost = np.full((len(rows), len(cols)), distance_threshold * (len(rows) + len(cols)) + 1.0)
+            cost[t_local, d_local] = c
+            r, k = linear_sum_assignment(cost)
+            valid = cost[r, k] < distance_threshold
+            matched_t.append(rows[r[valid]])
+            matched_d.append(cols[k[valid]])
+
+    return np.concatenate(matched_t), np.concatenate(matched_d)
+
+class HungarianTracker:
+    """
+    Same track semantics as the greedy tracker (a track continues only from the
+    previous frame), but with optimal assignment and array-based track state.
+    """
+
+    def __init__(self, distance_threshold):
+        self.distance_threshold = distance_threshold
+        # live tracks = the detections of the previous frame, with their IDs
+        self.live_ids = np.empty(0, dtype=np.int64)
+        self.live_centers = np.empty((0, 2))
+        self.prev_frame = None
+        self.next_track_id = 1
+
+    def step(self, frame, detections):
+        """
+        Returns:
+            tuple: (track ID of every detection, output row order of the detections)
+        """
+        ids = np.zeros(len(detections), dtype=np.int64)
+
+        if self.prev_frame is not None and frame - self.prev_frame == 1:
+            t_match, d_match = gate_and_assign(self.live_centers, detections, self.distance_threshold)
+            ids[d_match] = self.live_ids[t_match]
+
+        new = ids == 0
+        ids[new] = np.arange(self.next_track_id, self.next_track_id + new.sum())
+        self.next_track_id += int(new.sum())
+
+        self.live_ids, self.live_centers, self.prev_frame = ids, detections, frame
+        return ids, np.arange(len(detections))
+
+class PredictiveTracker:
+    """
+    Gap-tolerant tracker: every live track is predicted forward with its velocity
+    (all tracks at once), detections are matched to the predictions, and a track
+    is only closed after more than max_gap frames without a detection.
+    """
+
+    def __init__(self, distance_threshold, max_gap, velocity_gain):
+        self.distance_threshold = distance_threshold
+        self.max_gap = max_gap
+        self.velocity_gain = velocity_gain
+        self.store = TrackStore()
+
+    def step(self, frame, detections):
+        store = self.store
+        store.retire_stale(frame - 1, self.max_gap)
+        ids = np.zeros(len(detections), dtype=np.int64)
+
+        t_match, d_match = gate_and_assign(store.predict(frame), detections, self.distance_threshold)
+        if len(t_match):
+            ids[d_match] = store.ids[t_match]
+            store.update(t_match, detections[d_match], frame, self.velocity_gain)
+
+        new = ids == 0
+        if new.any():
+            ids[new] = store.add_many(detections[new], frame)
+
+        return ids, np.arange(len(detections))
+
+class GreedyTracker:
+    """
+    The original tracker: every track (in creation order) takes its nearest
+    detection if it is closer than distance_threshold and still free.
+    Rows come out matched tracks first, then new tracks, as they always did.
+    """
+
+    def __init__(self, distance_threshold):
+        self.distance_threshold = distance_threshold
+        self.store = TrackStore()
+
+    def step(self, frame, detections):
+        store = self.store
+        ids = np.zeros(len(detections), dtype=np.int64)
+        assigned = np.zeros(len(detections), dtype=bool)
+        order = []
+
+        # tracks are matched in creation order, as long as they were seen in the previous frame
+        slots = store.live_slots()
+        slots = slots[frame - store.last_seen[slots] == 1]
+
+        if len(slots) and len(detections):
+            dists = cdist(store.centers[slots], detections)
+            nearest = np.argmin(dists, axis=1)
+
+            for row, slot in enumerate(slots):
+                d_idx = nearest[row]
+                if dists[row, d_idx] < self.distance_threshold and not assigned[d_idx]:
+                    ids[d_idx] = store.ids[slot]
+                    store.update(slot, detections[d_idx], frame)
+                    assigned[d_idx] = True
+                    order.append(d_idx)
+
+        for idx in np.flatnonzero(~assigned):
+            ids[idx] = store.add(detections[idx], frame)
+            order.append(idx)
+
+        # a track that missed this frame is locked for good
+        store.retire_stale(frame)
+        return ids, np.array(order, dtype=np.int64)
+
+def track_with_euclidean(input_csv, output_csv, distance_threshold=30, mode='greedy'):
     """
     Perform simple object tracking using Euclidean distance between frames.
 
     Args:
-        input_csv (str): Path to CSV containing YOLO detections.
-        output_csv (str): Path to save the tracked results.
+        input_csv (str): Path to the YOLO detections (.csv, .parquet or .cols).
+        output_csv (str): Path to save the tracked results (.csv, .parquet or .cols).
         distance_threshold (float): Maximum distance to consider match.
+        mode (str): Tracker mode, see TRACKER_MODES.
     """
     if not os.path.exists(input_csv):
         raise FileNotFoundError(f"Input CSV not found: {input_csv}")
 
-    df = pd.read_csv(input_csv)
-    df['x_center'] = (df['x1'] + df['x2']) / 2
-    df['y_center'] = (df['y1'] + df['y2']) / 2
-    df = df.sort_values(by='frame')
-
-    tracks = []
-    next_track_id = 1
-    results = []
-
-    for frame, group in df.groupby('frame'):
-        detections = group[['x_center', 'y_center']].values
-        assigned = [False] * len(detections)
-
-        active_tracks = [
-            t for t in tracks if not t['locked'] and (frame - t['last_seen_frame'] == 1)
-        ]
-
-        if active_tracks and len(detections) > 0:
-            track_centers = np.array([t['center'] for t in active_tracks])
-            dists = cdist(track_centers, detections)
-
-            used_detections = set()
-            for t_idx, track in enumerate(active_tracks):
-                d_idx = np.argmin(dists[t_idx])
-                if (
-                    dists[t_idx][d_idx] < distance_threshold
-                    and not assigned[d_idx]
-                    and d_idx not in used_detections
-                ):
-                    x1, y1, x2, y2 = group.iloc[d_idx][['x1', 'y1', 'x2', 'y2']]
-                    results.append([frame, track['id'], x1, y1, x2, y2])
-                    track['center'] = detections[d_idx]
-                    track['last_seen_frame'] = frame
-                    track['age'] += 1
-                    assigned[d_idx] = True
-                    used_detections.add(d_idx)
-
-        for idx, det in enumerate(detections):
-            if not assigned[idx]:
-                x1, y1, x2, y2 = group.iloc[idx][['x1', 'y1', 'x2', 'y2']]
-                results.append([frame, next_track_id, x1, y1, x2, y2])
-                tracks.append({
-                    'id': next_track_id,
-                    'center': det,
-                    'last_seen_frame': frame,
-                    'age': 1,
-                    'locked': False
-                })
-                next_track_id += 1
-
-        for trk in tracks:
-            if not trk['locked'] and (frame - trk['last_seen_frame'] > 0):
-                trk['locked'] = True
-
-    os.makedirs(os.path.dirname(output_csv), exist_ok=True)
-    results_df = pd.DataFrame(results, columns=['frame', 'track_id', 'x1', 'y1', 'x2', 'y2'])
-    results_df.to_csv(output_csv, index=False)
+    results_df = track_detections(read_table(input_csv), distance_threshold, mode)
+    write_table(results_df, output_csv, TRACK_SCHEMA)
     print(f" Tracking complete. Results saved to: {output_csv}")
     return output_csv
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python simple_euclidean.py <input_csv> <output_csv>")
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python simple_euclidean.py <input_csv> <output_csv> [greedy|hungarian|predictive]")
         sys.exit(1)
 
     input_csv_path = sys.argv[1]
     output_csv_path = sys.argv[2]
+    tracker_mode = sys.argv[3] if len(sys.argv) == 4 else 'greedy'
 
     try:
-        track_with_euclidean(input_csv_path, output_csv_path)
+        track_with_euclidean(input_csv_path, output_csv_path, mode=tracker_mode)
     except Exception as e:
         print(f" Error during tracking: {e}")
@@ -1,56 +1,86 @@
-import tifffile as tiff
-import cv2
 import os
+import itertools
+from lsm_frame_source import LsmFrames, iter_lsm_frames
+from parallel_frame_writer import write_frames_parallel
+from frame_prefilter import frame_statistics, BLANK_STD
 
-def run_split_lsm_to_frames(lsm_path, output_folder):
+# כמה פריימים נבדקים יחד לשחור
+BLANK_CHUNK = 32
+
+def _drop_blank(frames, blank_std, skipped):
+    # הסטטיסטיקה מחושבת על קבוצת פריימים בבת אחת; המספור המקורי נשמר
+    frames = enumerate(frames)
+    while True:
+        chunk = list(itertools.islice(frames, BLANK_CHUNK))
+        if not chunk:
+            return
+        blank = frame_statistics([frame for _, frame in chunk])['std'] < blank_std
+        for (i, frame), is_blank in zip(chunk, blank):
+            if is_blank:
+                skipped.append(i)
+            else:
+                yield i, frame
+
+def run_split_lsm_to_frames(lsm_path, output_folder, keep_frames=False, workers=None,
+                            compression=None, fmt="png", skip_blank=False, blank_std=BLANK_STD):
     """
     Converts an LSM file into a sequence of normalized PNG images.
 
     Args:
         lsm_path (str): Path to the LSM file.
         output_folder (str): Path to the folder where the frames will be saved.
+        keep_frames (bool): Also return the uint8 frames, for in-process callers, as
+                            an LsmFrames view that decodes them again when iterated
+                            (the stack is never held in memory).
+        workers (int): Number of parallel writers (defaults to the CPU count).
+        compression (int): PNG compression level 0-9, None for OpenCV's default.
+        fmt (str): "png", or "npy" for raw frames that only our own code reads.
+        skip_blank (bool): Do not write blank (black) frames. The other frames keep
+                           their numbers, so labels predicted on the folder still
+                           map to the right frame; the skipped numbers are returned.
+        blank_std (float): Frames whose std is below this count as blank.
 
     Returns:
-        dict: Summary of the process (success, number of frames, output folder)
+        dict: Summary of the process (success, number of frames, output folder,
+              "skipped_frames" when skip_blank is set, and "frames" when keep_frames is set)
     """
     if not os.path.exists(lsm_path):
         raise FileNotFoundError(f"LSM file not found at {lsm_path}")
 
-    try:
-        lsm_data = tiff.imread(lsm_path)
-    except Exception as e:
-        raise ValueError(f"Error loading LSM file: {e}")
-
-    if len(lsm_data.shape) == 4:
-        lsm_data = lsm_data.mean(axis=1)
+    source = iter_lsm_frames(lsm_path)
 
-    os.makedirs(output_folder, exist_ok=True)
+    skipped = []
+    if skip_blank:
+        source = _drop_blank(source, blank_std, skipped)
 
-    frame_count = 0
-    for i, frame in enumerate(lsm_data):
-        normalized_frame = cv2.normalize(frame, None, 0, 255, cv2.NORM_MINMAX).astype('uint8')
-        frame_filename = os.path.join(output_folder, f"frame_{i:04d}.png")
-        cv2.imwrite(frame_filename, normalized_frame)
-        frame_count += 1
+    frame_count = write_frames_parallel(source, output_folder, workers=workers,
+                                        compression=compression, fmt=fmt, indexed=skip_blank)
 
-    return {
+    result = {
         "success": True,
         "frames_saved": frame_count,
         "output_folder": output_folder
     }
+    if skip_blank:
+        result["skipped_frames"] = skipped
+        print(f"[INFO] Skipped {len(skipped)} blank frames")
+    if keep_frames:
+        result["frames"] = LsmFrames(lsm_path)
+    return result
 
 
 if __name__ == "__main__":
     import sys
-    if len(sys.argv) != 3:
-        print("Usage: python split_lsm_to_frames.py <input_lsm_path> <output_folder>")
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python split_lsm_to_frames.py <input_lsm_path> <output_folder> [workers]")
         sys.exit(1)
 
     input_lsm = sys.argv[1]
     output_dir = sys.argv[2]
+    workers = int(sys.argv[3]) if len(sys.argv) == 4 else None
 
     try:
-        result = run_split_lsm_to_frames(input_lsm, output_dir)
+        result = run_split_lsm_to_frames(input_lsm, output_dir, workers=workers)
         print(f"Success! {result['frames_saved']} frames saved to {result['output_folder']}")
     except Exception as e:
         print(f"Error: {e}")
@@ -0,0 +1,348 @@
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+import pandas as pd
+import tifffile as tiff
+
+from lsm_frame_source import iter_lsm_frames
+from out_of_model_yolov import detect_frames, DETECTION_DTYPE
+from Simple_Euclidean_Tracker import track_detections, TRACKER_MODES
+from Removes_bad_sperm_tracks import filter_tracks
+from From_csv_after_correction_to_final_data import summarize_tracks
+from main_video_of_test_track_algoritem import render_tracking_frames
+from graph_of_sperm_tracks import plot_tracks_df
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baselines.json")
+
+# גדלי וידאו סינתטי; כל סט נשמר ב-baseline בנפרד
+BENCHMARK_PRESETS = {
+    "small": {"num_cells": 20, "num_frames": 50},
+    "default": {"num_cells": 60, "num_frames": 200},
+    "crowded": {"num_cells": 200, "num_frames": 200, "speed_mean": 4.0, "false_positives": 3.0},
+}
+
+# זמן נחשב רגרסיה רק אם הוא גדול ב-25% וגם ב-5ms לפחות מה-baseline (רעש מדידה)
+TIME_TOLERANCE = 0.25
+TIME_MIN_DELTA = 0.005
+ACCURACY_TOLERANCE = 0.005
+LOWER_IS_BETTER = ("id_switches", "fragmentation")
+
+
+def host_fingerprint():
+    """
+    Identifies the machine a baseline's timings were measured on: wall-clock
+    times are only comparable on the same host (name, CPU and CPU count).
+    """
+    return f"{platform.node()}/{platform.processor() or platform.machine()}/{os.cpu_count()} CPUs"
+
+
+def generate_motility(num_cells=60, num_frames=200, width=256, height=256, speed_mean=3.0, speed_std=1.5,
+                      immotile_fraction=0.2, turn_std=0.25, jitter=0.5, miss_rate=0.02, false_positives=0.5,
+                      box_size=8, seed=0):
+    """
+    Simulate sperm-like motion and the detections a detector would report for it.
+
+    Every cell moves at its own speed (normal(speed_mean, speed_std), clipped at 0;
+    `immotile_fraction` of the cells do not move) with a heading that drifts by
+    normal(0, turn_std) radians per frame, bouncing off the frame edges.
+
+    Args:
+        jitter (float): Std of the detected center around the true one, in pixels.
+        miss_rate (float): Probability that a cell is not detected in a frame.
+        false_positives (float): Mean number of spurious detections per frame.
+        box_size (int): Side of the detection boxes, in pixels.
+        seed (int): Random seed; the same arguments always give the same video.
+
+    Returns:
+        dict: truth (DataFrame frame, cell_id, x, y), detections (DETECTION_DTYPE,
+              sorted by frame), cell_ids (cell of every detection, -1 for false
+              positives), width and height.
+    """
+    rng = np.random.default_rng(seed)
+    position = rng.uniform([box_size, box_size], [width - box_size, height - box_size], size=(num_cells, 2))
+    speed = np.clip(rng.normal(speed_mean, speed_std, num_cells), 0, None)
+    speed[rng.random(num_cells) < immotile_fraction] = 0.0
+    heading = rng.uniform(0, 2 * np.pi, num_cells)
+    low, high = np.array([0.0, 0.0]), np.array([width - 1.0, height - 1.0])
+
+    positions = np.empty((num_frames, num_cells, 2))
+    for frame in range(num_frames):
+        positions[frame] = position
+        heading += rng.normal(0, turn_std, num_cells)
+        position = position + speed[:, None] * np.column_stack([np.cos(heading), np.sin(heading)])
+        # השתקפות מהשוליים
+        over, under = position > high, position < low
+        position = np.where(over, 2 * high - position, np.where(under, 2 * low - position, position))
+        heading = np.where(over[:, 0] | under[:, 0], np.pi - heading, heading)
+        heading = np.where(over[:, 1] | under[:, 1], -heading, heading)
+
+    frame_col = np.repeat(np.arange(num_frames), num_cells)
+    cell_col = np.tile(np.arange(num_cells), num_frames)
+    truth = pd.DataFrame({"frame": frame_col, "cell_id": cell_col,
+                          "x": positions[..., 0].ravel(), "y": positions[..., 1].ravel()})
+
+    seen = rng.random(len(truth)) >= miss_rate
+    centers = positions.reshape(-1, 2)[seen] + rng.normal(0, jitter, (seen.sum(), 2))
+    n_false = rng.poisson(false_positives, num_frames)
+    false_frames = np.repeat(np.arange(num_frames), n_false)
+    false_centers = rng.uniform([0, 0], [width, height], size=(len(false_frames), 2))
+
+    frames = np.concatenate([frame_col[seen], false_frames])
+    cell_ids = np.concatenate([cell_col[seen], np.full(len(false_frames), -1)])
+    centers = np.concatenate([centers, false_centers])
+    order = np.argsort(frames, kind="stable")
+
+    detections = np.empty(len(order), dtype=DETECTION_DTYPE)
+    detections["frame"] = frames[order]
+    half = box_size / 2
+    detections["x1"], detections["y1"] = (centers[order] - half).T
+    detections["x2"], detections["y2"] = (centers[order] + half).T
+    detections["confidence"] = np.where(cell_ids[order] >= 0, 0.9, rng.uniform(0.25, 0.6, len(order)))
+    detections["class"] = 0
+    return {"truth": truth, "detections": detections, "cell_ids": cell_ids[order],
+            "width": width, "height": height}
+
+
+def render_synthetic_frames(video, background=20, background_noise=8.0, radius=3, seed=0):
+    """
+    Grayscale uint8 frames of a generate_motility video: noisy background with
+    one bright disc per cell.
+    """
+    rng = np.random.default_rng(seed)
+    truth = video["truth"]
+    frames = []
+    for _, cells in truth.groupby("frame", sort=True):
+        frame = rng.normal(background, background_noise, (video["height"], video["width"]))
+        frame = np.clip(frame, 0, 255).astype(np.uint8)
+        for x, y in zip(cells["x"].to_numpy(), cells["y"].to_numpy()):
+            cv2.circle(frame, (int(round(x)), int(round(y))), radius, 220, -1)
+        frames.append(frame)
+    return frames
+
+
+class _StubBoxes:
+    def __init__(self, xyxy):
+        self.xyxy = xyxy
+        self.conf = np.full(len(xyxy), 0.9, dtype=np.float32)
+        self.cls = np.zeros(len(xyxy), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.xyxy)
+
+
+class _StubResult:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+class StubDetector:
+    """
+    Stand-in for the YOLO model (same predict() interface as used by
+    out_of_model_yolov): reports one box per bright blob. Lets the detection
+    stage run without weights; its speed is not YOLO's, only the pipeline's.
+    """
+
+    def __init__(self, threshold=128):
+        self.threshold = threshold
+
+    def predict(self, source, **kwargs):
+        results = []
+        for image in source:
+            gray = image if image.ndim == 2 else image[..., 0]
+            n, _, stats, _ = cv2.connectedComponentsWithStats((gray > self.threshold).astype(np.uint8))
+            x, y, w, h = stats[1:n, :4].T
+            xyxy = np.column_stack([x, y, x + w, y + h]).astype(np.float32).reshape(-1, 4)
+            results.append(_StubResult(_StubBoxes(xyxy)))
+        return results
+
+
+def tracking_accuracy(tracks, video):
+    """
+    Compare tracks against the ground truth of a generate_motility video.
+
+    Every track point is mapped back to the cell its detection came from (by its box).
+
+    Returns:
+        dict: purity (share of track points belonging to their track's main cell),
+              coverage (share of true cell positions that ended up in a track),
+              id_switches (track changes along a cell's path, per cell),
+              fragmentation (distinct tracks per tracked cell) and
+              mostly_tracked (share of cells whose main track covers >= 80% of frames).
+    """
+    detections = video["detections"]
+    key_columns = ["frame", "x1", "y1", "x2", "y2"]
+    source = pd.DataFrame({name: detections[name] for name in key_columns})
+    source["cell_id"] = video["cell_ids"]
+    points = tracks[["track_id"] + key_columns].astype({name: np.float32 for name in key_columns[1:]})
+    points = points.merge(source.astype({"frame": points["frame"].dtype}), on=key_columns, how="left")
+    points["cell_id"] = points["cell_id"].fillna(-1).astype(int)
+
+    truth = video["truth"]
+    num_cells = truth["cell_id"].nunique()
+    if points.empty:
+        return {"purity": 0.0, "coverage": 0.0, "id_switches": 0.0, "fragmentation": 0.0, "mostly_tracked": 0.0}
+
+    counts = points.groupby(["track_id", "cell_id"]).size()
+    real = counts[counts.index.get_level_values("cell_id") >= 0]
+    purity = real.groupby(level="track_id").max().sum() / len(points)
+
+    cell_points = points[points["cell_id"] >= 0].sort_values(["cell_id", "frame"])
+    same_cell = cell_points["cell_id"].to_numpy()[1:] == cell_points["cell_id"].to_numpy()[:-1]
+    switched = cell_points["track_id"].to_numpy()[1:] != cell_points["track_id"].to_numpy()[:-1]
+    per_cell = cell_points.groupby("cell_id")["track_id"]
+    main_share = real.groupby(level="cell_id").max() / truth.groupby("cell_id").size()
+
+    return {
+        "purity": round(float(purity), 4),
+        "coverage": round(len(cell_points) / len(truth), 4),
+        "id_switches": round(float((same_cell & switched).sum()) / num_cells, 4),
+        "fragmentation": round(float(per_cell.nunique().mean()), 4),
+        "mostly_tracked": round(float((main_share.reindex(range(num_cells), fill_value=0) >= 0.8).mean()), 4),
+    }
+
+
+def time_call(fn, repeats=3):
+    """
+    Run fn() `repeats` times; returns (median seconds, last result).
+    """
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        seconds.append(time.perf_counter() - start)
+    return statistics.median(seconds), result
+
+
+def run_benchmarks(preset="default", repeats=3, **overrides):
+    """
+    Time every pipeline stage on a synthetic video and measure tracking accuracy.
+
+    Args:
+        preset (str): Name of a BENCHMARK_PRESETS entry.
+        repeats (int): Runs per timed function (the median is kept).
+        **overrides: generate_motility arguments replacing the preset's.
+
+    Returns:
+        dict: config, timings (stage -> median seconds) and accuracy (tracker -> metrics).
+    """
+    if preset not in BENCHMARK_PRESETS:
+        raise ValueError(f"Unknown benchmark preset: {preset}")
+    config = {**BENCHMARK_PRESETS[preset], **overrides}
+    video = generate_motility(**config)
+    frames = render_synthetic_frames(video, seed=config.get("seed", 0))
+    detections_df = pd.DataFrame(video["detections"])
+    timings, accuracy = {}, {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        lsm_path = os.path.join(tmp, "synthetic.tif")
+        tiff.imwrite(lsm_path, np.stack(frames))
+
+        timings["split"], _ = time_call(lambda: list(iter_lsm_frames(lsm_path)), repeats)
+        timings["detect"], _ = time_call(lambda: detect_frames(StubDetector(), frames), repeats)
+        for mode in TRACKER_MODES:
+            timings[f"track_{mode}"], tracks = time_call(lambda: track_detections(detections_df, mode=mode),
+                                                         repeats)
+            accuracy[mode] = tracking_accuracy(tracks, video)
+
+        tracks = track_detections(detections_df)
+        timings["filter"], filtered = time_call(lambda: filter_tracks(tracks), repeats)
+        accuracy["greedy_filtered"] = tracking_accuracy(filtered, video)
+        timings["summarize"], _ = time_call(lambda: summarize_tracks(tracks, "synthetic.tif"), repeats)
+        video_path = os.path.join(tmp, "tracked_video.mp4")
+        timings["render"], _ = time_call(lambda: render_tracking_frames(frames, tracks, video_path), repeats)
+        graph_path = os.path.join(tmp, "graph.png")
+        timings["plot"], _ = time_call(lambda: plot_tracks_df(tracks, graph_path), repeats)
+
+    return {
+        "config": config,
+        "timings": {name: round(seconds, 5) for name, seconds in timings.items()},
+        "accuracy": accuracy,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "host": host_fingerprint(),
+        "created": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def compare_to_baseline(result, baseline):
+    """
+    Regressions of `result` against a baseline from the same preset.
+
+    Timings are absolute wall-clock times, so they are only compared when the
+    baseline was measured on the same host; otherwise only accuracy is.
+
+    Returns:
+        list: Messages, one per slower stage or worse accuracy metric.
+    """
+    regressions = []
+    if baseline.get("host") != result["host"]:
+        print(f"[WARN] Baseline timings were measured on another machine ({baseline.get('host', 'unknown')}); "
+              f"comparing accuracy only.")
+    else:
+        for name, seconds in result["timings"].items():
+            before = baseline["timings"].get(name)
+            if before is not None and seconds > before * (1 + TIME_TOLERANCE) and seconds - before > TIME_MIN_DELTA:
+                regressions.append(f"{name}: {before:.4f}s -> {seconds:.4f}s "
+                                   f"(+{100 * (seconds / before - 1):.0f}%)")
+    for mode, metrics in result["accuracy"].items():
+        for metric, value in metrics.items():
+            before = baseline["accuracy"].get(mode, {}).get(metric)
+            if before is None:
+                continue
+            worse = value - before if metric in LOWER_IS_BETTER else before - value
+            if worse > ACCURACY_TOLERANCE:
+                regressions.append(f"{mode} {metric}: {before} -> {value}")
+    return regressions
+
+
+def print_results(result, regressions):
+    print("\n[BENCHMARK] Stage timings (median):")
+    for name, seconds in result["timings"].items():
+        print(f"  {name:<20}{seconds:>10.4f}s")
+    print("\n[BENCHMARK] Tracking accuracy:")
+    metrics = list(next(iter(result["accuracy"].values())))
+    print(f"  {'tracker':<18}" + "".join(f"{metric:>16}" for metric in metrics))
+    for mode, values in result["accuracy"].items():
+        print(f"  {mode:<18}" + "".join(f"{values[metric]:>16}" for metric in metrics))
+    for message in regressions:
+        print(f"[REGRESSION] {message}")
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if len(args) > 2 or any(arg not in ("--update",) for arg in sys.argv[1:] if arg.startswith("--")):
+        print("Usage: python benchmark_suite.py [preset] [baseline_json] [--update]")
+        sys.exit(1)
+
+    preset = args[0] if args else "default"
+    baseline_path = args[1] if len(args) > 1 else DEFAULT_BASELINE
+    result = run_benchmarks(preset)
+
+    baselines = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baselines = json.load(f)
+    regressions = []
+    if preset in baselines:
+        if baselines[preset]["config"] != result["config"]:
+            print(f"[INFO] Baseline for '{preset}' was made with another config; not compared.")
+        else:
+            regressions = compare_to_baseline(result, baselines[preset])
+    else:
+        print(f"[INFO] No baseline for '{preset}' yet (run with --update to store one).")
+    print_results(result, regressions)
+
+    if "--update" in sys.argv:
+        baselines[preset] = result
+        with open(baseline_path, "w") as f:
+            json.dump(baselines, f, indent=2)
+        print(f" Baseline saved to: {baseline_path}")
+    sys.exit(1 if regressions else 0)
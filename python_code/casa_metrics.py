@@ -0,0 +1,152 @@
+import numpy as np
+import pandas as pd
+import os
+import sys
+
+from track_kinematics import sort_tracks
+from track_table_io import ensure_centers, read_table
+
+# חלון ההחלקה (בנקודות) של המסלול הממוצע, כמו במערכות CASA מסחריות
+DEFAULT_SMOOTHING_WINDOW = 5
+
+CASA_COLUMNS = [
+    "track_id", "n_points", "duration_s",
+    "vcl_um_s", "vsl_um_s", "vap_um_s",
+    "lin", "str", "wob",
+    "alh_um", "alh_max_um", "bcf_hz",
+]
+
+
+def segment_moving_average(values, starts, counts, window):
+    """
+    Centered moving average of `values` that never crosses a track boundary
+    (the window is clipped at both ends of each track).
+    """
+    n = len(values)
+    half = window // 2
+    track_start = np.repeat(starts, counts)
+    track_end = track_start + np.repeat(counts, counts)
+    rows = np.arange(n)
+    lo = np.maximum(rows - half, track_start)
+    hi = np.minimum(rows + half + 1, track_end)
+    cumsum = np.concatenate([[0.0], np.cumsum(values)])
+    return (cumsum[hi] - cumsum[lo]) / (hi - lo)
+
+
+def compute_casa_metrics(df, pixel_size_um, fps, smoothing_window=DEFAULT_SMOOTHING_WINDOW):
+    """
+    Standard CASA motility metrics for every track at once.
+
+    VCL - curvilinear velocity (point-to-point path length / time)
+    VSL - straight-line velocity (first-to-last distance / time)
+    VAP - average path velocity (length of the smoothed path / time)
+    LIN = VSL/VCL, STR = VSL/VAP, WOB = VAP/VCL
+    ALH - amplitude of lateral head displacement (2 x distance to the average path;
+          mean and max are both reported)
+    BCF - beat-cross frequency (crossings of the average path per second)
+
+    Args:
+        df (pd.DataFrame): Tracks with frame, track_id and x_center/y_center
+                           (or x1/y1/x2/y2) columns, in pixels.
+        pixel_size_um (float): Size of one pixel in micrometers.
+        fps (float): Acquisition frame rate (frames per second).
+        smoothing_window (int): Points in the moving average used for the average path.
+
+    Returns:
+        pd.DataFrame: One row per track with the CASA_COLUMNS.
+    """
+    df, starts = sort_tracks(ensure_centers(df))
+    if len(df) == 0:
+        return pd.DataFrame(columns=CASA_COLUMNS)
+
+    n_rows = len(df)
+    counts = np.diff(np.append(starts, n_rows))
+    ends = starts + counts - 1
+
+    frames = df["frame"].to_numpy(dtype=np.float64)
+    x = df["x_center"].to_numpy(dtype=np.float64) * pixel_size_um
+    y = df["y_center"].to_numpy(dtype=np.float64) * pixel_size_um
+
+    first_row = np.zeros(n_rows, dtype=bool)
+    first_row[starts] = True
+
+    duration_s = (frames[ends] - frames[starts]) / fps
+
+    # מסלול עקום: סכום הצעדים
+    steps = np.where(first_row, 0.0, np.hypot(x - np.roll(x, 1), y - np.roll(y, 1)))
+    curvilinear_length = np.add.reduceat(steps, starts)
+
+    # מסלול ישר: מההתחלה לסוף
+    straight_length = np.hypot(x[ends] - x[starts], y[ends] - y[starts])
+
+    # מסלול ממוצע (מוחלק)
+    ax = segment_moving_average(x, starts, counts, smoothing_window)
+    ay = segment_moving_average(y, starts, counts, smoothing_window)
+    avg_steps = np.where(first_row, 0.0, np.hypot(ax - np.roll(ax, 1), ay - np.roll(ay, 1)))
+    average_length = np.add.reduceat(avg_steps, starts)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        vcl = np.where(duration_s > 0, curvilinear_length / duration_s, np.nan)
+        vsl = np.where(duration_s > 0, straight_length / duration_s, np.nan)
+        vap = np.where(duration_s > 0, average_length / duration_s, np.nan)
+        lin = vsl / vcl
+        straightness = vsl / vap
+        wob = vap / vcl
+
+    # ALH: המרחק הצידי מהמסלול הממוצע
+    lateral = np.hypot(x - ax, y - ay)
+    alh = 2 * np.add.reduceat(lateral, starts) / counts
+    alh_max = 2 * np.maximum.reduceat(lateral, starts)
+
+    # BCF: מעברים של המסלול העקום מצד אחד של המסלול הממוצע לצד השני
+    last_row = np.zeros(n_rows, dtype=bool)
+    last_row[ends] = True
+    dir_x = np.where(last_row, ax - np.roll(ax, 1), np.roll(ax, -1) - ax)
+    dir_y = np.where(last_row, ay - np.roll(ay, 1), np.roll(ay, -1) - ay)
+    side = np.sign(dir_x * (y - ay) - dir_y * (x - ax))
+    # נקודה שנמצאת בדיוק על המסלול הממוצע מקבלת את הצד הקודם שלה (בתוך אותו מסלול)
+    last_known = np.maximum.accumulate(np.where((side != 0) | first_row, np.arange(n_rows), 0))
+    side = side[last_known]
+    prev_side = np.roll(side, 1)
+    crossing = ~first_row & (side != 0) & (prev_side != 0) & (side != prev_side)
+    crossings = np.add.reduceat(crossing.astype(np.int64), starts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        bcf = np.where(duration_s > 0, crossings / duration_s, np.nan)
+
+    return pd.DataFrame({
+        "track_id": df["track_id"].to_numpy()[starts],
+        "n_points": counts,
+        "duration_s": duration_s,
+        "vcl_um_s": vcl,
+        "vsl_um_s": vsl,
+        "vap_um_s": vap,
+        "lin": lin,
+        "str": straightness,
+        "wob": wob,
+        "alh_um": alh,
+        "alh_max_um": alh_max,
+        "bcf_hz": bcf,
+    }, columns=CASA_COLUMNS)
+
+
+def casa_metrics_csv(input_csv, output_csv, pixel_size_um, fps, smoothing_window=DEFAULT_SMOOTHING_WINDOW):
+    """
+    CASA metrics of a tracks table (CSV, .cols or parquet; see track_table_io.read_table) to a CSV.
+    """
+    metrics = compute_casa_metrics(read_table(input_csv), pixel_size_um, fps, smoothing_window)
+
+    os.makedirs(os.path.dirname(output_csv), exist_ok=True)
+    metrics.round(3).to_csv(output_csv, index=False)
+    print(f" CASA metrics saved to: {output_csv}")
+    return output_csv
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 5:
+        print("Usage: python casa_metrics.py <tracks_table> <output_csv> <pixel_size_um> <fps>")
+        sys.exit(1)
+
+    try:
+        casa_metrics_csv(sys.argv[1], sys.argv[2], float(sys.argv[3]), float(sys.argv[4]))
+    except Exception as e:
+        print(f" Error: {e}")
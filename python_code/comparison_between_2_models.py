@@ -1,43 +1,34 @@
-from ultralytics import YOLO
-
-def compare_models(model_path_1, model_path_2, data_yaml):
-    model1 = YOLO(model_path_1)
-    model2 = YOLO(model_path_2)
-
-    print(f"\n🔍 Running validation for {model_path_1} ...")
-    metrics1 = model1.val(data=data_yaml).results_dict
-
-    print(f"\n🔍 Running validation for {model_path_2} ...")
-    metrics2 = model2.val(data=data_yaml).results_dict
-
-    print("\n📊 Comparison:")
-    print(f"{'Metric':<20}{'Model 1':>12}{'Model 2':>12}{'Better':>10}")
-    print("-" * 54)
-
-    keys = [
-        "metrics/precision(B)",
-        "metrics/recall(B)",
-        "metrics/mAP50(B)",
-        "metrics/mAP50-95(B)",
-        "fitness"
-    ]
-    names = {
-        "metrics/precision(B)": "Precision",
-        "metrics/recall(B)": "Recall",
-        "metrics/mAP50(B)": "mAP@50",
-        "metrics/mAP50-95(B)": "mAP@50-95",
-        "fitness": "Fitness"
-    }
-
-    for k in keys:
-        val1 = float(metrics1[k])
-        val2 = float(metrics2[k])
-        better = "Model 1" if val1 > val2 else ("Model 2" if val2 > val1 else "-")
-        print(f"{names[k]:<20}{val1:>12.3f}{val2:>12.3f}{better:>10}")
-
-
-compare_models(
-    model_path_1='runs/detect/train4/weights/best.pt',
-    model_path_2='runs/detect/train3/weights/best.pt',
-    data_yaml='C:/Users/IMOE001/Desktop/tagged_comper/data.yaml'
-)
+import sys
+
+from model_evaluation import evaluate_models, print_comparison
+
+
+def compare_models(model_path_1, model_path_2, data_yaml, output_prefix=None, **options):
+    """
+    Validate two weights files side by side (in parallel, with cached predictions)
+    and print precision, recall, mAP and speed for both.
+
+    Args:
+        model_path_1 (str): Path to the first weights (e.g. runs/detect/train4/weights/best.pt).
+        model_path_2 (str): Path to the second weights.
+        data_yaml (str): The validation set's data.yaml.
+        output_prefix (str): Also write <prefix>.json and <prefix>.csv.
+        **options: Extra model_evaluation.evaluate_models arguments (imgsz, cache_dir, ...).
+
+    Returns:
+        list: The two result dicts.
+    """
+    print(f"\n🔍 Running validation for {model_path_1} and {model_path_2} ...")
+    results = evaluate_models([model_path_1, model_path_2], data_yaml,
+                              output_json=output_prefix + ".json" if output_prefix else None,
+                              output_csv=output_prefix + ".csv" if output_prefix else None, **options)
+    print_comparison(results)
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (4, 5):
+        print("Usage: python comparison_between_2_models.py <model_1> <model_2> <data_yaml> [output_prefix]")
+        sys.exit(1)
+
+    compare_models(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4] if len(sys.argv) == 5 else None)
@@ -0,0 +1,115 @@
+import cv2
+import numpy as np
+
+# פריים שסטיית התקן שלו (אחרי נרמול ל-0-255) מתחת לזה - ריק/שחור
+BLANK_STD = 1.0
+# פיקסל "זז" אם השתנה ביותר מזה (רמות אפור) מול הפריים שזוהה לאחרונה
+MOTION_THRESHOLD = 12
+# אזור סטטי אם פחות מזה פיקסלים זזו - הזיהויים הקודמים שלו נשארים נכונים
+MOTION_PIXELS = 16
+# כל כמה פיקסלים נדגמים לסטטיסטיקה של ריקנות
+STATS_STEP = 4
+
+
+def frame_statistics(frames, step=STATS_STEP):
+    """
+    Per-frame intensity statistics of a chunk of frames, in one vectorized pass.
+
+    Every `step`-th pixel in each direction is sampled, which is plenty to tell
+    an empty frame from one with cells at a fraction of the cost.
+
+    Args:
+        frames (list | np.ndarray): Same-sized uint8 frames (grayscale or BGR).
+        step (int): Sampling step in pixels.
+
+    Returns:
+        np.ndarray: Structured array with fields mean, std and diff (mean absolute
+                    difference to the previous frame of the chunk; 0 for the first).
+    """
+    stack = np.stack([frame[::step, ::step] for frame in frames]).astype(np.float32)
+    stack = stack.reshape(len(stack), -1)
+    stats = np.zeros(len(stack), dtype=[('mean', np.float32), ('std', np.float32), ('diff', np.float32)])
+    stats['mean'] = stack.mean(axis=1)
+    stats['std'] = stack.std(axis=1)
+    stats['diff'][1:] = np.abs(np.diff(stack, axis=0)).mean(axis=1)
+    return stats
+
+
+class FramePrefilter:
+    """
+    Decide, region by region, whether a frame needs the detector at all.
+
+    Blank frames (std below blank_std) get no detections. A region (the whole
+    frame, or with roi=True each detection tile) in which fewer than
+    motion_pixels pixels changed by more than motion_threshold since the last
+    time it was detected reuses that detection, re-stamped with the current
+    frame number - so the tracker still sees every frame under its own number.
+    The comparison is always against the last detected pixels (lightly
+    smoothed), never the previous frame, so slow drift cannot accumulate unnoticed.
+
+    `counts` keeps the bookkeeping: blank frames, frames that needed no
+    detector call at all, and regions detected vs reused.
+    """
+
+    def __init__(self, blank_std=BLANK_STD, motion_threshold=MOTION_THRESHOLD, motion_pixels=MOTION_PIXELS,
+                 roi=False):
+        self.blank_std = blank_std
+        self.motion_threshold = motion_threshold
+        self.motion_pixels = motion_pixels
+        self.roi = roi
+        # אזור -> (הפיקסלים המוחלקים שזוהו לאחרונה, holder עם הזיהויים שלהם)
+        self.references = {}
+        self.counts = {"frames": 0, "blank": 0, "skipped": 0, "regions_detected": 0, "regions_reused": 0}
+
+    def params(self):
+        """
+        The settings that change detections (for cache keys and run reports).
+        """
+        return {"blank_std": self.blank_std, "motion_threshold": self.motion_threshold,
+                "motion_pixels": self.motion_pixels, "roi": self.roi}
+
+    def blank_frames(self, frames):
+        """
+        Boolean mask of the blank frames in a chunk.
+        """
+        return frame_statistics(frames)['std'] < self.blank_std
+
+    def lookup(self, region, pixels):
+        """
+        Compare `region` (any hashable key) with the pixels it was last detected on.
+
+        Returns:
+            tuple: (holder, detect). holder is a dict whose "dets" will hold the
+                   region's detections. If detect is True the region is new or
+                   moved: it becomes the new reference and the caller must detect
+                   it and fill holder["dets"]. Otherwise holder is the reference's,
+                   to be re-stamped with restamp() once it is filled.
+        """
+        # החלקה קלה כדי שרעש של החיישן לא ייחשב לתנועה
+        smoothed = cv2.GaussianBlur(pixels, (5, 5), 0)
+        reference = self.references.get(region)
+        if reference is not None and reference[0].shape == smoothed.shape:
+            changed = cv2.absdiff(reference[0], smoothed) > self.motion_threshold
+            if np.count_nonzero(changed) < self.motion_pixels:
+                self.counts["regions_reused"] += 1
+                return reference[1], False
+        holder = {"dets": None}
+        self.references[region] = (smoothed, holder)
+        self.counts["regions_detected"] += 1
+        return holder, True
+
+    @staticmethod
+    def restamp(holder, frame_index):
+        """
+        A copy of the detections in `holder`, as frame `frame_index`.
+        """
+        dets = holder["dets"].copy()
+        dets['frame'] = frame_index
+        return dets
+
+    def summary(self):
+        counts = self.counts
+        print(f"[INFO] Prefilter: {counts['blank']} blank and {counts['skipped']} static frames of "
+              f"{counts['frames']} skipped; {counts['regions_reused']} regions reused, "
+              f"{counts['regions_detected']} detected")
+        return dict(counts)
@@ -1,11 +1,14 @@
 import json
 import os
 
+import cv2
+
 # ⚙️ הגדרות - עדכן לפי הצורך:
 json_path = r"C:\imgae_of_yolov8\trajectories.json"  # נתיב לקובץ הגיוון שלך (JSON)
 labels_dir =r"C:\imgae_of_yolov8\50_images_for_2_model" # תיקייה לשמור בה את קבצי התיוג
-image_width = 256  # רוחב התמונה בפיקסלים
-image_height = 256  # גובה התמונה בפיקסלים
+images_dir = labels_dir  # תיקיית התמונות - הגודל של כל תמונה נקרא ממנה
+image_width = 256  # רוחב ברירת מחדל, כשהתמונה לא נמצאת
+image_height = 256  # גובה ברירת מחדל, כשהתמונה לא נמצאת
 
 # יוצרים את תיקיית התיוגים אם לא קיימת
 os.makedirs(labels_dir, exist_ok=True)
@@ -19,13 +22,19 @@ for filename, boxes in data.items():
     label_filename = os.path.splitext(filename)[0] + '.txt'
     label_path = os.path.join(labels_dir, label_filename)
 
+    # הקואורדינטות מנורמלות לפי הגודל האמיתי של התמונה (256, 512, 1024...)
+    width, height = image_width, image_height
+    image = cv2.imread(os.path.join(images_dir, filename), cv2.IMREAD_UNCHANGED)
+    if image is not None:
+        height, width = image.shape[:2]
+
     with open(label_path, 'w') as out_file:
         for box in boxes:
             x, y, w, h = box
-            x_center = (x + w / 2) / image_width
-            y_center = (y + h / 2) / image_height
-            w_norm = w / image_width
-            h_norm = h / image_height
+            x_center = (x + w / 2) / width
+            y_center = (y + h / 2) / height
+            w_norm = w / width
+            h_norm = h / height
 
             out_file.write(f"0 {x_center:.6f} {y_center:.6f} {w_norm:.6f} {h_norm:.6f}\n")
 
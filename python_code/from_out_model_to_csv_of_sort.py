@@ -1,70 +1,204 @@
+import io
 import os
-import csv
 import sys
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from track_table_io import write_table, DETECTION_SCHEMA
+from lsm_frame_source import read_frame_geometry
 
-def convert_yolo_to_sort_csv(labels_folder, output_csv, image_width=256, image_height=256):
+SORT_COLUMNS = ['frame', 'x1', 'y1', 'x2', 'y2', 'confidence', 'class']
+
+# אותם שדות כמו out_of_model_yolov.DETECTION_DTYPE, אבל הקואורדינטות ב-float64
+# (כמו DETECTION_SCHEMA) כדי שה-CSV ישמור על הדיוק המלא
+LABEL_DTYPE = np.dtype([
+    ('frame', np.int64),
+    ('x1', np.float64),
+    ('y1', np.float64),
+    ('x2', np.float64),
+    ('y2', np.float64),
+    ('confidence', np.float32),
+    ('class', np.int16),
+])
+
+# גודל הפריים של המיקרוסקופ הישן - רק כשאין גודל מפורש או גיאומטריה
+LEGACY_FRAME_SIZE = 256
+
+# כמה קבצי תוויות נקראים ומפוענחים יחד - מגביל את הזיכרון של הטקסט הגולמי
+LABEL_CHUNK_FILES = 4096
+# קבצים לכל משימת קריאה - קבצי תוויות קטנים, ומשימה לכל קובץ עולה יותר מהקריאה
+READ_BATCH_FILES = 128
+
+def frame_size(image_width=None, image_height=None, geometry=None):
     """
-    Convert YOLO label .txt files into a CSV formatted for SORT algorithm.
+    (width, height) to convert normalized YOLO coordinates with: the explicit
+    size if given, else the FrameGeometry of the source video, else 256x256.
+    """
+    if image_width and image_height:
+        return image_width, image_height
+    if geometry is not None:
+        return geometry.width, geometry.height
+    print(f"[WARN] Frame size unknown, assuming {LEGACY_FRAME_SIZE}x{LEGACY_FRAME_SIZE}")
+    return LEGACY_FRAME_SIZE, LEGACY_FRAME_SIZE
+
+def _label_files(labels_folder):
+    """
+    The label files of a folder and their frame numbers (from the name, e.g. frame_0012.txt).
+    """
+    names, frame_ids = [], []
+    for filename in sorted(os.listdir(labels_folder)):
+        if not filename.endswith('.txt'):
+            continue
+        try:
+            frame_ids.append(int(os.path.splitext(filename)[0].split('_')[-1]))
+        except ValueError:
+            print(f" Skipping invalid file name: {filename}")
+            continue
+        names.append(filename)
+    return names, np.array(frame_ids, dtype=np.int64)
+
+def _read_texts(paths):
+    texts = []
+    for path in paths:
+        with open(path, 'r') as f:
+            texts.append(f.read())
+    return texts
+
+def _parse_lines(text):
+    # קובץ עם שורות קצרות או ריקות - פענוח שורה-שורה, ושורות לא תקינות מדולגות
+    rows = [line.split()[:5] for line in text.splitlines()]
+    rows = [[float(value) for value in row] for row in rows if len(row) == 5]
+    return np.array(rows, dtype=np.float64).reshape(-1, 5)
+
+def _parse_bulk(texts, counts):
+    joined = '\n'.join(text for text in texts if text)
+    if not joined:
+        return np.empty((0, 5))
+    values = np.loadtxt(io.StringIO(joined), usecols=range(5), ndmin=2)
+    if len(values) != counts.sum():
+        raise ValueError("Blank lines inside a label file")
+    return values
+
+def _parse_labels(texts):
+    """
+    Parse the text of many label files at once.
+
+    Returns:
+        tuple: (values, counts) - an (N, 5) array of class, x_center, y_center,
+               width, height and the number of rows that came from each file.
+    """
+    texts = [text.strip() for text in texts]
+    counts = np.array([text.count('\n') + 1 if text else 0 for text in texts], dtype=np.int64)
+    try:
+        return _parse_bulk(texts, counts), counts
+    except ValueError:
+        pass
+
+    # רק הקבצים עם שורות פגומות מפוענחים שורה-שורה; השאר עדיין בבת אחת
+    parsed = [None] * len(texts)
+    clean = [i for i, text in enumerate(texts) if all(len(line.split()) >= 5 for line in text.splitlines())]
+    try:
+        values = _parse_bulk([texts[i] for i in clean], counts[clean])
+        for i, part in zip(clean, np.split(values, np.cumsum(counts[clean])[:-1])):
+            parsed[i] = part
+    except ValueError:
+        pass
+    parsed = [part if part is not None else _parse_lines(text) for part, text in zip(parsed, texts)]
+    return np.concatenate(parsed), np.array([len(part) for part in parsed], dtype=np.int64)
+
+def read_yolo_labels(labels_folder, image_width=None, image_height=None, workers=None, geometry=None):
+    """
+    Load every YOLO label .txt file of a folder into one detections array, in pixel coordinates.
+
+    The files are read on a thread pool and parsed in bulk (a chunk of files
+    per np.loadtxt call); the normalized-to-pixel conversion is vectorized.
+    Files with malformed lines fall back to a line-by-line parse that skips them.
 
     Args:
         labels_folder (str): Folder containing YOLO .txt label files.
-        output_csv (str): Path for the output CSV file.
         image_width (int): Width of the original image.
         image_height (int): Height of the original image.
-    
+        workers (int): Reader threads (default: one per CPU, at most 8).
+        geometry (FrameGeometry): Frame size of the source video, used when
+                                  image_width/image_height are not given.
+
     Returns:
-        str: Path to the output CSV file.
+        np.ndarray: LABEL_DTYPE array sorted by frame; confidence is 1.0
+                    (label files do not keep it).
     """
     if not os.path.exists(labels_folder):
         raise FileNotFoundError(f"Labels folder not found: {labels_folder}")
 
-    rows = []
+    image_width, image_height = frame_size(image_width, image_height, geometry)
+    names, frame_ids = _label_files(labels_folder)
+    workers = workers or min(8, os.cpu_count() or 1)
 
-    for filename in sorted(os.listdir(labels_folder)):
-        if not filename.endswith('.txt'):
-            continue
+    values, counts = [np.empty((0, 5))], [np.empty(0, dtype=np.int64)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for start in range(0, len(names), LABEL_CHUNK_FILES):
+            paths = [os.path.join(labels_folder, name) for name in names[start:start + LABEL_CHUNK_FILES]]
+            batches = [paths[i:i + READ_BATCH_FILES] for i in range(0, len(paths), READ_BATCH_FILES)]
+            texts = [text for batch in executor.map(_read_texts, batches) for text in batch]
+            chunk_values, chunk_counts = _parse_labels(texts)
+            values.append(chunk_values)
+            counts.append(chunk_counts)
+    values = np.concatenate(values)
 
-        try:
-            frame_id = int(os.path.splitext(filename)[0].split('_')[-1])
-        except ValueError:
-            print(f" Skipping invalid file name: {filename}")
-            continue
+    class_id, x_center, y_center, w, h = values.T
+    detections = np.empty(len(values), dtype=LABEL_DTYPE)
+    detections['frame'] = np.repeat(frame_ids, np.concatenate(counts))
+    detections['x1'] = (x_center - w / 2) * image_width
+    detections['y1'] = (y_center - h / 2) * image_height
+    detections['x2'] = (x_center + w / 2) * image_width
+    detections['y2'] = (y_center + h / 2) * image_height
+    detections['confidence'] = 1.0
+    detections['class'] = class_id
+    return detections[np.argsort(detections['frame'], kind='stable')]
 
-        with open(os.path.join(labels_folder, filename), 'r') as f:
-            for line in f:
-                parts = line.strip().split()
-                if len(parts) < 5:
-                    continue
-
-                class_id = int(parts[0])
-                x_center, y_center, w, h = map(float, parts[1:5])
+def load_yolo_labels(labels_folder, image_width=None, image_height=None, geometry=None):
+    """
+    read_yolo_labels as a DataFrame with columns frame, x1, y1, x2, y2, confidence, class.
+    """
+    detections = read_yolo_labels(labels_folder, image_width, image_height, geometry=geometry)
+    return pd.DataFrame(detections, columns=SORT_COLUMNS)
 
-                x1 = (x_center - w / 2) * image_width
-                y1 = (y_center - h / 2) * image_height
-                x2 = (x_center + w / 2) * image_width
-                y2 = (y_center + h / 2) * image_height
+def convert_yolo_to_sort_csv(labels_folder, output_csv, image_width=None, image_height=None, geometry=None):
+    """
+    Convert YOLO label .txt files into a CSV formatted for SORT algorithm.
 
-                confidence = 1.0  # optional confidence placeholder
-                rows.append([frame_id, x1, y1, x2, y2, confidence, class_id])
+    Args:
+        labels_folder (str): Folder containing YOLO .txt label files.
+        output_csv (str): Path for the output file (.csv, or .parquet/.cols for the
+                          typed columnar format).
+        image_width (int): Width of the original image.
+        image_height (int): Height of the original image.
+        geometry (FrameGeometry): Frame size of the source video (lsm_frame_source.read_frame_geometry),
+                                  used when image_width/image_height are not given.
 
-    os.makedirs(os.path.dirname(output_csv), exist_ok=True)
-    with open(output_csv, 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(['frame', 'x1', 'y1', 'x2', 'y2', 'confidence', 'class'])
-        writer.writerows(rows)
+    Returns:
+        str: Path to the output CSV file.
+    """
+    detections = load_yolo_labels(labels_folder, image_width, image_height, geometry)
+    write_table(detections, output_csv, DETECTION_SCHEMA)
 
     print(f" SORT CSV created: {output_csv}")
     return output_csv
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python from_out_model_to_csv_of_sort.py <labels_folder> <output_csv>")
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python from_out_model_to_csv_of_sort.py <labels_folder> <output_csv> [source_video | WIDTHxHEIGHT]")
         sys.exit(1)
 
     labels_folder = sys.argv[1]
     output_csv_path = sys.argv[2]
 
     try:
-        convert_yolo_to_sort_csv(labels_folder, output_csv_path)
+        width = height = geometry = None
+        if len(sys.argv) == 4:
+            if os.path.exists(sys.argv[3]):
+                geometry = read_frame_geometry(sys.argv[3])
+            else:
+                width, height = map(int, sys.argv[3].lower().split('x'))
+        convert_yolo_to_sort_csv(labels_folder, output_csv_path, width, height, geometry)
     except Exception as e:
         print(f" Error: {e}")
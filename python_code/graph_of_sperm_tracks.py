@@ -1,73 +1,42 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.cm as cm
-import numpy as np
 import sys
 import os
+from track_table_io import read_table
+from graph_service import TrackTable, render_tracks_png
 
 def plot_tracks(input_csv, output_image, limit=None):
     print(f"[INFO] Reading input CSV: {input_csv}")
-    df = pd.read_csv(input_csv)
+    plot_tracks_df(read_table(input_csv), output_image, limit)
 
+def plot_tracks_df(df, output_image, limit=None):
+    """
+    Plot track trajectories from an in-memory tracks table.
+
+    Args:
+        df (pd.DataFrame): Tracks with track_id, frame and either centers or x1/y1/x2/y2.
+        output_image (str): Path of the PNG to write.
+        limit (int): If given, only the N longest tracks are drawn.
+    """
     if "x_center" not in df.columns or "y_center" not in df.columns:
-        if {"x1", "y1", "x2", "y2"}.issubset(df.columns):
-            df["x_center"] = (df["x1"] + df["x2"]) / 2
-            df["y_center"] = (df["y1"] + df["y2"]) / 2
-            print("[INFO] Calculated x_center and y_center from x1/x2/y1/y2")
-        else:
+        if not {"x1", "y1", "x2", "y2"}.issubset(df.columns):
             raise ValueError("CSV is missing required position columns.")
+        print("[INFO] Calculated x_center and y_center from x1/x2/y1/y2")
 
-    required_columns = {"x_center", "y_center", "track_id", "frame"}
-    if not required_columns.issubset(df.columns):
+    if not {"track_id", "frame"}.issubset(df.columns):
         raise ValueError("Missing required columns in CSV.")
 
     if df.empty:
         raise ValueError("Input CSV is empty. Cannot generate graph.")
 
-    # 🟢 דירוג track_ids לפי אורך (כמות שורות)
-    track_lengths = df.groupby("track_id").size().sort_values(ascending=False)
-
-    # קבלת ה־N הארוכים ביותר
     if limit is not None:
         print(f"[INFO] Selecting top {limit} longest tracks")
-        selected_ids = track_lengths.head(limit).index.tolist()
-    else:
-        selected_ids = track_lengths.index.tolist()
-
-    # יצירת מפה לצבעים
-    cmap = cm.get_cmap("hsv", len(selected_ids))
-    color_map = {track_id: cmap(i) for i, track_id in enumerate(selected_ids)}
-
-    # ציור גרף
-    plt.figure(figsize=(10, 8))
-    for track_id, group in df.groupby("track_id"):
-        if track_id not in selected_ids:
-            continue
-        group_sorted = group.sort_values("frame")
-        plt.plot(
-            group_sorted["x_center"],
-            group_sorted["y_center"],
-            label=f"ID {track_id}",
-        )
-
-    plt.title("Filtered Sperm Tracks")
-    plt.xlabel("x_center")
-    plt.ylabel("y_center")
-    plt.gca().invert_yaxis()
-
-    plt.legend(
-        loc='upper center',
-        bbox_to_anchor=(0.5, -0.15),
-        fontsize='small',
-        title='Track IDs',
-        ncol=8
-    )
 
-    plt.grid(True)
-    plt.tight_layout(rect=[0, 0.15, 1, 1])
+    # אותו ציור כמו בשירות הגרפים (graph_service) - בלי pyplot ובלי קיבוץ מחדש לכל מסלול
+    table = TrackTable(df)
+    png = render_tracks_png(table, table.select(limit=limit))
 
     os.makedirs(os.path.dirname(output_image), exist_ok=True)
-    plt.savefig(output_image, bbox_inches='tight')
+    with open(output_image, "wb") as f:
+        f.write(png)
     print(f"[SUCCESS] Graph saved to: {output_image}")
 
 if __name__ == "__main__":
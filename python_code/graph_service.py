@@ -0,0 +1,212 @@
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from track_table_io import read_table, ensure_centers
+from track_kinematics import compute_track_kinematics
+
+# סטים קבועים של פרמטרים (במקום סקריפטים נפרדים לכל גרף)
+GRAPH_PRESETS = {
+    # Graph_plhot_of_4_good_sperm_.py: ארבעת הזרעונים הנבחרים + הארוכים ביותר עד 4
+    "four_good_sperm": {
+        "forced_ids": [733, 939, 571, 636],
+        "limit": 4,
+        "colors": ["red", "green", "blue", "black"],
+        "marker": "o",
+        "title": "Selected 4 Sperm Tracks",
+    },
+}
+
+DEFAULT_TITLE = "Filtered Sperm Tracks"
+
+
+class TrackTable:
+    """
+    A tracks table prepared once for plotting: points sorted by (track_id, frame)
+    and split per track, plus per-track length, duration and speed category.
+    """
+
+    def __init__(self, df):
+        df = ensure_centers(df)
+        if df.empty:
+            raise ValueError("Input CSV is empty. Cannot generate graph.")
+        df, starts, per_track = compute_track_kinematics(df)
+        self.track_ids = per_track["track_id"].to_numpy()
+        self.lengths = np.diff(np.append(starts, len(df)))
+        self.durations = per_track["duration_frames"].to_numpy()
+        self.speed_categories = per_track["speed_category"].to_numpy()
+        x = df["x_center"].to_numpy(dtype=np.float64)
+        y = df["y_center"].to_numpy(dtype=np.float64)
+        self.xs = np.split(x, starts[1:])
+        self.ys = np.split(y, starts[1:])
+        self.index = {track_id: i for i, track_id in enumerate(self.track_ids.tolist())}
+
+    def select(self, limit=None, speed_category=None, min_duration=None, track_ids=None, forced_ids=None):
+        """
+        Indices of the tracks to draw.
+
+        The filters (speed_category, min_duration, track_ids) are applied first.
+        forced_ids that exist are always included (in the order given), then the
+        longest remaining tracks fill the selection up to `limit` tracks.
+
+        Returns:
+            list: Track indices; forced tracks first, then by length (longest first).
+        """
+        keep = np.ones(len(self.track_ids), dtype=bool)
+        if speed_category is not None:
+            categories = [speed_category] if isinstance(speed_category, str) else list(speed_category)
+            keep &= np.isin(self.speed_categories, categories)
+        if min_duration is not None:
+            keep &= self.durations >= min_duration
+        if track_ids is not None:
+            keep &= np.isin(self.track_ids, list(track_ids))
+
+        forced = []
+        for track_id in forced_ids or []:
+            i = self.index.get(track_id)
+            if i is not None and i not in forced:
+                forced.append(i)
+        keep[forced] = False
+
+        # הארוכים ביותר קודם; בשוויון - לפי מזהה
+        candidates = np.flatnonzero(keep)
+        candidates = candidates[np.lexsort((self.track_ids[candidates], -self.lengths[candidates]))]
+        if limit is not None:
+            candidates = candidates[:max(0, limit - len(forced))]
+        return forced + candidates.tolist()
+
+
+def render_tracks_png(table, selected, title=DEFAULT_TITLE, colors=None, marker=None):
+    """
+    Draw the selected tracks and return the PNG bytes.
+
+    Uses a Figure directly (not pyplot), so several threads can render at once.
+    """
+    fig = Figure(figsize=(10, 8))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+
+    # כמו בגרף המקורי: המסלולים מצוירים לפי סדר המזהים, אלא אם נקבעו צבעים
+    order = selected if colors else sorted(selected, key=lambda i: table.track_ids[i])
+    for n, i in enumerate(order):
+        style = {"color": colors[n % len(colors)]} if colors else {}
+        if marker:
+            style.update(marker=marker, linestyle="-")
+        ax.plot(table.xs[i], table.ys[i], label=f"ID {table.track_ids[i]}", **style)
+
+    ax.set_title(title)
+    ax.set_xlabel("x_center")
+    ax.set_ylabel("y_center")
+    ax.invert_yaxis()
+    if order:
+        ax.legend(loc='upper center', bbox_to_anchor=(0.5, -0.15), fontsize='small',
+                  title='Track IDs', ncol=8)
+    ax.grid(True)
+    fig.tight_layout(rect=[0, 0.15, 1, 1])
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", bbox_inches='tight')
+    return buffer.getvalue()
+
+
+class GraphService:
+    """
+    Renders track plots on demand for many sessions.
+
+    Prepared track tables are kept in memory (keyed by path and modification
+    time, so a rewritten table is picked up), and rendered images are kept
+    by (table, parameters). A repeated request costs a dictionary lookup; a new
+    selection on a known table only costs the drawing. Both caches are LRU.
+    """
+
+    def __init__(self, max_tables=16, max_images=128):
+        self.max_tables = max_tables
+        self.max_images = max_images
+        self._tables = OrderedDict()
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _get(cache, key):
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+    @staticmethod
+    def _put(cache, key, value, max_items):
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > max_items:
+            cache.popitem(last=False)
+
+    def table(self, tracks_path):
+        """
+        The prepared TrackTable for a tracks file (.cols, .parquet or CSV).
+        """
+        if not os.path.exists(tracks_path):
+            raise FileNotFoundError(f"Tracks table not found: {tracks_path}")
+        key = (os.path.abspath(tracks_path), os.path.getmtime(tracks_path))
+        with self._lock:
+            table = self._get(self._tables, key)
+        if table is None:
+            table = TrackTable(read_table(tracks_path))
+            with self._lock:
+                self._put(self._tables, key, table, self.max_tables)
+        return table, key
+
+    def render(self, tracks_path, output_image=None, preset=None, **params):
+        """
+        Plot tracks from `tracks_path`.
+
+        Args:
+            tracks_path (str): Tracks table (tracks.cols or a tracks CSV).
+            output_image (str): If given, the PNG is also written there.
+            preset (str): Name of a GRAPH_PRESETS entry; explicit params override it.
+            **params: limit, speed_category, min_duration, track_ids, forced_ids
+                      (see TrackTable.select) and title, colors, marker.
+
+        Returns:
+            bytes: The PNG image.
+        """
+        params = {name: value for name, value in params.items() if value is not None}
+        if preset is not None:
+            if preset not in GRAPH_PRESETS:
+                raise ValueError(f"Unknown graph preset: {preset}")
+            params = {**GRAPH_PRESETS[preset], **params}
+
+        table, table_key = self.table(tracks_path)
+        image_key = (table_key, json.dumps(params, sort_keys=True, default=str))
+        with self._lock:
+            png = self._get(self._images, image_key)
+
+        if png is None:
+            style = {name: params.pop(name) for name in ("title", "colors", "marker") if name in params}
+            png = render_tracks_png(table, table.select(**params), **style)
+            with self._lock:
+                self._put(self._images, image_key, png, self.max_images)
+
+        if output_image:
+            parent = os.path.dirname(output_image)
+            if parent:
+                os.makedirs(parent, exist_ok=True)
+            with open(output_image, "wb") as f:
+                f.write(png)
+            print(f"[SUCCESS] Graph saved to: {output_image}")
+        return png
+
+
+_default_service = GraphService()
+
+
+def render_graph(tracks_path, output_image=None, preset=None, **params):
+    """
+    GraphService.render on a process-wide service, for scripts and the server.
+    """
+    return _default_service.render(tracks_path, output_image, preset=preset, **params)
@@ -0,0 +1,429 @@
+import os
+import sys
+import threading
+import time
+from glob import glob
+
+import cv2
+import numpy as np
+
+from stage_cache import file_digest
+from out_of_model_yolov import detect_frames, nms
+
+BACKENDS = ("torch", "onnx", "openvino")
+PRECISIONS = ("fp32", "fp16", "int8")
+
+STRIDE = 32
+PAD_VALUE = 114
+# כמו ברירות המחדל של ultralytics ב-predict
+NMS_IOU = 0.7
+MAX_DET = 300
+MAX_WH = 7680
+# כמה תמונות כיול לכל היותר לכימות int8
+CALIBRATION_IMAGES = 200
+
+# עובדים באותו תהליך (השרת) לא מייצאים את אותו מודל במקביל
+_export_lock = threading.Lock()
+
+
+def letterbox(image, size):
+    """
+    Resize a BGR image into a size x size canvas keeping its aspect ratio,
+    padded with gray on both sides (as ultralytics' LetterBox does).
+
+    Returns:
+        tuple: (canvas, gain, (pad_x, pad_y)).
+    """
+    height, width = image.shape[:2]
+    gain = min(size / height, size / width)
+    new_w, new_h = int(round(width * gain)), int(round(height * gain))
+    if (new_w, new_h) != (width, height):
+        image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    dw, dh = (size - new_w) / 2, (size - new_h) / 2
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    if top or bottom or left or right:
+        image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT,
+                                   value=(PAD_VALUE, PAD_VALUE, PAD_VALUE))
+    return image, gain, (left, top)
+
+
+def _to_input(images):
+    # BGR HWC uint8 -> RGB NCHW float32 0-1
+    batch = np.stack(images)[..., ::-1].transpose(0, 3, 1, 2)
+    return np.ascontiguousarray(batch, dtype=np.float32) / 255.0
+
+
+class _Boxes:
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+
+    def __len__(self):
+        return len(self.conf)
+
+
+class _Result:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+def decode_predictions(output, conf, iou=NMS_IOU, max_det=MAX_DET):
+    """
+    Boxes of one image from the raw YOLOv8 head output (4 + classes, anchors):
+    confidence filter and class-aware NMS, boxes in network-input pixels.
+
+    Returns:
+        tuple: (xyxy, conf, cls) arrays, highest confidence first.
+    """
+    output = output.T.astype(np.float32)
+    scores = output[:, 4:]
+    cls = scores.argmax(axis=1)
+    best = scores[np.arange(len(scores)), cls]
+    keep = best > conf
+    xywh, best, cls = output[keep, :4], best[keep], cls[keep]
+
+    order = np.argsort(-best, kind='stable')
+    xywh, best, cls = xywh[order], best[order], cls[order]
+    xyxy = np.concatenate([xywh[:, :2] - xywh[:, 2:] / 2, xywh[:, :2] + xywh[:, 2:] / 2], axis=1)
+    if len(xyxy):
+        # NMS לפי מחלקה: הזזה של כל מחלקה לאזור משלה
+        kept = nms(xyxy + (cls * MAX_WH)[:, None], best, iou)[:max_det]
+        xyxy, best, cls = xyxy[kept], best[kept], cls[kept]
+    return xyxy, best, cls.astype(np.float32)
+
+
+class OnnxDetector:
+    """
+    An exported detector run by ONNX Runtime ("onnx") or OpenVINO ("openvino")
+    on a fixed number of CPU threads.
+
+    Takes the same predict() call as ultralytics' YOLO and returns results shaped
+    like its own (.boxes with xyxy, conf, cls), so detect_frames / iter_detections
+    and the rest of the pipeline use it unchanged.
+
+    predict(source=[BGR images], conf=..., imgsz=...) letterboxes every image
+    to imgsz x imgsz, runs them through the network in batches of batch_size
+    and maps the boxes back to the original image.
+    """
+
+    def __init__(self, onnx_path, backend="onnx", threads=None, batch_size=16):
+        if backend not in ("onnx", "openvino"):
+            raise ValueError(f"Unknown exported backend: {backend} (expected 'onnx' or 'openvino')")
+        if not os.path.exists(onnx_path):
+            raise FileNotFoundError(f"ONNX model not found: {onnx_path}")
+        self.onnx_path = onnx_path
+        self.backend = backend
+        self.threads = threads or os.cpu_count() or 1
+        self.batch_size = batch_size
+
+        if backend == "onnx":
+            try:
+                import onnxruntime as ort
+            except ImportError:
+                raise ImportError("onnxruntime is not installed (pip install onnxruntime).")
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = self.threads
+            options.inter_op_num_threads = 1
+            options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+            self.input_name = self.session.get_inputs()[0].name
+        else:
+            try:
+                import openvino as ov
+            except ImportError:
+                raise ImportError("openvino is not installed (pip install openvino).")
+            core = ov.Core()
+            self.compiled = core.compile_model(core.read_model(onnx_path), "CPU", {
+                "INFERENCE_NUM_THREADS": self.threads,
+                "PERFORMANCE_HINT": "LATENCY",
+            })
+
+    def _run(self, batch):
+        if self.backend == "onnx":
+            return self.session.run(None, {self.input_name: batch})[0]
+        return self.compiled(batch)[self.compiled.output(0)]
+
+    def predict(self, source, conf=0.25, imgsz=256, iou=NMS_IOU, max_det=MAX_DET, **_):
+        """
+        Same call as ultralytics' model.predict for a list of BGR images
+        (save/verbose and other display options are ignored).
+        """
+        images = source if isinstance(source, (list, tuple)) else [source]
+        size = int(np.ceil(imgsz / STRIDE) * STRIDE)
+        results = []
+        for start in range(0, len(images), self.batch_size):
+            chunk = images[start:start + self.batch_size]
+            boxed = [letterbox(image, size) for image in chunk]
+            outputs = self._run(_to_input([canvas for canvas, _, _ in boxed]))
+            for image, (_, gain, (pad_x, pad_y)), output in zip(chunk, boxed, outputs):
+                xyxy, scores, cls = decode_predictions(output, conf, iou, max_det)
+                height, width = image.shape[:2]
+                xyxy[:, [0, 2]] = np.clip((xyxy[:, [0, 2]] - pad_x) / gain, 0, width)
+                xyxy[:, [1, 3]] = np.clip((xyxy[:, [1, 3]] - pad_y) / gain, 0, height)
+                results.append(_Result(_Boxes(xyxy, scores, cls)))
+        return results
+
+
+def _copy_metadata(source, target):
+    # השמות של המחלקות וכו' שה-export של ultralytics שמר
+    import onnx
+    model = onnx.load(target)
+    del model.metadata_props[:]
+    model.metadata_props.extend(onnx.load(source, load_external_data=False).metadata_props)
+    onnx.save(model, target)
+
+
+def _to_fp16(fp32_path, output_path):
+    try:
+        import onnx
+        from onnxconverter_common import float16
+    except ImportError:
+        raise ImportError("fp16 export needs onnx and onnxconverter-common (pip install onnxconverter-common).")
+    # הכניסה והיציאה נשארות float32, כך שהקוד שקורא למודל לא משתנה
+    model = float16.convert_float_to_float16(onnx.load(fp32_path), keep_io_types=True)
+    onnx.save(model, output_path)
+
+
+class _CalibrationReader:
+    def __init__(self, input_name, image_paths, imgsz):
+        self.input_name = input_name
+        self.image_paths = iter(image_paths)
+        self.imgsz = imgsz
+
+    def get_next(self):
+        for path in self.image_paths:
+            image = cv2.imread(path)
+            if image is not None:
+                return {self.input_name: _to_input([letterbox(image, self.imgsz)[0]])}
+        return None
+
+
+def _to_int8(fp32_path, output_path, calibration_images, imgsz):
+    try:
+        import onnxruntime as ort
+        from onnxruntime.quantization import quantize_static, QuantFormat, QuantType
+    except ImportError:
+        raise ImportError("int8 export needs onnxruntime (pip install onnxruntime).")
+    paths = image_files(calibration_images)[:CALIBRATION_IMAGES]
+    if not paths:
+        raise FileNotFoundError(f"No calibration images found in: {calibration_images}")
+    input_name = ort.InferenceSession(fp32_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    # QDQ עם משקלים לכל ערוץ - הפורמט ש-ONNX Runtime ו-OpenVINO מריצים ב-int8 על CPU
+    quantize_static(fp32_path, output_path, _CalibrationReader(input_name, paths, imgsz),
+                    quant_format=QuantFormat.QDQ, per_channel=True,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+
+
+def image_files(images_dir):
+    """
+    The PNG/JPG images of a folder, sorted.
+    """
+    return sorted(glob(os.path.join(images_dir, "*.png")) + glob(os.path.join(images_dir, "*.jpg")))
+
+
+def export_onnx(model_path, imgsz=256, precision="fp32", calibration_images=None, export_dir=None):
+    """
+    Export YOLO weights to ONNX once; later calls return the existing file.
+
+    The file name carries the weights' digest, the input size and the
+    precision, so retrained weights get a new export automatically.
+
+    Args:
+        model_path (str): Path to the trained YOLO weights (.pt).
+        imgsz (int): Network input size.
+        precision (str): "fp32", "fp16" (weights stored in half precision) or
+                         "int8" (static quantization calibrated on calibration_images).
+        calibration_images (str): Folder of representative frames (int8 only).
+        export_dir (str): Where exports are kept (default: "exported" next to the weights).
+
+    Returns:
+        str: Path to the .onnx file.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision: {precision} (expected one of {PRECISIONS})")
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Model file not found: {model_path}")
+    if precision == "int8" and not calibration_images:
+        raise ValueError("int8 export needs calibration_images (a folder of representative frames).")
+
+    export_dir = export_dir or os.path.join(os.path.dirname(os.path.abspath(model_path)), "exported")
+    os.makedirs(export_dir, exist_ok=True)
+    stem = f"{os.path.splitext(os.path.basename(model_path))[0]}-{file_digest(model_path)[:12]}-{imgsz}"
+
+    def export_path(kind):
+        return os.path.join(export_dir, f"{stem}-{kind}.onnx")
+
+    with _export_lock:
+        return _export(model_path, imgsz, precision, calibration_images, export_path)
+
+
+def _export(model_path, imgsz, precision, calibration_images, export_path):
+    fp32_path = export_path("fp32")
+    if not os.path.exists(fp32_path):
+        from ultralytics import YOLO
+        print(f"[INFO] Exporting {model_path} to ONNX ...")
+        exported = YOLO(model_path).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+        os.replace(exported, fp32_path)
+    if precision == "fp32":
+        return fp32_path
+
+    target = export_path(precision)
+    if not os.path.exists(target):
+        print(f"[INFO] Converting the ONNX model to {precision} ...")
+        # נכתב לקובץ זמני ומועבר למקומו, כדי שעובד אחר לא יקרא קובץ חלקי
+        partial = f"{target}.{os.getpid()}.partial"
+        if precision == "fp16":
+            _to_fp16(fp32_path, partial)
+        else:
+            _to_int8(fp32_path, partial, calibration_images, imgsz)
+        _copy_metadata(fp32_path, partial)
+        os.replace(partial, target)
+    print(f" Exported model saved to: {target}")
+    return target
+
+
+def load_detector(model_path, backend="torch", precision="fp32", threads=None, imgsz=256,
+                  calibration_images=None, batch_size=16):
+    """
+    The detector to pass to detect_frames / run_pipeline(model=...).
+
+    "torch" is the ultralytics YOLO model itself (fp32; threads sets torch's
+    thread count). "onnx" and "openvino" export the weights once (see
+    export_onnx) and return an OnnxDetector.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend: {backend} (expected one of {BACKENDS})")
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Model file not found: {model_path}")
+
+    if backend == "torch":
+        if precision != "fp32":
+            raise ValueError("The torch backend runs fp32 only; export to onnx/openvino for fp16 or int8.")
+        from ultralytics import YOLO
+        if threads:
+            try:
+                import torch
+                torch.set_num_threads(threads)
+            except ImportError:
+                pass
+        return YOLO(model_path)
+
+    onnx_path = export_onnx(model_path, imgsz, precision, calibration_images)
+    return OnnxDetector(onnx_path, backend, threads, batch_size)
+
+
+def box_iou(a, b):
+    """
+    IoU matrix between two (n, 4) and (m, 4) arrays of x1, y1, x2, y2 boxes.
+    """
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(br - tl, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def _box_array(dets):
+    return np.stack([dets['x1'], dets['y1'], dets['x2'], dets['y2']], axis=1).astype(np.float64)
+
+
+def _match(reference, candidate, iou_threshold):
+    from scipy.optimize import linear_sum_assignment
+    ious, conf_diffs = [], []
+    for frame in np.union1d(reference['frame'], candidate['frame']):
+        ref = reference[reference['frame'] == frame]
+        cand = candidate[candidate['frame'] == frame]
+        if not len(ref) or not len(cand):
+            continue
+        iou = box_iou(_box_array(ref), _box_array(cand))
+        iou[ref['class'][:, None] != cand['class'][None, :]] = 0
+        rows, cols = linear_sum_assignment(-iou)
+        good = iou[rows, cols] >= iou_threshold
+        ious.extend(iou[rows, cols][good])
+        conf_diffs.extend(np.abs(ref['confidence'][rows] - cand['confidence'][cols])[good])
+    return np.array(ious), np.array(conf_diffs)
+
+
+def check_backend_accuracy(model_path, images_dir, backend="onnx", precision="fp32", threads=None, imgsz=256,
+                           conf=0.25, batch_size=16, calibration_images=None, iou_threshold=0.5,
+                           min_recall=0.98, min_precision=0.98):
+    """
+    Compare an exported backend with the PyTorch model on a validation set.
+
+    Both models detect every image of images_dir through detect_frames. A
+    backend box counts as agreeing when it overlaps a PyTorch box of the same
+    class with IoU >= iou_threshold (one-to-one matching per image). The
+    backend passes when it finds at least min_recall of the PyTorch boxes and
+    at least min_precision of its own boxes agree.
+
+    Returns:
+        dict: box counts, recall, precision, mean IoU and confidence difference
+              of the matches, seconds per image for both models, speedup and passed.
+    """
+    paths = image_files(images_dir)
+    if not paths:
+        raise FileNotFoundError(f"No images found in: {images_dir}")
+    images = [image for image in (cv2.imread(path) for path in paths) if image is not None]
+    calibration_images = calibration_images or images_dir
+
+    def timed(model):
+        # חימום אחד לפני המדידה
+        detect_frames(model, images[:1], batch_size, conf, imgsz)
+        start = time.perf_counter()
+        detections = detect_frames(model, images, batch_size, conf, imgsz)
+        return detections, (time.perf_counter() - start) / len(images)
+
+    reference, ref_seconds = timed(load_detector(model_path, "torch", threads=threads, imgsz=imgsz))
+    candidate, cand_seconds = timed(load_detector(model_path, backend, precision, threads, imgsz,
+                                                  calibration_images, batch_size))
+    ious, conf_diffs = _match(reference, candidate, iou_threshold)
+
+    recall = len(ious) / len(reference) if len(reference) else 1.0
+    agreement = len(ious) / len(candidate) if len(candidate) else 1.0
+    result = {
+        "backend": backend,
+        "precision": precision,
+        "threads": threads or os.cpu_count(),
+        "images": len(images),
+        "reference_boxes": int(len(reference)),
+        "backend_boxes": int(len(candidate)),
+        "recall": round(recall, 4),
+        "precision_vs_reference": round(agreement, 4),
+        "mean_iou": round(float(ious.mean()), 4) if len(ious) else None,
+        "mean_conf_diff": round(float(conf_diffs.mean()), 4) if len(conf_diffs) else None,
+        "torch_ms_per_image": round(ref_seconds * 1000, 2),
+        "backend_ms_per_image": round(cand_seconds * 1000, 2),
+        "speedup": round(ref_seconds / cand_seconds, 2) if cand_seconds > 0 else None,
+        "passed": recall >= min_recall and agreement >= min_precision,
+    }
+
+    print(f"\n📊 {backend} ({precision}) vs PyTorch on {len(images)} images:")
+    print(f"{'Metric':<24}{'Value':>12}")
+    print("-" * 36)
+    for key in ("reference_boxes", "backend_boxes", "recall", "precision_vs_reference", "mean_iou",
+                "mean_conf_diff", "torch_ms_per_image", "backend_ms_per_image", "speedup"):
+        print(f"{key:<24}{str(result[key]):>12}")
+    print("[SUCCESS] Backend agrees with PyTorch" if result["passed"] else
+          "[WARN] Backend does not agree closely enough with PyTorch - keep the torch backend")
+    return result
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4, 5, 6):
+        print("Usage: python inference_backend.py <model_path> <validation_images_dir> "
+              "[onnx|openvino] [fp32|fp16|int8] [threads]")
+        sys.exit(1)
+
+    try:
+        result = check_backend_accuracy(sys.argv[1], sys.argv[2],
+                                        backend=sys.argv[3] if len(sys.argv) > 3 else "onnx",
+                                        precision=sys.argv[4] if len(sys.argv) > 4 else "fp32",
+                                        threads=int(sys.argv[5]) if len(sys.argv) > 5 else None)
+        sys.exit(0 if result["passed"] else 1)
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
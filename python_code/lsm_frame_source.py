@@ -0,0 +1,128 @@
+import numpy as np
+import tifffile as tiff
+import cv2
+import os
+from collections import namedtuple
+
+# גודל הפריים ונתוני הרכישה, כפי שנקראו מכותרת הקובץ (None אם הכותרת לא מכילה אותם)
+FrameGeometry = namedtuple("FrameGeometry", [
+    "width", "height", "num_frames", "channels", "pixel_size_um", "frame_interval_s",
+])
+
+
+def read_frame_geometry(lsm_path):
+    """
+    Read the frame geometry of an LSM (or TIFF) stack from its header, without
+    decoding any pixel data.
+
+    Args:
+        lsm_path (str): Path to the LSM file.
+
+    Returns:
+        FrameGeometry: width, height, num_frames and channels as iter_lsm_frames
+                       sees them; pixel_size_um and frame_interval_s from the
+                       LSM metadata (None for plain TIFFs).
+    """
+    if not os.path.exists(lsm_path):
+        raise FileNotFoundError(f"LSM file not found at {lsm_path}")
+
+    try:
+        tif = tiff.TiffFile(lsm_path)
+    except Exception as e:
+        raise ValueError(f"Error loading LSM file: {e}")
+
+    with tif:
+        shape = tif.series[0].shape
+        height, width = shape[-2:]
+        n_frames = shape[0] if len(shape) >= 3 else 1
+        channels = int(np.prod(shape[1:-2])) if len(shape) > 3 else 1
+
+        pixel_size_um = frame_interval_s = None
+        metadata = tif.lsm_metadata if tif.is_lsm else None
+        if metadata:
+            # ב-LSM גודל הווקסל שמור במטרים
+            if metadata.get("VoxelSizeX"):
+                pixel_size_um = float(metadata["VoxelSizeX"]) * 1e6
+            if metadata.get("TimeIntervall"):
+                frame_interval_s = float(metadata["TimeIntervall"])
+
+    return FrameGeometry(int(width), int(height), int(n_frames), channels, pixel_size_um, frame_interval_s)
+
+
+def normalize_frame(raw_frame):
+    """
+    Average the channels of one raw frame and stretch it to 0-255 uint8.
+
+    Args:
+        raw_frame (np.ndarray): Frame of shape (channels, height, width).
+
+    Returns:
+        np.ndarray: Normalized uint8 frame of shape (height, width).
+    """
+    if raw_frame.shape[0] == 1:
+        frame = raw_frame[0]
+    else:
+        # only one frame is averaged at a time, so float64 keeps results identical
+        # to the old whole-stack mean without costing stack-sized memory
+        frame = raw_frame.mean(axis=0)
+    return cv2.normalize(frame, None, 0, 255, cv2.NORM_MINMAX).astype('uint8')
+
+
+class LsmFrames:
+    """
+    Re-iterable view of the frames of an LSM stack: every pass decodes the file
+    again with iter_lsm_frames, so no frame is kept in memory between passes.
+    """
+
+    def __init__(self, lsm_path, geometry=None):
+        self.lsm_path = lsm_path
+        self.geometry = geometry or read_frame_geometry(lsm_path)
+
+    def __len__(self):
+        return self.geometry.num_frames
+
+    def __iter__(self):
+        return iter_lsm_frames(self.lsm_path)
+
+
+def iter_lsm_frames(lsm_path):
+    """
+    Yield the frames of an LSM (or TIFF) stack one at a time, channel-averaged
+    and normalized to uint8.
+
+    Uncompressed, contiguous stacks are memory-mapped; everything else is read
+    page by page, so only the pages of the current frame are ever in memory.
+
+    Args:
+        lsm_path (str): Path to the LSM file.
+
+    Yields:
+        np.ndarray: uint8 frame of shape (height, width).
+    """
+    if not os.path.exists(lsm_path):
+        raise FileNotFoundError(f"LSM file not found at {lsm_path}")
+
+    try:
+        tif = tiff.TiffFile(lsm_path)
+    except Exception as e:
+        raise ValueError(f"Error loading LSM file: {e}")
+
+    with tif:
+        series = tif.series[0]
+        shape = series.shape
+        height, width = shape[-2:]
+        n_frames = shape[0] if len(shape) >= 3 else 1
+
+        if series.dataoffset is not None:
+            stack = tiff.memmap(lsm_path, series=0, mode='r')
+            stack = stack.reshape(n_frames, -1, height, width)
+            for i in range(n_frames):
+                yield normalize_frame(stack[i])
+            return
+
+        pages = series.pages
+        pages_per_frame = max(len(pages) // n_frames, 1)
+        for i in range(n_frames):
+            planes = [pages[j].asarray() for j in range(i * pages_per_frame, (i + 1) * pages_per_frame)]
+            raw_frame = planes[0] if len(planes) == 1 else np.stack(planes)
+            yield normalize_frame(raw_frame.reshape(-1, height, width))
@@ -1,20 +1,109 @@
 import cv2
-import pandas as pd
+import numpy as np
 import os
 from natsort import natsorted
 import re
 import sys
+from video_writer import BackgroundVideoWriter, DEFAULT_CODEC
+from track_table_io import read_table
 
 def create_tracking_video(frames_dir, tracking_csv, output_video, fps=1):
     """
     Create a video and labeled images with bounding boxes and tracking IDs.
+    tracking_csv may be any table read_table reads (CSV, .cols or parquet).
     """
-    if not os.path.exists(frames_dir):
-        raise FileNotFoundError(f"Frames folder not found: {frames_dir}")
     if not os.path.exists(tracking_csv):
-        raise FileNotFoundError(f"Tracking CSV not found: {tracking_csv}")
+        raise FileNotFoundError(f"Tracking table not found: {tracking_csv}")
+
+    render_tracking_video(frames_dir, read_table(tracking_csv), output_video, fps)
+
+def index_tracks_by_frame(df):
+    """
+    Group the track rows by frame once, into contiguous arrays.
+
+    Returns:
+        tuple: (frame_keys, offsets, boxes, track_ids). The rows of frame_keys[k]
+               are boxes[offsets[k]:offsets[k + 1]] / track_ids[offsets[k]:offsets[k + 1]].
+    """
+    frames = df['frame'].to_numpy()
+    order = np.argsort(frames, kind='stable')
+    frames = frames[order]
+    boxes = df[['x1', 'y1', 'x2', 'y2']].to_numpy()[order].astype(int)
+    track_ids = df['track_id'].to_numpy()[order].astype(int)
 
-    df = pd.read_csv(tracking_csv)
+    frame_keys, starts = np.unique(frames, return_index=True)
+    offsets = np.append(starts, len(frames))
+    return frame_keys, offsets, boxes, track_ids
+
+def draw_tracks(frame, boxes, track_ids):
+    """
+    Draw the boxes and their track IDs on a BGR frame, in place.
+    """
+    for (x1, y1, x2, y2), track_id in zip(boxes, track_ids):
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        cv2.putText(frame, f'ID {track_id}', (x1, y1 - 7),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+    return frame
+
+def write_labeled_video(frames, output_video, fps, codec=DEFAULT_CODEC, quality=None, labeled_frames=True):
+    """
+    Write already labeled frames to a video and (optionally) to a labeled_frames
+    folder next to it. Encoding and PNG writing run on background threads
+    (video_writer.BackgroundVideoWriter), while the caller draws the next frames.
+
+    Args:
+        frames (iterable): (filename, BGR image) pairs in frame order.
+        output_video (str): Path of the MP4 to write.
+        fps (int): Frames per second of the output video.
+        codec (str): "mp4v", "avc1" or "h264" (browser-playable, via ffmpeg); see video_writer.
+        quality (int): Constant quality for the h264 codec (CRF for libx264).
+        labeled_frames (bool): Also save every labeled frame as a PNG. Without them,
+                               frames can still be taken from the video on request
+                               (video_writer.read_video_frame).
+
+    Returns:
+        dict: output_video (None if there were no frames), labeled_frames_dir
+              (None if not written), codec (the one actually used) and num_frames.
+    """
+    labeled_frames_dir = os.path.join(os.path.dirname(output_video), "labeled_frames") if labeled_frames else None
+    with BackgroundVideoWriter(output_video, fps, codec, quality, frames_dir=labeled_frames_dir) as writer:
+        for filename, frame in frames:
+            writer.write(frame, filename)
+    return {
+        "output_video": writer.close(),
+        "labeled_frames_dir": labeled_frames_dir if writer.num_frames else None,
+        "codec": writer.codec,
+        "num_frames": writer.num_frames,
+    }
+
+def _draw_and_write(frames, index, output_video, fps, **video_options):
+    """
+    frames: iterable of (frame_number, filename, BGR image).
+    """
+    frame_keys, offsets, boxes, track_ids = index
+
+    def labeled():
+        for frame_number, filename, frame in frames:
+            k = np.searchsorted(frame_keys, frame_number)
+            if k < len(frame_keys) and frame_keys[k] == frame_number:
+                start, end = offsets[k], offsets[k + 1]
+                draw_tracks(frame, boxes[start:end], track_ids[start:end])
+            yield filename, frame
+
+    written = write_labeled_video(labeled(), output_video, fps, **video_options)
+    if written["output_video"] is None:
+        raise ValueError("No frames to render.")
+    print(f" Tracking video created: {output_video}")
+    if written["labeled_frames_dir"]:
+        print(f" Labeled frames saved to: {written['labeled_frames_dir']}")
+    return written
+
+def render_tracking_video(frames_dir, df, output_video, fps=1, **video_options):
+    """
+    Same as create_tracking_video, but takes the tracks as an in-memory DataFrame.
+    """
+    if not os.path.exists(frames_dir):
+        raise FileNotFoundError(f"Frames folder not found: {frames_dir}")
 
     frame_files = natsorted([
         f for f in os.listdir(frames_dir)
@@ -24,54 +113,51 @@ def create_tracking_video(frames_dir, tracking_csv, output_video, fps=1):
         raise ValueError("No frame images found in the directory.")
 
     first_frame_path = os.path.join(frames_dir, frame_files[0])
-    first_frame = cv2.imread(first_frame_path)
-    if first_frame is None:
+    if cv2.imread(first_frame_path) is None:
         raise FileNotFoundError(f"Cannot read the first frame: {first_frame_path}")
 
-    height, width, _ = first_frame.shape
     os.makedirs(os.path.dirname(output_video), exist_ok=True)
 
-    # יצירת סרטון
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    out = cv2.VideoWriter(output_video, fourcc, fps, (width, height))
-
-    # יצירת תיקיה חדשה לתמונות מתויגות
-    labeled_frames_dir = os.path.join(os.path.dirname(output_video), "labeled_frames")
-    os.makedirs(labeled_frames_dir, exist_ok=True)
+    def read_frames():
+        for filename in frame_files:
+            match = re.search(r'frame_(\d+)', filename)
+            if not match:
+                print(f" Frame number not found in filename: {filename}")
+                continue
+            yield int(match.group(1)), filename, cv2.imread(os.path.join(frames_dir, filename))
 
-    for filename in frame_files:
-        frame_path = os.path.join(frames_dir, filename)
-        frame = cv2.imread(frame_path)
+    return _draw_and_write(read_frames(), index_tracks_by_frame(df), output_video, fps, **video_options)
 
-        match = re.search(r'frame_(\d+)', filename)
-        if not match:
-            print(f" Frame number not found in filename: {filename}")
-            continue
-
-        frame_number = int(match.group(1))
-        frame_tracks = df[df['frame'] == frame_number]
-
-        for _, row in frame_tracks.iterrows():
-            x1, y1, x2, y2 = map(int, [row['x1'], row['y1'], row['x2'], row['y2']])
-            track_id = int(row['track_id'])
-            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-            cv2.putText(frame, f'ID {track_id}', (x1, y1 - 7),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-
-        # כתיבה לסרטון
-        out.write(frame)
+def render_tracking_frames(frames, df, output_video, fps=1, **video_options):
+    """
+    Render the tracking video straight from in-memory frames (frame i = frames[i]),
+    without re-reading PNGs from disk.
+
+    Args:
+        frames (iterable): uint8 frames, grayscale or BGR, in frame order.
+        df (pd.DataFrame): Tracks with frame, track_id, x1, y1, x2, y2 columns.
+        output_video (str): Path of the MP4 to write.
+        fps (int): Frames per second of the output video.
+        **video_options: codec, quality, labeled_frames (see write_labeled_video).
+
+    Returns:
+        dict: See write_labeled_video.
+    """
+    os.makedirs(os.path.dirname(output_video), exist_ok=True)
 
-        # שמירת תמונה מתויגת
-        labeled_frame_path = os.path.join(labeled_frames_dir, filename)
-        cv2.imwrite(labeled_frame_path, frame)
+    def to_bgr():
+        for i, frame in enumerate(frames):
+            if frame.ndim == 2:
+                frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+            else:
+                frame = frame.copy()
+            yield i, f"frame_{i:04d}.png", frame
 
-    out.release()
-    print(f" Tracking video created: {output_video}")
-    print(f" Labeled frames saved to: {labeled_frames_dir}")
+    return _draw_and_write(to_bgr(), index_tracks_by_frame(df), output_video, fps, **video_options)
 
 if __name__ == "__main__":
     if len(sys.argv) != 4:
-        print("Usage: python main_video_of_track_algoritem.py <frames_dir> <tracking_csv> <output_video>")
+        print("Usage: python main_video_of_track_algoritem.py <frames_dir> <tracking_table> <output_video>")
         sys.exit(1)
 
     frames_dir = sys.argv[1]
@@ -0,0 +1,459 @@
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from glob import glob
+
+import cv2
+import numpy as np
+import pandas as pd
+import yaml
+
+from stage_cache import file_digest
+from out_of_model_yolov import detect_frames, DETECTION_DTYPE
+from inference_backend import load_detector, box_iou
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "eval_cache")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
+
+# כמו ב-val של ultralytics: סף נמוך כדי שעקומת precision-recall תהיה שלמה
+EVAL_CONF = 0.001
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+
+METRIC_NAMES = {
+    "precision": "Precision",
+    "recall": "Recall",
+    "map50": "mAP@50",
+    "map50_95": "mAP@50-95",
+    "ms_per_image": "ms/image",
+    "images_per_s": "images/s",
+}
+LOWER_IS_BETTER = ("ms_per_image",)
+# כמה תמונות נמדדות למהירות - מספיק ליציבות בלי לחזור על כל סט הוולידציה
+LATENCY_IMAGES = 64
+
+
+def _image_paths(source):
+    if isinstance(source, (list, tuple)):
+        return [path for item in source for path in _image_paths(item)]
+    if os.path.isdir(source):
+        return sorted(path for path in glob(os.path.join(source, "*")) if path.lower().endswith(IMAGE_EXTENSIONS))
+    if source.lower().endswith(".txt"):
+        base_dir = os.path.dirname(os.path.abspath(source))
+        with open(source) as f:
+            return [os.path.join(base_dir, line.strip()) for line in f if line.strip()]
+    return [source]
+
+
+def _label_path(image_path):
+    # המוסכמה של YOLO: .../images/val/x.png -> .../labels/val/x.txt (אחרת ליד התמונה)
+    parts = os.path.normpath(os.path.splitext(image_path)[0] + ".txt").split(os.sep)
+    if "images" in parts[:-1]:
+        index = len(parts) - 2 - parts[:-1][::-1].index("images")
+        parts[index] = "labels"
+    return os.sep.join(parts)
+
+
+def load_validation_set(data):
+    """
+    Images and ground-truth boxes of a validation set.
+
+    Args:
+        data (str): A YOLO data.yaml (its `val` entry is used), or a folder of
+                    images with YOLO label files in a sibling labels/ folder.
+
+    Returns:
+        dict: images (paths), boxes (list of (n, 4) pixel xyxy arrays),
+              classes (list of int arrays) and names (class id -> name).
+    """
+    names = {}
+    if os.path.isfile(data) and data.lower().endswith((".yaml", ".yml")):
+        with open(data, encoding="utf-8") as f:
+            config = yaml.safe_load(f)
+        root = config.get("path") or os.path.dirname(os.path.abspath(data))
+        if not os.path.isabs(root):
+            root = os.path.join(os.path.dirname(os.path.abspath(data)), root)
+        val = config.get("val")
+        if val is None:
+            raise ValueError(f"No 'val' entry in {data}")
+        sources = [val] if isinstance(val, str) else val
+        images = _image_paths([os.path.join(root, source) for source in sources])
+        names = config.get("names") or {}
+        if isinstance(names, list):
+            names = dict(enumerate(names))
+    else:
+        images = _image_paths(data)
+    if not images:
+        raise FileNotFoundError(f"No validation images found for: {data}")
+
+    boxes, classes = [], []
+    for image_path in images:
+        image = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
+        if image is None:
+            raise ValueError(f"Validation image could not be read: {image_path}")
+        height, width = image.shape[:2]
+        rows = np.zeros((0, 5))
+        label_path = _label_path(image_path)
+        if os.path.exists(label_path) and os.path.getsize(label_path):
+            rows = np.loadtxt(label_path, ndmin=2)[:, :5]
+        cx, cy, w, h = rows[:, 1] * width, rows[:, 2] * height, rows[:, 3] * width, rows[:, 4] * height
+        boxes.append(np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1))
+        classes.append(rows[:, 0].astype(int))
+    return {"images": images, "boxes": boxes, "classes": classes, "names": names}
+
+
+def match_predictions(pred_boxes, pred_classes, gt_boxes, gt_classes):
+    """
+    Which predictions of one image are true positives, at every IoU threshold
+    of IOU_THRESHOLDS (each ground-truth box matches at most one prediction,
+    best IoU first).
+
+    Returns:
+        np.ndarray: (num_predictions, len(IOU_THRESHOLDS)) boolean array.
+    """
+    correct = np.zeros((len(pred_boxes), len(IOU_THRESHOLDS)), dtype=bool)
+    if not len(pred_boxes) or not len(gt_boxes):
+        return correct
+    iou = box_iou(gt_boxes, pred_boxes)
+    iou[gt_classes[:, None] != pred_classes[None, :]] = 0
+    for t, threshold in enumerate(IOU_THRESHOLDS):
+        gt_idx, pred_idx = np.nonzero(iou >= threshold)
+        if not len(gt_idx):
+            continue
+        order = np.argsort(-iou[gt_idx, pred_idx], kind='stable')
+        gt_idx, pred_idx = gt_idx[order], pred_idx[order]
+        _, first = np.unique(pred_idx, return_index=True)
+        gt_idx, pred_idx = gt_idx[np.sort(first)], pred_idx[np.sort(first)]
+        _, first = np.unique(gt_idx, return_index=True)
+        correct[pred_idx[first], t] = True
+    return correct
+
+
+def average_precision(recall, precision):
+    """
+    Area under the precision-recall curve (101-point interpolation, as COCO and ultralytics).
+    """
+    recall = np.concatenate([[0.0], recall, [1.0]])
+    precision = np.concatenate([[1.0], precision, [0.0]])
+    precision = np.flip(np.maximum.accumulate(np.flip(precision)))
+    points = np.linspace(0, 1, 101)
+    curve = np.interp(points, recall, precision)
+    return float(np.sum((curve[1:] + curve[:-1]) / 2 * np.diff(points)))
+
+
+def detection_metrics(correct, confidence, pred_classes, gt_classes):
+    """
+    Precision, recall (at the confidence with the best mean F1), mAP@50 and
+    mAP@50-95 over all images, averaged over the classes of the ground truth.
+
+    Args:
+        correct (np.ndarray): match_predictions rows of every prediction.
+        confidence (np.ndarray): Prediction confidences.
+        pred_classes (np.ndarray): Prediction classes.
+        gt_classes (np.ndarray): Classes of all ground-truth boxes.
+    """
+    order = np.argsort(-confidence, kind='stable')
+    correct, confidence, pred_classes = correct[order], confidence[order], pred_classes[order]
+    grid = np.linspace(0, 1, 1000)
+    classes = np.unique(gt_classes)
+    ap = np.zeros((len(classes), len(IOU_THRESHOLDS)))
+    p_curve = np.zeros((len(classes), len(grid)))
+    r_curve = np.zeros((len(classes), len(grid)))
+    for c, cls in enumerate(classes):
+        mine = pred_classes == cls
+        num_gt = np.count_nonzero(gt_classes == cls)
+        if not mine.any():
+            continue
+        tp = np.cumsum(correct[mine], axis=0)
+        fp = np.cumsum(~correct[mine], axis=0)
+        recall = tp / num_gt
+        precision = tp / (tp + fp)
+        # עקומות לפי סף ביטחון (סדר יורד, ולכן הפיכה של הצירים ל-interp)
+        r_curve[c] = np.interp(-grid, -confidence[mine], recall[:, 0], left=0)
+        p_curve[c] = np.interp(-grid, -confidence[mine], precision[:, 0], left=1)
+        ap[c] = [average_precision(recall[:, t], precision[:, t]) for t in range(len(IOU_THRESHOLDS))]
+
+    f1 = 2 * p_curve * r_curve / np.maximum(p_curve + r_curve, 1e-16)
+    best = f1.mean(axis=0).argmax() if len(classes) else 0
+    return {
+        "precision": float(p_curve[:, best].mean()) if len(classes) else 0.0,
+        "recall": float(r_curve[:, best].mean()) if len(classes) else 0.0,
+        "map50": float(ap[:, 0].mean()) if len(classes) else 0.0,
+        "map50_95": float(ap.mean()) if len(classes) else 0.0,
+    }
+
+
+class PredictionCache:
+    """
+    Per-image predictions of every weights file, kept on disk.
+
+    One file per (weights digest, prediction settings) holds the detections of
+    every image predicted so far, keyed by the image's content digest, plus the
+    latency measured when they were predicted. Re-running an evaluation only
+    predicts images (or weights) that have no entry yet.
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, weights_digest, settings):
+        tag = "-".join(f"{key}{value}" for key, value in sorted(settings.items()))
+        return os.path.join(self.root, f"{weights_digest[:16]}-{tag}")
+
+    def load(self, weights_digest, settings):
+        """
+        Returns:
+            tuple: (dict image digest -> DETECTION_DTYPE array, timing dict) - empty if nothing is cached.
+        """
+        path = self._path(weights_digest, settings)
+        if not os.path.exists(path + ".npz"):
+            return {}, {}
+        with np.load(path + ".npz") as stored:
+            digests, detections = stored["digests"], stored["detections"]
+        with open(path + ".json", encoding="utf-8") as f:
+            timing = json.load(f)
+        order = np.argsort(detections['frame'], kind='stable')
+        detections = detections[order]
+        bounds = np.searchsorted(detections['frame'], np.arange(len(digests) + 1))
+        return {str(digest): detections[bounds[i]:bounds[i + 1]] for i, digest in enumerate(digests)}, timing
+
+    def store(self, weights_digest, settings, predictions, timing):
+        path = self._path(weights_digest, settings)
+        digests = list(predictions)
+        parts = []
+        for i, digest in enumerate(digests):
+            dets = predictions[digest].copy()
+            dets['frame'] = i
+            parts.append(dets)
+        detections = np.concatenate(parts) if parts else np.empty(0, dtype=DETECTION_DTYPE)
+        # נכתב לקובץ זמני ומועבר למקומו, כדי שהערכה אחרת לא תקרא קובץ חלקי
+        partial = f"{path}.{os.getpid()}.partial"
+        np.savez(partial + ".npz", digests=np.array(digests), detections=detections)
+        with open(partial + ".json", "w", encoding="utf-8") as f:
+            json.dump(timing, f, indent=2)
+        os.replace(partial + ".npz", path + ".npz")
+        os.replace(partial + ".json", path + ".json")
+
+    def store_timing(self, weights_digest, settings, timing):
+        """
+        Replace the latency of an entry that is already stored.
+        """
+        path = self._path(weights_digest, settings)
+        partial = f"{path}.{os.getpid()}.partial"
+        with open(partial + ".json", "w", encoding="utf-8") as f:
+            json.dump(timing, f, indent=2)
+        os.replace(partial + ".json", path + ".json")
+
+
+def _read_images(paths):
+    images = []
+    for path in paths:
+        image = cv2.imread(path)
+        if image is None:
+            raise ValueError(f"Validation image could not be read: {path}")
+        images.append(image)
+    return images
+
+
+def measure_latency(weights, images, imgsz=256, batch_size=16, backend="torch", precision="fp32", threads=None):
+    """
+    Inference latency of one weights file on the first LATENCY_IMAGES images,
+    after one warm-up call.
+
+    The number only means something next to others measured the same way:
+    evaluate_models times one model at a time, with nothing else running.
+
+    Returns:
+        dict: ms_per_image, images_timed, batch_size, threads and measured_alone.
+    """
+    model = load_detector(weights, backend, precision, threads, imgsz, batch_size=batch_size)
+    frames = _read_images(images[:LATENCY_IMAGES])
+    detect_frames(model, frames[:1], batch_size, EVAL_CONF, imgsz)
+    start = time.perf_counter()
+    detect_frames(model, frames, batch_size, EVAL_CONF, imgsz)
+    seconds = time.perf_counter() - start
+    return {"ms_per_image": 1000 * seconds / len(frames), "images_timed": len(frames),
+            "batch_size": batch_size, "threads": threads or os.cpu_count(), "measured_alone": True}
+
+
+def evaluate_model(weights, validation, cache_dir=DEFAULT_CACHE_DIR, imgsz=256, batch_size=16,
+                   backend="torch", precision="fp32", threads=None, timed=True):
+    """
+    Validate one weights file: predict the images that are not cached yet,
+    then score all predictions against the ground truth.
+
+    Args:
+        weights (str): Path to the weights (.pt).
+        validation (dict): load_validation_set's result.
+        cache_dir (str): PredictionCache folder; None disables caching.
+        imgsz (int): Inference image size.
+        batch_size (int): Images per predict call.
+        backend (str), precision (str), threads (int): See inference_backend.load_detector.
+        timed (bool): Also measure the latency (measure_latency) if it is not cached.
+                      Only meaningful when nothing else is running.
+
+    Returns:
+        dict: weights, precision/recall/map50/map50_95, ms_per_image,
+              images_per_s (None if not measured), and how many images were
+              predicted vs cached.
+    """
+    weights_digest = file_digest(weights)
+    settings = {"imgsz": imgsz, "conf": EVAL_CONF, "backend": backend, "precision": precision}
+    cache = PredictionCache(cache_dir) if cache_dir else None
+    predictions, timing = cache.load(weights_digest, settings) if cache else ({}, {})
+
+    image_digests = [file_digest(path) for path in validation["images"]]
+    missing = [i for i, digest in enumerate(image_digests) if digest not in predictions]
+    if missing:
+        model = load_detector(weights, backend, precision, threads, imgsz, batch_size=batch_size)
+        images = _read_images([validation["images"][i] for i in missing])
+        detections = detect_frames(model, images, batch_size, EVAL_CONF, imgsz)
+        bounds = np.searchsorted(detections['frame'], np.arange(len(missing) + 1))
+        for j, i in enumerate(missing):
+            predictions[image_digests[i]] = detections[bounds[j]:bounds[j + 1]]
+    # מהירות שנמדדה במקביל למודלים אחרים לא ניתנת להשוואה - נמדדת מחדש
+    if not timing.get("measured_alone"):
+        timing = {}
+    measured = timed and not timing
+    if measured:
+        timing = measure_latency(weights, validation["images"], imgsz, batch_size, backend, precision, threads)
+    if cache and (missing or measured):
+        cache.store(weights_digest, settings, predictions, timing)
+
+    correct, confidence, pred_classes = [], [], []
+    for digest, gt_boxes, gt_classes in zip(image_digests, validation["boxes"], validation["classes"]):
+        dets = predictions[digest]
+        boxes = np.stack([dets['x1'], dets['y1'], dets['x2'], dets['y2']], axis=1).astype(np.float64)
+        correct.append(match_predictions(boxes, dets['class'].astype(int), gt_boxes, gt_classes))
+        confidence.append(dets['confidence'])
+        pred_classes.append(dets['class'].astype(int))
+    metrics = detection_metrics(np.concatenate(correct), np.concatenate(confidence),
+                                np.concatenate(pred_classes), np.concatenate(validation["classes"]))
+
+    ms = timing.get("ms_per_image")
+    return {
+        "weights": weights,
+        "weights_digest": weights_digest[:16],
+        "backend": backend,
+        "precision_mode": precision,
+        **{key: round(value, 4) for key, value in metrics.items()},
+        "ms_per_image": round(ms, 2) if ms else None,
+        "images_per_s": round(1000 / ms, 1) if ms else None,
+        "images": len(image_digests),
+        "predicted": len(missing),
+        "cached": len(image_digests) - len(missing),
+    }
+
+
+def _evaluate_worker(weights, data, options):
+    try:
+        return evaluate_model(weights, load_validation_set(data), **options)
+    except Exception as e:
+        return {"weights": weights, "error": f"{type(e).__name__}: {e}"}
+
+
+def evaluate_models(weights_list, data, workers=None, cache_dir=DEFAULT_CACHE_DIR, output_json=None,
+                    output_csv=None, imgsz=256, batch_size=16, backend="torch", precision="fp32"):
+    """
+    Validate several weights files side by side, each in its own worker process.
+
+    Predictions are cached per weights digest (PredictionCache), so weights that
+    did not change since an earlier comparison are scored without running the
+    model again. Models that run in parallel share the CPU, so latency is not
+    measured in the workers: once they are done, the models without a cached
+    latency are timed one after the other (measure_latency) with all CPU threads.
+
+    Args:
+        weights_list (list): Paths to the candidate weights (e.g. runs/detect/train*/weights/best.pt).
+        data (str): Validation set: data.yaml or a folder of images (see load_validation_set).
+        workers (int): Worker processes (default: CPU count, at most one per model).
+        cache_dir (str): Prediction cache folder; None disables caching.
+        output_json (str): Write the results here as JSON.
+        output_csv (str): Write the results here as CSV (one row per weights file).
+
+    Returns:
+        list: One result dict per weights file, in the given order.
+    """
+    missing = [weights for weights in weights_list if not os.path.exists(weights)]
+    if missing:
+        raise FileNotFoundError(f"Model file not found: {', '.join(missing)}")
+    weights_list = list(dict.fromkeys(weights_list))
+    workers = max(1, min(workers or os.cpu_count() or 1, len(weights_list)))
+    options = {"cache_dir": cache_dir, "imgsz": imgsz, "batch_size": batch_size, "backend": backend,
+               "precision": precision, "threads": max(1, (os.cpu_count() or 1) // workers)}
+
+    print(f"[INFO] Evaluating {len(weights_list)} models with {workers} workers")
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_evaluate_worker, weights, data, dict(options, timed=False)): weights
+                   for weights in weights_list}
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            if "error" in result:
+                print(f"[FAILED] {result['weights']}: {result['error']}")
+            else:
+                print(f"[SUCCESS] {result['weights']} ({result['predicted']} predicted, {result['cached']} cached)")
+    results = [results[weights] for weights in weights_list]
+
+    untimed = [result for result in results if "error" not in result and result["ms_per_image"] is None]
+    if untimed:
+        print(f"[INFO] Measuring the latency of {len(untimed)} models, one at a time")
+        images = load_validation_set(data)["images"]
+        settings = {"imgsz": imgsz, "conf": EVAL_CONF, "backend": backend, "precision": precision}
+        for result in untimed:
+            timing = measure_latency(result["weights"], images, imgsz, batch_size, backend, precision)
+            if cache_dir:
+                PredictionCache(cache_dir).store_timing(file_digest(result["weights"]), settings, timing)
+            result["ms_per_image"] = round(timing["ms_per_image"], 2)
+            result["images_per_s"] = round(1000 / timing["ms_per_image"], 1)
+
+    if output_json:
+        with open(output_json, "w", encoding="utf-8") as f:
+            json.dump({"data": data, "imgsz": imgsz, "models": results}, f, indent=2)
+        print(f" Evaluation saved to: {output_json}")
+    if output_csv:
+        pd.DataFrame(results).to_csv(output_csv, index=False)
+        print(f" Evaluation saved to: {output_csv}")
+    return results
+
+
+def print_comparison(results):
+    """
+    Print the metrics of every model side by side, marking the best one per metric.
+    """
+    results = [result for result in results if "error" not in result]
+    if not results:
+        return
+    labels = [f"Model {i + 1}" for i in range(len(results))]
+    print("\n📊 Comparison:")
+    for label, result in zip(labels, results):
+        print(f"  {label}: {result['weights']}")
+    print(f"{'Metric':<14}" + "".join(f"{label:>12}" for label in labels) + f"{'Better':>10}")
+    print("-" * (24 + 12 * len(labels)))
+    for key, name in METRIC_NAMES.items():
+        values = [result[key] for result in results]
+        known = [value for value in values if value is not None]
+        better = "-"
+        if known and len(set(known)) > 1:
+            best = min(known) if key in LOWER_IS_BETTER else max(known)
+            better = labels[values.index(best)]
+        cells = "".join(f"{value:>12.3f}" if value is not None else f"{'-':>12}" for value in values)
+        print(f"{name:<14}{cells}{better:>10}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        print("Usage: python model_evaluation.py <data_yaml | images_dir> <output_prefix> <weights> [weights ...]")
+        sys.exit(1)
+
+    prefix = sys.argv[2]
+    try:
+        results = evaluate_models(sys.argv[3:], sys.argv[1], output_json=prefix + ".json",
+                                  output_csv=prefix + ".csv")
+        print_comparison(results)
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
@@ -1,8 +1,21 @@
 import sys
-from ultralytics import YOLO
+import itertools
+import numpy as np
+import cv2
 import os
 
-def run_yolo_inference(model_path, frames_folder, output_project, output_name):
+# One row per detected box, in pixel coordinates of the original frame
+DETECTION_DTYPE = np.dtype([
+    ('frame', np.int32),
+    ('x1', np.float32),
+    ('y1', np.float32),
+    ('x2', np.float32),
+    ('y2', np.float32),
+    ('confidence', np.float32),
+    ('class', np.int16),
+])
+
+def run_yolo_inference(model_path, frames_folder, output_project, output_name, imgsz=256):
     """
     Run YOLOv8 prediction on a folder of frames.
 
@@ -11,6 +24,9 @@ def run_yolo_inference(model_path, frames_folder, output_project, output_name):
         frames_folder (str): Path to folder containing input frames.
         output_project (str): Directory for YOLO output (like 'yolo_output').
         output_name (str): Subfolder name inside the project folder.
+        imgsz (int): Inference image size (the model was trained at 256). Frames
+                     larger than the model input are better served by detect_frames,
+                     which detects them in tiles.
 
     Returns:
         dict: Summary with success and output folder path.
@@ -20,13 +36,15 @@ def run_yolo_inference(model_path, frames_folder, output_project, output_name):
     if not os.path.exists(model_path):
         raise FileNotFoundError(f"Model file not found: {model_path}")
 
+    # ultralytics נטען רק כשצריך אותו, כדי שהמודול ייטען גם בלעדיו (ONNX, benchmark)
+    from ultralytics import YOLO
     model = YOLO(model_path)
     results = model.predict(
         source=frames_folder,
         save_txt=True,
         save=False,
         conf=0.25,
-        imgsz=256,
+        imgsz=imgsz,
         project=output_project,
         name=output_name,
         exist_ok=True
@@ -40,6 +58,242 @@ def run_yolo_inference(model_path, frames_folder, output_project, output_name):
         "num_images": len(results)
     }
 
+def _to_numpy(values):
+    return values.cpu().numpy() if hasattr(values, "cpu") else np.asarray(values)
+
+def _result_to_detections(result, frame):
+    boxes = result.boxes
+    dets = np.empty(len(boxes), dtype=DETECTION_DTYPE)
+    if len(dets):
+        xyxy = _to_numpy(boxes.xyxy)
+        dets['frame'] = frame
+        dets['x1'], dets['y1'], dets['x2'], dets['y2'] = xyxy.T
+        dets['confidence'] = _to_numpy(boxes.conf)
+        dets['class'] = _to_numpy(boxes.cls)
+    return dets
+
+def _predict_batch(model, originals, batch, first_frame, conf, imgsz):
+    results = model.predict(source=batch, conf=conf, imgsz=imgsz, save=False, verbose=False)
+    for offset, (frame, result) in enumerate(zip(originals, results)):
+        yield first_frame + offset, frame, _result_to_detections(result, first_frame + offset)
+
+def tile_origins(length, tile_size, overlap):
+    """
+    Start offsets of tiles covering `length` pixels; the last tile ends at the edge.
+    """
+    if length <= tile_size:
+        return [0]
+    stride = tile_size - overlap
+    return list(range(0, length - tile_size, stride)) + [length - tile_size]
+
+def nms(boxes, scores, iou_threshold=0.5):
+    """
+    Greedy non-maximum suppression. Returns the indices of the kept boxes, ascending.
+    """
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = np.argsort(-scores, kind='stable')
+    keep = []
+    while order.size:
+        i, rest = order[0], order[1:]
+        keep.append(i)
+        w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = w * h
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.sort(np.array(keep, dtype=np.int64))
+
+def _tile_detections(dets, x0, y0, tile_w, tile_h, width, height, edge_margin):
+    # תיבה שנוגעת בגבול פנימי של האריח חתוכה - האריח השכן (בזכות החפיפה) רואה אותה שלמה
+    x1, y1, x2, y2 = dets['x1'], dets['y1'], dets['x2'], dets['y2']
+    cut = np.zeros(len(dets), dtype=bool)
+    if x0 > 0:
+        cut |= x1 < edge_margin
+    if y0 > 0:
+        cut |= y1 < edge_margin
+    if x0 + tile_w < width:
+        cut |= x2 > tile_w - edge_margin
+    if y0 + tile_h < height:
+        cut |= y2 > tile_h - edge_margin
+    dets = dets[~cut]
+    dets['x1'] += x0
+    dets['x2'] += x0
+    dets['y1'] += y0
+    dets['y2'] += y0
+    return dets
+
+def _merge_tiles(parts, iou):
+    dets = np.concatenate(parts)
+    if len(parts) == 1 or len(dets) < 2:
+        return dets
+    boxes = np.stack([dets['x1'], dets['y1'], dets['x2'], dets['y2']], axis=1).astype(np.float64)
+    # NMS לפי מחלקה: הזזה של כל מחלקה לאזור משלה
+    boxes += (dets['class'].astype(np.float64) * (boxes.max() + 1))[:, None]
+    return dets[nms(boxes, dets['confidence'].astype(np.float64), iou)]
+
+def _iter_tiled_detections(model, frames, batch_size, conf, imgsz, tile_size, overlap, iou, edge_margin,
+                           prefilter=None):
+    pending = {}
+    crops, owners = [], []
+    next_frame = 0
+    frames = iter(frames)
+    roi = prefilter is not None and prefilter.roi
+
+    def predict():
+        nonlocal crops, owners
+        results = model.predict(source=crops, conf=conf, imgsz=imgsz, save=False, verbose=False)
+        for (i, slot, x0, y0, holder), crop, result in zip(owners, crops, results):
+            entry = pending[i]
+            tile_h, tile_w = crop.shape[:2]
+            dets = _tile_detections(_result_to_detections(result, i), x0, y0, tile_w, tile_h,
+                                    entry["width"], entry["height"], edge_margin)
+            if holder is not None:
+                holder["dets"] = dets
+            entry["parts"][slot] = dets
+            entry["left"] -= 1
+        crops, owners = [], []
+
+    def ready():
+        nonlocal next_frame
+        # פריים יוצא רק כשכל האריחים שלו חזרו, ותמיד לפי הסדר - ולכן גם
+        # הזיהויים שהוא משתמש בהם מחדש (מפריים קודם) כבר מוכנים
+        while next_frame in pending and pending[next_frame]["left"] == 0:
+            entry = pending.pop(next_frame)
+            parts = entry["parts"]
+            for slot, holder in entry["reused"]:
+                parts[slot] = prefilter.restamp(holder, next_frame)
+            # אריחים לפי הסדר, כך שהתוצאה זהה לזו בלי המסנן
+            parts = [part for part in parts if part is not None]
+            dets = _merge_tiles(parts, iou) if parts else np.empty(0, dtype=DETECTION_DTYPE)
+            if entry["holder"] is not None:
+                entry["holder"]["dets"] = dets
+            yield next_frame, entry["frame"], dets
+            next_frame += 1
+
+    i = 0
+    while True:
+        chunk = list(itertools.islice(frames, batch_size))
+        if not chunk:
+            break
+        blank = prefilter.blank_frames(chunk) if prefilter is not None else [False] * len(chunk)
+        for frame, is_blank in zip(chunk, blank):
+            image = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR) if frame.ndim == 2 else frame
+            height, width = image.shape[:2]
+            tile_w, tile_h = (tile_size, tile_size) if tile_size else (width, height)
+            tiles = [(slot, x0, y0, None) for slot, (y0, x0) in enumerate(
+                itertools.product(tile_origins(height, tile_h, overlap), tile_origins(width, tile_w, overlap)))]
+            entry = {"frame": frame, "width": width, "height": height, "parts": [None] * len(tiles),
+                     "reused": [], "holder": None}
+
+            if prefilter is not None:
+                prefilter.counts["frames"] += 1
+                if is_blank:
+                    prefilter.counts["blank"] += 1
+                    tiles = []
+                elif not roi:
+                    holder, detect = prefilter.lookup(None, frame)
+                    if detect:
+                        entry["holder"] = holder
+                    else:
+                        entry["reused"].append((0, holder))
+                        tiles = []
+                else:
+                    moved = []
+                    for slot, x0, y0, _ in tiles:
+                        holder, detect = prefilter.lookup((x0, y0), frame[y0:y0 + tile_h, x0:x0 + tile_w])
+                        if detect:
+                            moved.append((slot, x0, y0, holder))
+                        else:
+                            entry["reused"].append((slot, holder))
+                    tiles = moved
+                if not tiles and not is_blank:
+                    prefilter.counts["skipped"] += 1
+
+            entry["left"] = len(tiles)
+            pending[i] = entry
+            for slot, x0, y0, holder in tiles:
+                crops.append(np.ascontiguousarray(image[y0:y0 + tile_h, x0:x0 + tile_w]))
+                owners.append((i, slot, x0, y0, holder))
+                if len(crops) == batch_size:
+                    predict()
+            yield from ready()
+            i += 1
+    if crops:
+        predict()
+    yield from ready()
+
+def iter_detections(model, frames, batch_size=16, conf=0.25, imgsz=256, tile_size=None, tile_overlap=32,
+                    iou=0.5, edge_margin=2, prefilter=None):
+    """
+    Streaming form of detect_frames: yields (frame_index, frame, detections) for
+    every frame, in order, as soon as its batch has been predicted.
+    `frame` is the input frame as given; `detections` is a DETECTION_DTYPE array.
+
+    With tile_size, every frame is cut into overlapping tile_size x tile_size
+    tiles that are predicted at native resolution (batch_size tiles per call,
+    across frames). Boxes touching an inner tile border are dropped (the
+    overlapping neighbour sees them whole, as long as objects are smaller than
+    tile_overlap - edge_margin), and duplicates in the overlaps are merged by NMS.
+
+    With a frame_prefilter.FramePrefilter, blank frames are not predicted at all
+    and static frames (or, with its roi option, static tiles) reuse their last
+    detections; every frame is still yielded under its own index.
+    """
+    if isinstance(model, str):
+        if not os.path.exists(model):
+            raise FileNotFoundError(f"Model file not found: {model}")
+        from ultralytics import YOLO
+        model = YOLO(model)
+
+    if tile_size and not 0 <= tile_overlap < tile_size:
+        raise ValueError(f"tile_overlap must be in [0, {tile_size})")
+    if tile_size or prefilter is not None:
+        # בלי אריחים כל הפריים הוא "אריח" יחיד
+        yield from _iter_tiled_detections(model, frames, batch_size, conf, imgsz, tile_size, tile_overlap,
+                                          iou, edge_margin, prefilter)
+        return
+
+    originals = []
+    batch = []
+    first_frame = 0
+    for i, frame in enumerate(frames):
+        originals.append(frame)
+        batch.append(cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR) if frame.ndim == 2 else frame)
+        if len(batch) == batch_size:
+            yield from _predict_batch(model, originals, batch, first_frame, conf, imgsz)
+            first_frame = i + 1
+            originals, batch = [], []
+    if batch:
+        yield from _predict_batch(model, originals, batch, first_frame, conf, imgsz)
+
+def detect_frames(model, frames, batch_size=16, conf=0.25, imgsz=256, tile_size=None, tile_overlap=32,
+                  prefilter=None):
+    """
+    Run YOLO on in-memory frames, batch by batch, without touching the disk.
+
+    Args:
+        model (YOLO | str): Loaded YOLO model, or path to the .pt file.
+        frames (iterable): uint8 frames (grayscale or BGR), in frame order.
+        batch_size (int): Number of frames passed to each model.predict call.
+        conf (float): Confidence threshold.
+        imgsz (int): Inference image size.
+        tile_size (int): Predict overlapping tiles of this size at native resolution
+                         instead of resizing whole frames to imgsz (see iter_detections).
+        tile_overlap (int): Overlap between neighbouring tiles, in pixels.
+        prefilter (FramePrefilter): Skip blank frames and reuse detections of static
+                                    frames/tiles (see iter_detections).
+
+    Returns:
+        np.ndarray: Structured array with DETECTION_DTYPE (frame, x1, y1, x2, y2, confidence, class).
+    """
+    parts = [dets for _, _, dets in iter_detections(model, frames, batch_size, conf, imgsz, tile_size, tile_overlap,
+                                                    prefilter=prefilter)
+             if len(dets)]
+    if not parts:
+        return np.empty(0, dtype=DETECTION_DTYPE)
+    return np.concatenate(parts)
+
 if __name__ == "__main__":
     if len(sys.argv) != 5:
         print("Usage: python predict_yolov.py <model_path> <frames_folder> <output_project> <output_name>")
@@ -0,0 +1,68 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import cv2
+import numpy as np
+
+FRAME_FORMATS = ("png", "npy")
+
+
+def _write_frame(path, frame, fmt, compression):
+    if fmt == "npy":
+        np.save(path, frame)
+        return path
+    params = [] if compression is None else [cv2.IMWRITE_PNG_COMPRESSION, int(compression)]
+    if not cv2.imwrite(path, frame, params):
+        raise IOError(f"Could not write frame: {path}")
+    return path
+
+
+def write_frames_parallel(frames, output_folder, workers=None, compression=None, fmt="png",
+                          use_processes=False, name_pattern="frame_{:04d}", indexed=False):
+    """
+    Write a stream of frames to disk on a pool of workers.
+
+    cv2.imwrite releases the GIL while it compresses, so the default thread pool
+    already spreads PNG encoding across cores without pickling every frame;
+    use_processes=True switches to a process pool.
+    At most a few frames per worker are queued at once, so a streamed input
+    keeps memory bounded.
+
+    Args:
+        frames (iterable): uint8 frames in frame order.
+        output_folder (str): Folder the frames are written to.
+        workers (int): Pool size. Defaults to the number of CPUs.
+        compression (int): PNG compression level 0-9 (0 = none). None keeps OpenCV's default.
+        fmt (str): "png", or "npy" for raw uncompressed intermediates that are
+                   only read back by our own code.
+        use_processes (bool): Use a process pool instead of threads.
+        name_pattern (str): File name (without extension) for frame i.
+        indexed (bool): `frames` yields (i, frame) pairs, for streams with gaps.
+
+    Returns:
+        int: Number of frames written.
+    """
+    if fmt not in FRAME_FORMATS:
+        raise ValueError(f"Unknown frame format: {fmt}")
+
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(output_folder, exist_ok=True)
+
+    executor_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    max_pending = workers * 4
+    pending = set()
+    count = 0
+
+    with executor_cls(max_workers=workers) as executor:
+        for i, frame in (frames if indexed else enumerate(frames)):
+            path = os.path.join(output_folder, f"{name_pattern.format(i)}.{fmt}")
+            pending.add(executor.submit(_write_frame, path, frame, fmt, compression))
+            count += 1
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+        for future in pending:
+            future.result()
+
+    return count
@@ -0,0 +1,415 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from lsm_frame_source import LsmFrames, iter_lsm_frames, read_frame_geometry
+from parallel_frame_writer import write_frames_parallel
+from out_of_model_yolov import detect_frames
+from Simple_Euclidean_Tracker import track_detections
+from Removes_bad_sperm_tracks import filter_tracks, MAX_ANGLE, MIN_FRAMES
+from main_video_of_test_track_algoritem import render_tracking_frames
+from video_of_test_out_yolov import render_detection_frames
+from streaming_pipeline import stream_video
+from From_csv_after_correction_to_final_data import summarize_tracks
+from graph_of_sperm_tracks import plot_tracks_df
+from casa_metrics import compute_casa_metrics
+from track_table_io import apply_schema, write_table, read_table, DETECTION_SCHEMA, TRACK_SCHEMA
+from stage_cache import file_digest
+from run_metrics import RunReport
+from frame_prefilter import FramePrefilter
+from inference_backend import load_detector
+
+PREFILTER_MODES = ("frames", "roi")
+
+MODES = ("detection", "tracking_noise", "tracking_filtered")
+
+FINAL_VIDEO_NAMES = {
+    "detection": "labeled_video.mp4",
+    "tracking_noise": "tracked_video.mp4",
+    "tracking_filtered": "filtered_tracking_video.mp4",
+}
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "best.pt")
+
+
+def write_detections(detections, path):
+    """
+    Store a DETECTION_DTYPE array as a typed columnar table (centers included)
+    and return it as a DataFrame.
+    """
+    detections_df = apply_schema(pd.DataFrame(detections), DETECTION_SCHEMA)
+    write_table(detections_df, path)
+    return detections_df
+
+
+def stage_keys(cache, video_path, model_path, conf, imgsz, tracker_mode, distance_threshold, max_gap,
+               tile_size=None, tile_overlap=None, prefilter=None, backend="torch", precision="fp32"):
+    """
+    Cache keys of every stage. Each key chains the key of the stage it reads
+    from, so a change in the input, the weights or any upstream parameter
+    invalidates everything downstream of it.
+    """
+    weights = file_digest(model_path) if os.path.exists(model_path) else model_path
+    keys = {"frames": cache.key("frames", video=file_digest(video_path))}
+    detect_params = {"conf": conf, "imgsz": imgsz}
+    if tile_size:
+        detect_params.update(tile_size=tile_size, tile_overlap=tile_overlap)
+    if prefilter is not None:
+        detect_params.update(prefilter=prefilter.params())
+    if backend != "torch":
+        detect_params.update(backend=backend, precision=precision)
+    keys["detect"] = cache.key("detect", frames=keys["frames"], weights=weights, **detect_params)
+    keys["track"] = cache.key("track", detect=keys["detect"], tracker_mode=tracker_mode,
+                              distance_threshold=distance_threshold, max_gap=max_gap)
+    keys["filter"] = cache.key("filter", track=keys["track"], max_angle=MAX_ANGLE, min_frames=MIN_FRAMES)
+    return keys
+
+
+def cached_stage(cache, keys, stage, compute, save, load):
+    """
+    Return the cached output of `stage` if there is one, otherwise compute() it
+    and store it with save(value, folder). load(folder) reads a cached entry.
+    """
+    if cache is not None:
+        entry = cache.lookup(stage, keys[stage])
+        if entry is not None:
+            return load(entry)
+    value = compute()
+    if cache is not None:
+        cache.store(stage, keys[stage], lambda folder: save(value, folder))
+    return value
+
+
+def _write_frames_entry(folder, geometry, fill):
+    """
+    Preallocate frames.npy in a cache entry as a uint8 (num_frames, height, width)
+    memmap sized from the header, and have fill(stack) write the frames into it
+    as they are decoded; fill returns how many it wrote.
+    """
+    stack = np.lib.format.open_memmap(os.path.join(folder, "frames.npy"), mode="w+", dtype=np.uint8,
+                                      shape=(geometry.num_frames, geometry.height, geometry.width))
+    count = fill(stack)
+    stack.flush()
+    # הקובץ נסגר לפני שהרשומה עוברת למקומה (ב-Windows אי אפשר לשנות שם של קובץ ממופה)
+    del stack
+    if count != geometry.num_frames:
+        raise ValueError(f"Decoded {count} frames, the header says {geometry.num_frames}")
+
+
+def _decode_into(video_path, stack):
+    count = 0
+    for count, frame in enumerate(iter_lsm_frames(video_path), 1):
+        stack[count - 1] = frame
+    return count
+
+
+def _split_frames(cache, keys, video_path, geometry):
+    """
+    Frames for the stages after the split: the cached stack, memory-mapped (decoded
+    straight into the cache entry on a miss), or without a cache an LsmFrames
+    view that decodes the file again on every pass.
+    """
+    if cache is None:
+        return LsmFrames(video_path, geometry)
+    entry = cache.lookup("frames", keys["frames"])
+    if entry is None:
+        entry = cache.store("frames", keys["frames"], lambda folder: _write_frames_entry(
+            folder, geometry, lambda stack: _decode_into(video_path, stack)))
+    return _load_frames(entry)
+
+
+def _load_frames(folder):
+    return np.load(os.path.join(folder, "frames.npy"), mmap_mode="r")
+
+
+def _save_detections(detections, folder):
+    np.save(os.path.join(folder, "detections.npy"), detections)
+
+
+def _load_detections(folder):
+    return np.load(os.path.join(folder, "detections.npy"))
+
+
+def _save_tracks(tracks, folder):
+    write_table(tracks, os.path.join(folder, "tracks.cols"), TRACK_SCHEMA)
+
+
+def _load_tracks(folder):
+    return read_table(os.path.join(folder, "tracks.cols"))
+
+
+def _store_streamed(cache, keys, streamed):
+    cache.store("detect", keys["detect"], lambda folder: _save_detections(streamed["detections"], folder))
+    if "tracks" in streamed:
+        cache.store("track", keys["track"], lambda folder: _save_tracks(streamed["tracks"], folder))
+
+
+def run_pipeline(video_path, output_dir, mode, model_path=DEFAULT_MODEL_PATH, model=None,
+                 batch_size=16, conf=0.25, imgsz=256, frame_workers=None, png_compression=None,
+                 tracker_mode="greedy", distance_threshold=30, max_gap=2,
+                 pixel_size_um=None, frame_rate=None, export_csv=True, cache=None, save_frames=True,
+                 timings=None, streaming=False, report=True, profiler=None,
+                 video_codec="mp4v", video_quality=None, labeled_frames=True, tiling=True, tile_overlap=32,
+                 prefilter=None, backend="torch", precision="fp32", threads=None, calibration_images=None):
+    """
+    Run the whole analysis in a single process, one stage after another.
+
+    Frames and detections are handed from stage to stage as arrays and tables as
+    DataFrames. The detections and final tracks are also kept as typed columnar
+    tables (detections.cols / tracks.cols) for later reuse; the CSV copies are
+    only an export for the client (same names as before).
+
+    With a StageCache, frames, detections and tracks are reused from earlier
+    runs whose input, weights and stage parameters match, so re-running the
+    same upload in another mode only costs the stages that differ.
+
+    Args:
+        video_path (str): Path to the input LSM file.
+        output_dir (str): Session folder where the outputs are written.
+        mode (str): One of "detection", "tracking_noise", "tracking_filtered".
+        model_path (str): Path to the trained YOLO weights.
+        model (YOLO): Already loaded detector to reuse (see inference_backend.load_detector);
+                      loaded from model_path if None.
+        batch_size (int): Frames per model.predict call.
+        conf (float): Detection confidence threshold.
+        imgsz (int): Inference image size (the size the model was trained at).
+        frame_workers (int): Parallel PNG writers for the frames folder (default: CPU count).
+        png_compression (int): PNG compression level 0-9 for the frames folder.
+        tracker_mode (str): Tracker mode, see Simple_Euclidean_Tracker.TRACKER_MODES.
+        distance_threshold (float): Maximum center distance for a track to continue.
+        max_gap (int): Missed frames a track survives (predictive tracker mode only).
+        pixel_size_um (float): Pixel size in micrometers; with frame_rate, enables casa_metrics.csv.
+                               Defaults to the voxel size in the LSM header.
+        frame_rate (float): Acquisition frame rate in frames per second. Defaults to
+                            1 / the frame interval in the LSM header.
+        export_csv (bool): Also write sort_input.csv and the tracks CSV.
+        cache (StageCache): Stage cache shared between runs; None disables caching.
+        save_frames (bool): Write the frames folder (nothing downstream reads it).
+        timings (list): List the (stage, seconds) entries are appended to as stages
+                        finish, so another thread can follow the progress of the run.
+        streaming (bool): Run decoding, detection, tracking and (when it does not need
+                          the filter) rendering concurrently on bounded queues; see
+                          streaming_pipeline.stream_video. Same outputs either way.
+        report (bool): Write run_report.json (per-stage wall/CPU time, peak RSS,
+                       frames/sec and rows, plus the run parameters) to output_dir.
+        profiler (str): "cprofile" or "pyinstrument" to profile every stage into
+                        output_dir/profiles/<stage>.prof / .html; None disables it.
+        video_codec (str): Codec of the result video: "mp4v", "avc1" or "h264"
+                           (browser-playable, via ffmpeg); see video_writer.
+        video_quality (int): Constant quality for the h264 codec (CRF for libx264).
+        labeled_frames (bool): Also write every labeled frame to labeled_frames/.
+        tiling (bool): Frames larger than imgsz (per the file header) are detected in
+                       overlapping imgsz tiles at native resolution instead of being
+                       downsampled to imgsz; see out_of_model_yolov.iter_detections.
+        tile_overlap (int): Overlap between tiles, in pixels (more than a cell's size).
+        prefilter (str): "frames" skips blank frames and reuses the detections of frames
+                         that did not change since they were last detected; "roi" does
+                         the same per detection tile. Frame numbers are kept, so the
+                         tracks see every frame. None (default) detects every frame.
+        backend (str): "torch" (ultralytics, default), or "onnx" / "openvino" to run an
+                       ONNX export of the weights on the CPU; see inference_backend.
+        precision (str): "fp32", "fp16" or "int8" (onnx/openvino backends only).
+        threads (int): CPU threads the detector uses (default: all cores).
+        calibration_images (str): Folder of representative frames for the int8 export.
+
+    Returns:
+        dict: Output paths plus "timings", a list of (stage, seconds), and
+              "stages", the per-stage metrics.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Invalid processing mode: {mode}")
+    if prefilter is not None and prefilter not in PREFILTER_MODES:
+        raise ValueError(f"Invalid prefilter: {prefilter} (expected one of {PREFILTER_MODES})")
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    frames_dir = os.path.join(output_dir, "frames")
+    video_name = os.path.basename(video_path)
+
+    if not os.path.exists(video_path):
+        raise FileNotFoundError(f"LSM file not found at {video_path}")
+
+    # הגיאומטריה נקראת פעם אחת מהכותרת וקובעת אם מזהים באריחים
+    geometry = read_frame_geometry(video_path)
+    tile_size = imgsz if tiling and max(geometry.width, geometry.height) > imgsz else None
+    print(f"[INFO] Frames: {geometry.width}x{geometry.height}, {geometry.num_frames} frames"
+          + (f", detected in {tile_size}px tiles" if tile_size else ""))
+    # הכיול של CASA מהכותרת, אלא אם הקורא נתן ערכים משלו
+    if pixel_size_um is None:
+        pixel_size_um = geometry.pixel_size_um
+    if frame_rate is None and geometry.frame_interval_s:
+        frame_rate = 1 / geometry.frame_interval_s
+
+    gate = FramePrefilter(roi=prefilter == "roi") if prefilter else None
+    run = RunReport(timings, profiler=profiler, profile_dir=os.path.join(output_dir, "profiles"))
+    outputs = {"mode": mode, "geometry": geometry._asdict()}
+    keys = None
+    if cache is not None:
+        keys = stage_keys(cache, video_path, model_path, conf, imgsz, tracker_mode, distance_threshold, max_gap,
+                          tile_size, tile_overlap, gate, backend, precision)
+
+    def load_model():
+        nonlocal model
+        if model is None:
+            model = load_detector(model_path, backend, precision, threads, imgsz, calibration_images, batch_size)
+        return model
+
+    def finish():
+        outputs["num_frames"] = num_frames
+        if gate is not None and gate.counts["frames"]:
+            outputs["prefilter"] = gate.summary()
+        outputs["timings"] = run.timings
+        outputs["stages"] = run.stages
+        run.print_report()
+        if report:
+            outputs["report"] = run.write(
+                os.path.join(output_dir, "run_report.json"),
+                video=video_path, mode=mode, num_frames=num_frames, geometry=geometry._asdict(),
+                model=model_path, weights=file_digest(model_path) if os.path.exists(model_path) else None,
+                params={"batch_size": batch_size, "conf": conf, "imgsz": imgsz, "backend": backend,
+                        "precision": precision, "threads": threads, "tile_size": tile_size,
+                        "tile_overlap": tile_overlap if tile_size else None, "tracker_mode": tracker_mode,
+                        "distance_threshold": distance_threshold, "max_gap": max_gap,
+                        "streaming": streaming, "cache": cache is not None, "save_frames": save_frames,
+                        "video_codec": video_codec, "video_quality": video_quality,
+                        "labeled_frames": labeled_frames,
+                        "prefilter": dict(gate.params(), mode=prefilter) if gate else None},
+                stage_busy=outputs.get("stage_busy"), prefilter=outputs.get("prefilter"))
+        return outputs
+
+    final_video = os.path.join(output_dir, FINAL_VIDEO_NAMES[mode])
+    video_options = {"codec": video_codec, "quality": video_quality, "labeled_frames": labeled_frames}
+
+    def rendered(written):
+        # None כשלא היו פריימים לכתוב - אין קובץ סרטון
+        outputs["video"] = written["output_video"]
+        outputs["video_codec"] = written["codec"]
+        if written["labeled_frames_dir"]:
+            outputs["labeled_frames_dir"] = written["labeled_frames_dir"]
+    # בלי זרימה כשהזיהויים כבר במטמון - אין שלב כבד שכדאי לחפוף
+    streamed = None
+    if streaming and (cache is None or cache.lookup("detect", keys["detect"]) is None):
+        with run.stage("stream") as stage:
+            def stream(frame_store=None):
+                return stream_video(video_path, mode, load_model(), final_video, batch_size=batch_size,
+                                    conf=conf, imgsz=imgsz, tile_size=tile_size, tile_overlap=tile_overlap,
+                                    prefilter=gate, tracker_mode=tracker_mode,
+                                    distance_threshold=distance_threshold, max_gap=max_gap,
+                                    frame_store=frame_store, **video_options)
+
+            frames_entry = cache.lookup("frames", keys["frames"]) if cache is not None else None
+            if cache is not None and frames_entry is None:
+                # הפריימים נכתבים לרשומת המטמון תוך כדי הפענוח, בלי להחזיק אותם בזיכרון
+                streamed = {}
+
+                def stream_into(stack):
+                    streamed.update(stream(stack))
+                    return streamed["num_frames"]
+
+                frames_entry = cache.store("frames", keys["frames"],
+                                           lambda folder: _write_frames_entry(folder, geometry, stream_into))
+            else:
+                streamed = stream()
+            # השלבים שאחרי הזרימה (שמירת פריימים, סרטון מסונן) קוראים מהמטמון או מפענחים שוב
+            frames = _load_frames(frames_entry) if frames_entry else LsmFrames(video_path, geometry)
+            detections, num_frames = streamed["detections"], streamed["num_frames"]
+            if "render" in streamed:
+                rendered(streamed["render"])
+            if cache is not None:
+                _store_streamed(cache, keys, streamed)
+            if save_frames:
+                write_frames_parallel(frames, frames_dir, workers=frame_workers, compression=png_compression)
+                outputs["frames_dir"] = frames_dir
+            stage["frames"], stage["rows"] = num_frames, len(detections)
+        outputs["stage_busy"] = streamed["busy"]
+        print("[TIMING] Busy time of the overlapped stages: " +
+              ", ".join(f"{name} {seconds:.2f}s" for name, seconds in streamed["busy"].items()))
+    else:
+        with run.stage("split") as stage:
+            frames = _split_frames(cache, keys, video_path, geometry)
+            num_frames = len(frames)
+            if save_frames:
+                write_frames_parallel(frames, frames_dir, workers=frame_workers, compression=png_compression)
+                outputs["frames_dir"] = frames_dir
+            stage["frames"] = stage["rows"] = num_frames
+
+        with run.stage("detect") as stage:
+            detections = cached_stage(cache, keys, "detect",
+                                      lambda: detect_frames(load_model(), frames, batch_size=batch_size,
+                                                            conf=conf, imgsz=imgsz, tile_size=tile_size,
+                                                            tile_overlap=tile_overlap, prefilter=gate),
+                                      _save_detections, _load_detections)
+            stage["frames"], stage["rows"] = num_frames, len(detections)
+
+    if mode == "detection":
+        if streamed is None:
+            with run.stage("render") as stage:
+                rendered(render_detection_frames(frames, detections, final_video, **video_options))
+                stage["frames"], stage["rows"] = num_frames, len(detections)
+        return finish()
+
+    with run.stage("convert") as stage:
+        outputs["detections_table"] = os.path.join(output_dir, "detections.cols")
+        detections_df = write_detections(detections, outputs["detections_table"])
+        if export_csv:
+            detections_df.to_csv(os.path.join(output_dir, "sort_input.csv"), index=False)
+        stage["rows"] = len(detections_df)
+
+    if streamed is not None:
+        tracks = streamed["tracks"]
+    else:
+        with run.stage("track") as stage:
+            tracks = cached_stage(cache, keys, "track",
+                                  lambda: track_detections(detections_df, distance_threshold, tracker_mode,
+                                                           max_gap=max_gap),
+                                  _save_tracks, _load_tracks)
+            stage["frames"], stage["rows"] = num_frames, len(tracks)
+
+    if mode == "tracking_filtered":
+        tracks_csv = os.path.join(output_dir, "filtered_tracks.csv")
+        with run.stage("filter") as stage:
+            tracks = cached_stage(cache, keys, "filter", lambda: filter_tracks(tracks), _save_tracks, _load_tracks)
+            stage["rows"] = len(tracks)
+        if tracks.empty:
+            raise RuntimeError("No valid tracks found after filtering.")
+    else:
+        tracks_csv = os.path.join(output_dir, "simple_tracks.csv")
+    outputs["tracks_table"] = write_table(tracks, os.path.join(output_dir, "tracks.cols"), TRACK_SCHEMA)
+    if export_csv:
+        tracks.to_csv(tracks_csv, index=False)
+        outputs["tracks_csv"] = tracks_csv
+
+    # במצב זרימה עם רעש הסרטון כבר נכתב תוך כדי המעקב
+    if streamed is None or mode == "tracking_filtered":
+        with run.stage("render") as stage:
+            rendered(render_tracking_frames(frames, tracks, final_video, **video_options))
+            stage["frames"], stage["rows"] = num_frames, len(tracks)
+
+    final_summary_csv = os.path.join(output_dir, "final_summary.csv")
+    with run.stage("summarize") as stage:
+        summarize_tracks(tracks, video_name).to_csv(final_summary_csv, index=False)
+        if pixel_size_um and frame_rate:
+            outputs["casa_csv"] = os.path.join(output_dir, "casa_metrics.csv")
+            casa = compute_casa_metrics(tracks, pixel_size_um, frame_rate)
+            casa.round(3).to_csv(outputs["casa_csv"], index=False)
+        stage["rows"] = len(tracks)
+
+    graph_output = os.path.join(output_dir, "graph.png")
+    with run.stage("plot") as stage:
+        plot_tracks_df(tracks, graph_output)
+        stage["rows"] = len(tracks)
+
+    outputs.update({
+        "summary_csv": final_summary_csv,
+        "graph": graph_output,
+    })
+    return finish()
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (4, 5):
+        print("Usage: python pipeline_engine.py <input_video> <output_dir> <mode> [cprofile|pyinstrument]")
+        sys.exit(1)
+
+    run_pipeline(sys.argv[1], sys.argv[2], sys.argv[3], profiler=sys.argv[4] if len(sys.argv) == 5 else None)
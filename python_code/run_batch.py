@@ -0,0 +1,253 @@
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+from natsort import natsorted
+
+from pipeline_engine import run_pipeline, MODES, DEFAULT_MODEL_PATH
+from stage_cache import StageCache
+from inference_backend import load_detector, export_onnx
+
+VIDEO_EXTENSIONS = (".lsm",)
+
+# המודל נטען פעם אחת לכל תהליך עובד (ב-initializer) ומשמש לכל הסרטונים שלו
+_worker_model = None
+_worker_cache = None
+# תור שבו כל עובד מודיע על סרטון שהתחיל - כדי לדעת מה רץ כשתהליך קרס
+_worker_started = None
+
+
+def collect_videos(source):
+    """
+    Videos to process: every LSM file in a directory, or the paths listed in a
+    manifest file (one per line, relative to the manifest; blank lines and lines
+    starting with '#' are skipped).
+    """
+    if os.path.isdir(source):
+        return natsorted(os.path.join(source, f) for f in os.listdir(source)
+                         if f.lower().endswith(VIDEO_EXTENSIONS))
+    if not os.path.exists(source):
+        raise FileNotFoundError(f"Video folder or manifest not found: {source}")
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    with open(source) as f:
+        lines = [line.strip() for line in f]
+    return [os.path.join(base_dir, line) for line in lines if line and not line.startswith("#")]
+
+
+def output_dirs(videos, output_root):
+    """
+    One output folder per video, named after the file (numbered if two files share a name).
+    """
+    dirs, seen = [], {}
+    for video in videos:
+        stem = os.path.splitext(os.path.basename(video))[0]
+        seen[stem] = seen.get(stem, 0) + 1
+        name = stem if seen[stem] == 1 else f"{stem}_{seen[stem]}"
+        dirs.append(os.path.join(output_root, name))
+    return dirs
+
+
+def _init_worker(model_path, cache_dir, threads, detector_options, started=None):
+    global _worker_model, _worker_cache, _worker_started
+    _worker_model = load_detector(model_path, threads=threads, **detector_options)
+    _worker_cache = StageCache(cache_dir) if cache_dir else None
+    _worker_started = started
+
+
+def _process_video(video_path, output_dir, mode, model_path, pipeline_kwargs):
+    if _worker_started is not None:
+        _worker_started.put(output_dir)
+    start = time.perf_counter()
+    try:
+        outputs = run_pipeline(video_path, output_dir, mode, model_path=model_path, model=_worker_model,
+                               cache=_worker_cache, **pipeline_kwargs)
+        status, error = "ok", ""
+    except Exception as e:
+        outputs, status, error = {}, "failed", f"{type(e).__name__}: {e}"
+    return {
+        "video": video_path,
+        "output_dir": output_dir,
+        "status": status,
+        "seconds": round(time.perf_counter() - start, 2),
+        "summary_csv": outputs.get("summary_csv", ""),
+        "run_report": outputs.get("report", ""),
+        "error": error,
+    }
+
+
+def _failed_result(video, output_dir, error):
+    return {"video": video, "output_dir": output_dir, "status": "failed", "seconds": 0.0,
+            "summary_csv": "", "run_report": "", "error": error}
+
+
+def _run_pool(jobs, workers, initargs, started, task_args, record):
+    """
+    Run (video, output_dir) jobs on one process pool, passing each result to `record`.
+
+    Returns:
+        tuple: (unfinished, running) - the jobs without a result because the pool
+               broke (a worker process died), and those of them that had started.
+               Both empty if the pool finished normally.
+    """
+    finished = set()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=initargs + (started,)) as executor:
+        futures = {executor.submit(_process_video, video, out_dir, *task_args): (video, out_dir)
+                   for video, out_dir in jobs}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                continue
+            finished.add(futures[future])
+            record(result)
+
+    begun = set()
+    while not started.empty():
+        begun.add(started.get())
+    unfinished = [job for job in jobs if job not in finished]
+    return unfinished, [job for job in unfinished if job[1] in begun]
+
+
+def combine_summaries(results, output_csv):
+    """
+    Concatenate the final_summary.csv of every successful video into one table.
+    The per-category mean rows get the video's name too, so every row is attributable.
+    """
+    frames = []
+    for result in results:
+        if result["status"] != "ok" or not result["summary_csv"]:
+            continue
+        summary = pd.read_csv(result["summary_csv"])
+        summary["video_name"] = summary["video_name"].fillna(os.path.basename(result["video"]))
+        frames.append(summary)
+    if not frames:
+        return None
+    pd.concat(frames, ignore_index=True).to_csv(output_csv, index=False)
+    return output_csv
+
+
+def run_batch(source, output_root, mode, workers=None, model_path=DEFAULT_MODEL_PATH, cache_dir=None,
+              **pipeline_kwargs):
+    """
+    Run the pipeline over many videos on a pool of worker processes.
+
+    Each worker loads the detector once (inference_backend.load_detector, with the
+    backend/precision/imgsz given in pipeline_kwargs) and reuses it for every video
+    it gets; the CPU threads are split evenly between the workers.
+    A failing video is recorded in the batch report and does not stop the batch.
+    If a worker process dies, the pool is rebuilt and the unfinished videos are
+    resubmitted; the videos that were running are retried one at a time first,
+    so only the one that brings its worker down again is marked failed.
+
+    Args:
+        source (str): Folder with LSM files, or a manifest file listing them.
+        output_root (str): Folder that gets one sub-folder per video plus the batch files.
+        mode (str): One of pipeline_engine.MODES.
+        workers (int): Worker processes (default: CPU count, at most the number of videos).
+        model_path (str): Path to the trained YOLO weights.
+        cache_dir (str): Stage cache folder shared by all workers; None disables caching.
+        **pipeline_kwargs: Extra run_pipeline arguments (conf, tracker_mode, backend, ...).
+
+    Returns:
+        dict: results (one dict per video), report_csv, combined_summary_csv,
+              seconds and videos_per_hour.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Invalid processing mode: {mode}")
+
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Model file not found: {model_path}")
+
+    videos = collect_videos(source)
+    if not videos:
+        raise ValueError(f"No videos found in: {source}")
+
+    os.makedirs(output_root, exist_ok=True)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(videos)))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    pipeline_kwargs.setdefault("save_frames", False)
+    detector_options = {key: pipeline_kwargs[key] for key in ("backend", "precision", "imgsz", "calibration_images")
+                        if key in pipeline_kwargs}
+    if detector_options.get("backend", "torch") != "torch":
+        # הייצוא נעשה פעם אחת כאן, לפני שהעובדים טוענים אותו
+        export_onnx(model_path, detector_options.get("imgsz", 256), detector_options.get("precision", "fp32"),
+                    detector_options.get("calibration_images"))
+
+    print(f"[INFO] Processing {len(videos)} videos in '{mode}' mode with {workers} workers")
+    start = time.perf_counter()
+    results = []
+
+    def record(result):
+        results.append(result)
+        tag = "[SUCCESS]" if result["status"] == "ok" else "[FAILED]"
+        print(f"{tag} {os.path.basename(result['video'])} ({len(results)}/{len(videos)}) {result['error']}")
+
+    initargs = (model_path, cache_dir, threads, detector_options)
+    task_args = (mode, model_path, pipeline_kwargs)
+    started = multiprocessing.SimpleQueue()
+    queued = list(zip(videos, output_dirs(videos, output_root)))
+    suspects = []
+    while queued or suspects:
+        # סרטון שרץ כשעובד קרס רץ שוב לבד - אם הוא מפיל שוב את העובד, הוא האשם
+        isolated = bool(suspects)
+        jobs = [suspects.pop(0)] if isolated else queued
+        if not isolated:
+            queued = []
+        unfinished, running = _run_pool(jobs, 1 if isolated else workers, initargs, started, task_args, record)
+        if not unfinished:
+            continue
+        if not running:
+            # העובדים נפלו לפני שסרטון כלשהו התחיל (למשל המודל לא נטען) - אין טעם לנסות שוב
+            crashed, error = unfinished, "Worker process failed to start"
+        elif isolated or len(running) == 1:
+            crashed, error = running, "Worker process died while processing this video"
+        else:
+            crashed = []
+            suspects.extend(running)
+        for video, out_dir in crashed:
+            record(_failed_result(video, out_dir, error))
+        queued = [job for job in unfinished if job not in crashed and job not in running] + queued
+        if queued or suspects:
+            print(f"[WARN] A worker process died; restarting the pool for {len(queued) + len(suspects)} videos")
+
+    elapsed = time.perf_counter() - start
+    order = {video: i for i, video in enumerate(videos)}
+    results.sort(key=lambda r: order[r["video"]])
+
+    report_csv = os.path.join(output_root, "batch_report.csv")
+    pd.DataFrame(results).to_csv(report_csv, index=False)
+    combined_csv = None
+    if mode != "detection":
+        combined_csv = combine_summaries(results, os.path.join(output_root, "combined_summary.csv"))
+
+    succeeded = sum(result["status"] == "ok" for result in results)
+    videos_per_hour = 3600 * succeeded / elapsed if elapsed else 0.0
+    print(f"\n[INFO] {succeeded}/{len(videos)} videos succeeded in {elapsed:.1f}s "
+          f"({videos_per_hour:.1f} videos/hour)")
+    print(f" Batch report saved to: {report_csv}")
+    if combined_csv:
+        print(f" Combined summary saved to: {combined_csv}")
+
+    return {
+        "results": results,
+        "report_csv": report_csv,
+        "combined_summary_csv": combined_csv,
+        "seconds": elapsed,
+        "videos_per_hour": videos_per_hour,
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (4, 5):
+        print("Usage: python run_batch.py <videos_dir_or_manifest> <output_dir> <mode> [workers]")
+        sys.exit(1)
+
+    workers = int(sys.argv[4]) if len(sys.argv) == 5 else None
+    batch = run_batch(sys.argv[1], sys.argv[2], sys.argv[3], workers=workers)
+    sys.exit(0 if any(result["status"] == "ok" for result in batch["results"]) else 1)
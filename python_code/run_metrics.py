@@ -0,0 +1,156 @@
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROFILERS = ("cprofile", "pyinstrument")
+
+
+def peak_rss_mb():
+    """
+    Peak resident memory of this process so far, in MB (None if it cannot be read).
+    """
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux מחזיר KB, macOS מחזיר bytes
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+
+
+class _StageProfiler:
+    """
+    cProfile or pyinstrument around one stage; the result is written to
+    <profile_dir>/<stage>.prof (cProfile, open with snakeviz/pstats) or <stage>.html.
+    cProfile only sees the calling thread; pyinstrument also samples the others.
+    """
+
+    def __init__(self, kind, profile_dir, name):
+        if kind not in PROFILERS:
+            raise ValueError(f"Unknown profiler: {kind} (expected one of {PROFILERS})")
+        self.kind = kind
+        self.path = os.path.join(profile_dir, f"{name}.{'prof' if kind == 'cprofile' else 'html'}")
+        if kind == "cprofile":
+            import cProfile
+            self.profiler = cProfile.Profile()
+        else:
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                raise ImportError("pyinstrument is not installed (pip install pyinstrument).")
+            self.profiler = Profiler()
+
+    def start(self):
+        if self.kind == "cprofile":
+            self.profiler.enable()
+        else:
+            self.profiler.start()
+
+    def stop(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if self.kind == "cprofile":
+            self.profiler.disable()
+            self.profiler.dump_stats(self.path)
+        else:
+            self.profiler.stop()
+            with open(self.path, "w", encoding="utf-8") as f:
+                f.write(self.profiler.output_html())
+        return self.path
+
+
+class RunReport:
+    """
+    Per-stage metrics of one pipeline run.
+
+    For every stage: wall time, CPU time (all threads of the process), peak RSS
+    at the end of the stage and how much the stage raised it, plus the frames and
+    rows it handled (set by the stage through the dict `stage()` yields) and
+    frames per second. The (stage, seconds) pairs are also appended to `timings`,
+    so a caller holding that list can follow the run.
+    """
+
+    def __init__(self, timings=None, profiler=None, profile_dir=None):
+        if profiler is not None and profiler not in PROFILERS:
+            raise ValueError(f"Unknown profiler: {profiler} (expected one of {PROFILERS})")
+        self.timings = [] if timings is None else timings
+        self.stages = []
+        self.profiler = profiler
+        self.profile_dir = profile_dir
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Measure one stage. Usage:
+
+            with report.stage("detect") as stage:
+                ...
+                stage["frames"], stage["rows"] = len(frames), len(detections)
+        """
+        print(f"\n[INFO] Running step: {name}")
+        stage = {"stage": name, "frames": None, "rows": None}
+        profiler = _StageProfiler(self.profiler, self.profile_dir, name) if self.profiler else None
+        rss_before = peak_rss_mb()
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        if profiler:
+            profiler.start()
+        try:
+            yield stage
+        finally:
+            if profiler:
+                stage["profile"] = profiler.stop()
+            wall = time.perf_counter() - start
+            peak = peak_rss_mb()
+            stage.update({
+                "wall_s": round(wall, 4),
+                "cpu_s": round(time.process_time() - cpu_start, 4),
+                "peak_rss_mb": round(peak, 1) if peak is not None else None,
+                "rss_growth_mb": round(peak - rss_before, 1) if peak is not None else None,
+                "fps": round(stage["frames"] / wall, 2) if stage["frames"] and wall > 0 else None,
+            })
+            self.stages.append(stage)
+        self.timings.append((name, wall))
+        print(f"[SUCCESS] Step '{name}' completed in {wall:.2f}s.")
+
+    def print_report(self):
+        total = sum(stage["wall_s"] for stage in self.stages)
+        print("\n[TIMING] Per-stage report:")
+        print(f"  {'stage':<12}{'wall':>10}{'share':>8}{'cpu':>10}{'peak MB':>10}{'fps':>9}{'rows':>9}")
+        for stage in self.stages:
+            share = 100 * stage["wall_s"] / total if total else 0.0
+            peak = f"{stage['peak_rss_mb']:.0f}" if stage["peak_rss_mb"] is not None else "-"
+            fps = f"{stage['fps']:.1f}" if stage["fps"] is not None else "-"
+            rows = stage["rows"] if stage["rows"] is not None else "-"
+            print(f"  {stage['stage']:<12}{stage['wall_s']:>9.2f}s{share:>7.1f}%{stage['cpu_s']:>9.2f}s"
+                  f"{peak:>10}{fps:>9}{rows:>9}")
+        print(f"  {'total':<12}{total:>9.2f}s")
+
+    def write(self, path, **info):
+        """
+        Write the run report as JSON: `info` (run parameters etc.), the total and
+        per-stage metrics. Returns the path.
+        """
+        report = {
+            **info,
+            "started_at": self.started_at,
+            "total_s": round(time.perf_counter() - self._start, 4),
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": self.stages,
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f" Run report saved to: {path}")
+        return path
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+# ברירת מחדל: 5GB לכל המטמון, הישן ביותר (לפי שימוש אחרון) נמחק ראשון
+DEFAULT_MAX_BYTES = 5 * 1024 ** 3
+COMPLETE_MARKER = "_complete"
+
+_digest_memo = {}
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """
+    SHA-256 of a file's content, read in chunks.
+
+    Digests are remembered per (path, size, mtime) for the life of the process,
+    so the model weights are only hashed once per worker.
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _digest_memo:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                sha.update(chunk)
+        _digest_memo[memo_key] = sha.hexdigest()
+    return _digest_memo[memo_key]
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class StageCache:
+    """
+    Content-addressed on-disk cache for pipeline stage outputs.
+
+    Every entry is a folder <root>/<stage>/<key>, where the key is a hash of
+    everything the stage output depends on (input digests and parameters).
+    Entries are written to a temporary folder and renamed into place, so
+    several runners can share the same root. When the total size goes over
+    max_bytes, the least recently used entries are removed.
+    """
+
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    def key(self, stage, **params):
+        """
+        Cache key for `stage` from its inputs (digests, parent keys and parameters).
+        """
+        payload = json.dumps({"stage": stage, **params}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, stage, key):
+        return os.path.join(self.root, stage, key)
+
+    def lookup(self, stage, key):
+        """
+        Return the entry folder for (stage, key), or None on a miss.
+        A hit marks the entry as recently used.
+        """
+        path = self._entry_path(stage, key)
+        if not os.path.exists(os.path.join(path, COMPLETE_MARKER)):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        print(f"[CACHE] Hit for '{stage}' ({key[:12]})")
+        return path
+
+    def store(self, stage, key, write_fn):
+        """
+        Create the entry for (stage, key) by calling write_fn(folder), then evict
+        old entries if the cache is over its size limit.
+
+        Returns:
+            str: The entry folder.
+        """
+        path = self._entry_path(stage, key)
+        tmp_path = os.path.join(self.root, stage, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(tmp_path)
+        try:
+            write_fn(tmp_path)
+            open(os.path.join(tmp_path, COMPLETE_MARKER), "w").close()
+            try:
+                os.rename(tmp_path, path)
+            except OSError:
+                if not os.path.isdir(path):
+                    raise
+                # ריצה מקבילית כבר כתבה את אותה רשומה
+                shutil.rmtree(tmp_path, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        os.utime(path)
+        self.evict(keep=path)
+        return path
+
+    def entries(self):
+        """
+        All complete entries as (last_used, size_bytes, path), oldest first.
+        """
+        found = []
+        for stage in os.listdir(self.root):
+            stage_dir = os.path.join(self.root, stage)
+            if not os.path.isdir(stage_dir):
+                continue
+            for name in os.listdir(stage_dir):
+                path = os.path.join(stage_dir, name)
+                if name.startswith(".tmp-") or not os.path.exists(os.path.join(path, COMPLETE_MARKER)):
+                    continue
+                try:
+                    found.append((os.path.getmtime(path), _dir_size(path), path))
+                except OSError:
+                    continue
+        return sorted(found)
+
+    def evict(self, keep=None):
+        """
+        Remove least recently used entries until the cache fits in max_bytes.
+        The entry `keep` (the one just written) is never removed.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            removed += 1
+        if removed:
+            print(f"[CACHE] Evicted {removed} entries ({total / 1024 ** 2:.1f} MB kept)")
+        return removed
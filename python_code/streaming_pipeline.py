@@ -0,0 +1,211 @@
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+import pandas as pd
+
+from lsm_frame_source import iter_lsm_frames
+from out_of_model_yolov import iter_detections, DETECTION_DTYPE
+from Simple_Euclidean_Tracker import make_tracker, TRACK_COLUMNS
+from main_video_of_test_track_algoritem import draw_tracks, write_labeled_video
+from video_of_test_out_yolov import draw_detections, detection_boxes
+
+# כמה פריימים לכל היותר ממתינים בין שני שלבים - שומר על זיכרון חסום
+DEFAULT_QUEUE_SIZE = 8
+
+_END = object()
+
+
+def run_stage_threads(stages, queue_size=DEFAULT_QUEUE_SIZE):
+    """
+    Run a chain of stages concurrently, one thread per stage, connected by bounded queues.
+
+    Each stage is (name, fn): fn gets an iterator over the previous stage's
+    outputs (None for the first stage) and returns an iterable of its own
+    outputs. The last stage's outputs are dropped. A full queue blocks the stage
+    that feeds it, so a slow stage throttles everything before it.
+    If any stage raises, all stages stop and the first error is raised here.
+
+    Returns:
+        dict: stage name -> busy seconds (time not spent waiting on a queue).
+    """
+    stop = threading.Event()
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) - 1)]
+    errors = []
+    busy = {}
+
+    def put(q, item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def items_from(q, state):
+        while not state["exhausted"]:
+            start = time.perf_counter()
+            try:
+                item = q.get(timeout=0.1)
+            except queue.Empty:
+                state["waited"] += time.perf_counter() - start
+                if stop.is_set():
+                    return
+                continue
+            state["waited"] += time.perf_counter() - start
+            if item is _END:
+                state["exhausted"] = True
+                return
+            yield item
+
+    def worker(i, name, fn):
+        state = {"waited": 0.0, "exhausted": False}
+        start = time.perf_counter()
+        inbox = queues[i - 1] if i > 0 else None
+        outbox = queues[i] if i < len(queues) else None
+        try:
+            for item in fn(items_from(inbox, state) if inbox is not None else None):
+                if outbox is not None:
+                    put_start = time.perf_counter()
+                    if not put(outbox, item):
+                        break
+                    state["waited"] += time.perf_counter() - put_start
+            # a stage that stopped reading early must not leave the previous one blocked
+            if inbox is not None:
+                for _ in items_from(inbox, state):
+                    pass
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            if outbox is not None:
+                put(outbox, _END)
+            busy[name] = time.perf_counter() - start - state["waited"]
+
+    threads = [threading.Thread(target=worker, args=(i, name, fn), name=f"stage-{name}", daemon=True)
+               for i, (name, fn) in enumerate(stages)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+    return {name: busy[name] for name, _ in stages}
+
+
+def stream_video(video_path, mode, model, output_video=None, batch_size=16, conf=0.25, imgsz=256,
+                 tile_size=None, tile_overlap=32, prefilter=None, tracker_mode="greedy", distance_threshold=30, max_gap=2,
+                 frame_store=None, queue_size=DEFAULT_QUEUE_SIZE, **video_options):
+    """
+    Decode, detect, track and render one video with all stages running at once.
+
+    Frames flow through the stages one by one: while YOLO works on one batch,
+    the next frames are being decoded and earlier ones tracked and written to
+    the video. Tracking is online (make_tracker), and gives the same tracks as
+    track_detections on the full detections table.
+
+    Args:
+        video_path (str): Path to the input LSM file.
+        mode (str): "detection" renders boxes; "tracking_noise" tracks and renders
+                    the tracks; "tracking_filtered" tracks only (the filter needs
+                    whole tracks, so rendering happens afterwards).
+        model (YOLO): Loaded model.
+        tile_size (int): Detect in overlapping tiles of this size (see iter_detections).
+        prefilter (FramePrefilter): Skip blank frames and reuse detections of static ones.
+        output_video (str): Video to render (detection and tracking_noise modes).
+        frame_store (np.ndarray): Preallocated (num_frames, height, width) array,
+                                  e.g. a .npy memmap, that each frame is written
+                                  into as it is decoded; frames are not kept otherwise.
+        queue_size (int): Maximum items waiting between two stages.
+        **video_options: codec, quality, labeled_frames (see write_labeled_video).
+
+    Returns:
+        dict: detections (DETECTION_DTYPE array), tracks (DataFrame, tracking modes),
+              num_frames, busy (seconds per stage) and
+              render (write_labeled_video's result, if a video was rendered).
+    """
+    detection_parts = []
+    track_parts = []
+    num_frames = 0
+    rendered = {}
+
+    def decode(_):
+        nonlocal num_frames
+        for frame in iter_lsm_frames(video_path):
+            if frame_store is not None:
+                frame_store[num_frames] = frame
+            num_frames += 1
+            yield frame
+
+    def detect(items):
+        for frame_index, frame, dets in iter_detections(model, items, batch_size, conf, imgsz,
+                                                        tile_size, tile_overlap, prefilter=prefilter):
+            if len(dets):
+                detection_parts.append(dets)
+            yield frame_index, frame, dets
+
+    def track(items):
+        tracker = make_tracker(tracker_mode, distance_threshold, max_gap)
+        for frame_index, frame, dets in items:
+            boxes = np.stack([dets['x1'], dets['y1'], dets['x2'], dets['y2']], axis=1).astype(np.float64)
+            ids = np.empty(0, dtype=np.int64)
+            if len(dets):
+                centers = np.column_stack([(boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2])
+                ids, order = tracker.step(frame_index, centers)
+                ids, boxes, centers = ids[order], boxes[order], centers[order]
+                track_parts.append((np.full(len(ids), frame_index, dtype=np.int64), ids, boxes, centers))
+            yield frame_index, frame, boxes.astype(int), ids
+
+    def to_bgr(frame):
+        return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR) if frame.ndim == 2 else frame.copy()
+
+    def render_detections(items):
+        rendered.update(write_labeled_video(
+            ((f"frame_{i:04d}.png", draw_detections(to_bgr(frame), detection_boxes(dets)))
+             for i, frame, dets in items), output_video, fps=10, **video_options))
+        return ()
+
+    def render_tracks(items):
+        rendered.update(write_labeled_video(
+            ((f"frame_{i:04d}.png", draw_tracks(to_bgr(frame), boxes, ids))
+             for i, frame, boxes, ids in items), output_video, fps=1, **video_options))
+        return ()
+
+    stages = [("decode", decode), ("detect", detect)]
+    if mode == "detection":
+        stages.append(("render", render_detections))
+    else:
+        stages.append(("track", track))
+        if mode == "tracking_noise":
+            stages.append(("render", render_tracks))
+
+    busy = run_stage_threads(stages, queue_size)
+
+    result = {
+        "detections": np.concatenate(detection_parts) if detection_parts else np.empty(0, dtype=DETECTION_DTYPE),
+        "num_frames": num_frames,
+        "busy": busy,
+    }
+    if rendered:
+        result["render"] = rendered
+    if mode != "detection":
+        if track_parts:
+            frame_col, ids, boxes, centers = (np.concatenate(part) for part in zip(*track_parts))
+        else:
+            frame_col, ids = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+            boxes, centers = np.empty((0, 4)), np.empty((0, 2))
+        result["tracks"] = pd.DataFrame({
+            "frame": frame_col,
+            "track_id": ids,
+            "x1": boxes[:, 0],
+            "y1": boxes[:, 1],
+            "x2": boxes[:, 2],
+            "y2": boxes[:, 3],
+            "x_center": centers[:, 0],
+            "y_center": centers[:, 1],
+        }, columns=TRACK_COLUMNS)
+    return result
@@ -0,0 +1,54 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+import tifffile as tiff
+
+# הסקריפטים יושבים שטוח ב-python_code ומייבאים זה את זה בשם המודול
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark_suite import generate_motility, render_synthetic_frames, StubDetector  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def motility():
+    """
+    A small synthetic video (truth + the detections a detector would report).
+    """
+    return generate_motility(num_cells=15, num_frames=30, seed=1)
+
+
+@pytest.fixture
+def detections_df(motility):
+    return pd.DataFrame(motility["detections"])
+
+
+@pytest.fixture(scope="session")
+def synthetic_lsm(tmp_path_factory, motility):
+    """
+    The synthetic video rendered to a TIFF stack with an .lsm name, as the pipeline reads it.
+    """
+    path = tmp_path_factory.mktemp("videos") / "synthetic.lsm"
+    tiff.imwrite(path, np.stack(render_synthetic_frames(motility)))
+    return str(path)
+
+
+class CountingDetector(StubDetector):
+    """
+    StubDetector that counts the images it was asked to predict.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.images = 0
+
+    def predict(self, source, **kwargs):
+        self.images += len(source)
+        return super().predict(source, **kwargs)
+
+
+@pytest.fixture
+def detector():
+    return CountingDetector()
@@ -0,0 +1,42 @@
+import os
+
+import pandas as pd
+import pytest
+
+from pipeline_engine import run_pipeline
+from stage_cache import StageCache
+
+
+def _read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("mode", ["tracking_noise", "tracking_filtered"])
+def test_streaming_matches_batch(tmp_path, synthetic_lsm, detector, mode):
+    batch = run_pipeline(synthetic_lsm, str(tmp_path / "batch"), mode, model=detector,
+                         streaming=False, save_frames=False, report=False)
+    streamed = run_pipeline(synthetic_lsm, str(tmp_path / "stream"), mode, model=detector,
+                            streaming=True, save_frames=False, report=False)
+
+    assert os.path.basename(batch["tracks_csv"]) == os.path.basename(streamed["tracks_csv"])
+    assert len(pd.read_csv(batch["tracks_csv"])) > 0
+    assert _read_bytes(batch["tracks_csv"]) == _read_bytes(streamed["tracks_csv"])
+    assert _read_bytes(batch["summary_csv"]) == _read_bytes(streamed["summary_csv"])
+
+
+def test_streaming_with_a_warm_cache_matches_batch(tmp_path, synthetic_lsm, detector):
+    cache = StageCache(str(tmp_path / "cache"))
+    batch = run_pipeline(synthetic_lsm, str(tmp_path / "batch"), "tracking_filtered", model=detector,
+                         cache=cache, streaming=False, save_frames=False, report=False)
+    streamed = run_pipeline(synthetic_lsm, str(tmp_path / "stream"), "tracking_filtered", model=detector,
+                            cache=cache, streaming=True, save_frames=False, report=False)
+
+    assert _read_bytes(batch["tracks_csv"]) == _read_bytes(streamed["tracks_csv"])
+
+
+def test_filtered_tracks_file_name(tmp_path, synthetic_lsm, detector):
+    result = run_pipeline(synthetic_lsm, str(tmp_path / "out"), "tracking_filtered", model=detector,
+                          save_frames=False, report=False)
+
+    assert os.path.basename(result["tracks_csv"]) == "filtered_tracks.csv"
@@ -0,0 +1,67 @@
+import multiprocessing
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+import run_batch
+from benchmark_suite import StubDetector
+
+# הפונקציות המוחלפות עוברות לעובדים רק כשהם נוצרים ב-fork
+pytestmark = pytest.mark.skipif(multiprocessing.get_start_method() != "fork",
+                                reason="workers must inherit the patched pipeline (fork start method)")
+
+CRASHING_VIDEO = "video_2.lsm"
+FAILING_VIDEO = "video_3.lsm"
+
+
+@pytest.fixture
+def batch_inputs(tmp_path, synthetic_lsm, monkeypatch):
+    videos_dir = tmp_path / "videos"
+    videos_dir.mkdir()
+    for i in range(1, 5):
+        shutil.copy(synthetic_lsm, videos_dir / f"video_{i}.lsm")
+    model_path = tmp_path / "best.pt"
+    model_path.write_bytes(b"")
+
+    real_pipeline = run_batch.run_pipeline
+
+    def pipeline(video_path, output_dir, mode, **kwargs):
+        name = os.path.basename(video_path)
+        if name == CRASHING_VIDEO:
+            # כמו קריסה של ספרייה נייטיבית - התהליך נעלם בלי חריגה
+            os._exit(1)
+        if name == FAILING_VIDEO:
+            raise ValueError("Corrupted LSM")
+        return real_pipeline(video_path, output_dir, mode, report=False, **kwargs)
+
+    monkeypatch.setattr(run_batch, "load_detector", lambda *args, **kwargs: StubDetector())
+    monkeypatch.setattr(run_batch, "run_pipeline", pipeline)
+    return str(videos_dir), str(model_path)
+
+
+def test_worker_crash_fails_only_its_video(tmp_path, batch_inputs):
+    videos_dir, model_path = batch_inputs
+
+    batch = run_batch.run_batch(videos_dir, str(tmp_path / "out"), "tracking_filtered", workers=2,
+                                model_path=model_path)
+
+    status = {os.path.basename(r["video"]): r["status"] for r in batch["results"]}
+    errors = {os.path.basename(r["video"]): r["error"] for r in batch["results"]}
+    assert status == {"video_1.lsm": "ok", "video_2.lsm": "failed", "video_3.lsm": "failed", "video_4.lsm": "ok"}
+    assert errors[CRASHING_VIDEO] == "Worker process died while processing this video"
+    assert errors[FAILING_VIDEO] == "ValueError: Corrupted LSM"
+
+    report = pd.read_csv(batch["report_csv"])
+    assert len(report) == 4
+    combined = pd.read_csv(batch["combined_summary_csv"])
+    assert set(combined["video_name"].dropna()) <= {"video_1.lsm", "video_4.lsm"}
+
+
+def test_missing_model_is_reported_before_starting(tmp_path, batch_inputs):
+    videos_dir, _ = batch_inputs
+
+    with pytest.raises(FileNotFoundError):
+        run_batch.run_batch(videos_dir, str(tmp_path / "out"), "tracking_filtered",
+                            model_path=str(tmp_path / "missing.pt"))
@@ -0,0 +1,91 @@
+import os
+
+from pipeline_engine import cached_stage, run_pipeline
+from stage_cache import StageCache
+
+
+def _write_value(value):
+    def write(folder):
+        with open(os.path.join(folder, "value.txt"), "w") as f:
+            f.write(value)
+    return write
+
+
+def test_lookup_misses_then_hits(tmp_path):
+    cache = StageCache(str(tmp_path / "cache"))
+    key = cache.key("detect", video="abc", conf=0.25)
+
+    assert cache.lookup("detect", key) is None
+    path = cache.store("detect", key, _write_value("boxes"))
+
+    assert cache.lookup("detect", key) == path
+    with open(os.path.join(path, "value.txt")) as f:
+        assert f.read() == "boxes"
+
+
+def test_other_parameters_miss(tmp_path):
+    cache = StageCache(str(tmp_path / "cache"))
+    cache.store("detect", cache.key("detect", video="abc", conf=0.25), _write_value("boxes"))
+
+    assert cache.lookup("detect", cache.key("detect", video="abc", conf=0.5)) is None
+    assert cache.lookup("track", cache.key("track", video="abc", conf=0.25)) is None
+
+
+def test_failed_write_leaves_no_entry(tmp_path):
+    cache = StageCache(str(tmp_path / "cache"))
+    key = cache.key("detect", video="abc")
+
+    def broken(folder):
+        raise RuntimeError("disk full")
+
+    try:
+        cache.store("detect", key, broken)
+    except RuntimeError:
+        pass
+    assert cache.lookup("detect", key) is None
+    assert os.listdir(os.path.join(cache.root, "detect")) == []
+
+
+def test_cached_stage_computes_once(tmp_path):
+    cache = StageCache(str(tmp_path / "cache"))
+    keys = {"track": cache.key("track", video="abc")}
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return "tracks"
+
+    def save(value, folder):
+        _write_value(value)(folder)
+
+    def load(folder):
+        with open(os.path.join(folder, "value.txt")) as f:
+            return f.read()
+
+    assert cached_stage(cache, keys, "track", compute, save, load) == "tracks"
+    assert cached_stage(cache, keys, "track", compute, save, load) == "tracks"
+    assert len(calls) == 1
+
+
+def test_eviction_keeps_the_newest_entry(tmp_path):
+    cache = StageCache(str(tmp_path / "cache"), max_bytes=1)
+    first = cache.store("detect", cache.key("detect", video="a"), _write_value("a" * 100))
+    second = cache.store("detect", cache.key("detect", video="b"), _write_value("b" * 100))
+
+    assert not os.path.exists(first)
+    assert os.path.exists(second)
+
+
+def test_pipeline_rerun_is_served_from_the_cache(tmp_path, synthetic_lsm, detector):
+    cache = StageCache(str(tmp_path / "cache"))
+    cold = run_pipeline(synthetic_lsm, str(tmp_path / "cold"), "tracking_filtered", model=detector,
+                        cache=cache, save_frames=False, report=False)
+    assert detector.images > 0
+
+    detector.images = 0
+    warm = run_pipeline(synthetic_lsm, str(tmp_path / "warm"), "tracking_filtered", model=detector,
+                        cache=cache, save_frames=False, report=False)
+
+    assert detector.images == 0
+    with open(cold["tracks_csv"], "rb") as a, open(warm["tracks_csv"], "rb") as b:
+        assert a.read() == b.read()
@@ -0,0 +1,59 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Simple_Euclidean_Tracker import track_detections
+from track_table_io import (COLUMNAR_SUFFIX, DETECTION_SCHEMA, TRACK_SCHEMA, apply_schema, read_table,
+                            write_table)
+
+
+def test_cols_round_trip_keeps_values_and_dtypes(tmp_path, detections_df):
+    tracks = track_detections(detections_df)
+    path = str(tmp_path / f"tracks{COLUMNAR_SUFFIX}")
+
+    write_table(tracks, path, TRACK_SCHEMA)
+    loaded = read_table(path)
+
+    assert os.path.isdir(path)
+    assert list(loaded.columns) == list(TRACK_SCHEMA)
+    assert {col: str(dtype) for col, dtype in loaded.dtypes.items()} == TRACK_SCHEMA
+    pd.testing.assert_frame_equal(read_table(path, mmap=False), apply_schema(tracks, TRACK_SCHEMA))
+
+
+def test_cols_round_trip_of_detections(tmp_path, detections_df):
+    path = str(tmp_path / f"detections{COLUMNAR_SUFFIX}")
+
+    write_table(detections_df, path, DETECTION_SCHEMA)
+    loaded = read_table(path, mmap=False)
+
+    assert len(loaded) == len(detections_df)
+    np.testing.assert_array_equal(loaded["x1"], detections_df["x1"])
+    assert loaded["class"].dtype == np.int16
+
+
+def test_cols_overwrite_replaces_the_old_table(tmp_path, detections_df):
+    path = str(tmp_path / f"detections{COLUMNAR_SUFFIX}")
+    write_table(detections_df, path, DETECTION_SCHEMA)
+
+    write_table(detections_df.iloc[:3], path, DETECTION_SCHEMA)
+
+    assert len(read_table(path)) == 3
+
+
+def test_csv_round_trip(tmp_path, detections_df):
+    path = str(tmp_path / "tracks.csv")
+    tracks = apply_schema(track_detections(detections_df), TRACK_SCHEMA)
+
+    write_table(tracks, path)
+
+    pd.testing.assert_frame_equal(apply_schema(read_table(path), TRACK_SCHEMA), tracks)
+
+
+def test_missing_table_and_missing_columns(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        read_table(str(tmp_path / f"nothing{COLUMNAR_SUFFIX}"))
+    with pytest.raises(ValueError):
+        apply_schema(pd.DataFrame({"frame": [0], "x1": [0.0], "y1": [0.0], "x2": [4.0], "y2": [4.0]}),
+                     TRACK_SCHEMA)
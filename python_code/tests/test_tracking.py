@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.spatial.distance import cdist
+
+from benchmark_suite import generate_motility
+from Simple_Euclidean_Tracker import track_detections
+from Removes_bad_sperm_tracks import filter_tracks, MAX_ANGLE, MIN_FRAMES
+
+BOX_COLUMNS = ["frame", "track_id", "x1", "y1", "x2", "y2"]
+
+
+def baseline_track(df, distance_threshold=30):
+    """
+    The original loop-based track_with_euclidean, on a DataFrame instead of CSV files.
+    """
+    df = df.copy()
+    df['x_center'] = (df['x1'] + df['x2']) / 2
+    df['y_center'] = (df['y1'] + df['y2']) / 2
+    df = df.sort_values(by='frame')
+
+    tracks = []
+    next_track_id = 1
+    results = []
+    for frame, group in df.groupby('frame'):
+        detections = group[['x_center', 'y_center']].values
+        assigned = [False] * len(detections)
+        active_tracks = [t for t in tracks if not t['locked'] and (frame - t['last_seen_frame'] == 1)]
+
+        if active_tracks and len(detections) > 0:
+            track_centers = np.array([t['center'] for t in active_tracks])
+            dists = cdist(track_centers, detections)
+            used_detections = set()
+            for t_idx, track in enumerate(active_tracks):
+                d_idx = np.argmin(dists[t_idx])
+                if dists[t_idx][d_idx] < distance_threshold and not assigned[d_idx] \
+                        and d_idx not in used_detections:
+                    x1, y1, x2, y2 = group.iloc[d_idx][['x1', 'y1', 'x2', 'y2']]
+                    results.append([frame, track['id'], x1, y1, x2, y2])
+                    track['center'] = detections[d_idx]
+                    track['last_seen_frame'] = frame
+                    assigned[d_idx] = True
+                    used_detections.add(d_idx)
+
+        for idx, det in enumerate(detections):
+            if not assigned[idx]:
+                x1, y1, x2, y2 = group.iloc[idx][['x1', 'y1', 'x2', 'y2']]
+                results.append([frame, next_track_id, x1, y1, x2, y2])
+                tracks.append({'id': next_track_id, 'center': det, 'last_seen_frame': frame, 'locked': False})
+                next_track_id += 1
+
+        for trk in tracks:
+            if not trk['locked'] and (frame - trk['last_seen_frame'] > 0):
+                trk['locked'] = True
+    return pd.DataFrame(results, columns=BOX_COLUMNS)
+
+
+def baseline_filter(df, angle_thresh=MAX_ANGLE, min_frames=MIN_FRAMES):
+    """
+    The original per-track filter_tracks_by_angle / cut_track_by_angle, on a DataFrame.
+    """
+    df = df.copy()
+    df["x_center"] = (df["x1"] + df["x2"]) / 2
+    df["y_center"] = (df["y1"] + df["y2"]) / 2
+    valid_tracks = []
+    for _, group in df.groupby("track_id"):
+        group_sorted = group.sort_values("frame")
+        points = group_sorted[["x_center", "y_center"]].to_numpy()
+        if len(points) < min_frames:
+            continue
+        deltas = np.diff(points, axis=0)
+        speeds = np.linalg.norm(deltas, axis=1)
+        unit_deltas = deltas / (speeds[:, None] + 1e-6)
+        partial_track = group_sorted
+        for i in range(len(unit_deltas) - 1):
+            dot = np.dot(unit_deltas[i], unit_deltas[i + 1])
+            if np.degrees(np.arccos(np.clip(dot, -1.0, 1.0))) > angle_thresh:
+                partial_track = group_sorted.iloc[:i + 2]
+                break
+        if len(partial_track) >= min_frames:
+            valid_tracks.append(partial_track)
+    return pd.concat(valid_tracks) if valid_tracks else df.iloc[:0]
+
+
+def _rows(df):
+    return df[BOX_COLUMNS].sort_values(["frame", "track_id"]).reset_index(drop=True).astype(float)
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_greedy_tracking_matches_baseline(seed):
+    video = generate_motility(num_cells=25, num_frames=40, false_positives=2.0, seed=seed)
+    detections = pd.DataFrame(video["detections"])
+
+    tracks = track_detections(detections, distance_threshold=30, mode="greedy")
+
+    pd.testing.assert_frame_equal(_rows(tracks), _rows(baseline_track(detections, 30)))
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_angle_filter_matches_baseline(seed):
+    # פניות חדות כדי שהחיתוך באמת יופעל
+    video = generate_motility(num_cells=25, num_frames=40, turn_std=1.5, seed=seed)
+    tracks = baseline_track(pd.DataFrame(video["detections"]))
+
+    filtered = filter_tracks(tracks)
+    expected = baseline_filter(tracks)
+
+    assert 0 < len(expected) < len(tracks)
+    pd.testing.assert_frame_equal(_rows(filtered), _rows(expected))
+
+
+def test_angle_filter_keeps_the_turning_point():
+    # ישר ימינה, ואז חזרה שמאלה: הזווית בנקודה השלישית היא 180 מעלות
+    x = np.array([0.0, 10.0, 20.0, 10.0, 0.0])
+    tracks = pd.DataFrame({"frame": np.arange(5), "track_id": 1,
+                           "x1": x - 2, "y1": -2.0, "x2": x + 2, "y2": 2.0})
+
+    filtered = filter_tracks(tracks)
+
+    assert filtered["frame"].tolist() == [0, 1, 2]
+
+
+def test_angle_filter_of_an_empty_table():
+    empty = pd.DataFrame(columns=BOX_COLUMNS, dtype=float)
+    assert filter_tracks(empty).empty
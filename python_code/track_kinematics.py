@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+# גבולות קטגוריות המהירות (פיקסלים לפריים)
+SLOW_LIMIT = 4
+MEDIUM_LIMIT = 12
+
+
+def sort_tracks(df):
+    """
+    Sort a tracks table by (track_id, frame) and return it with the start row of every track.
+
+    Returns:
+        tuple: (sorted DataFrame with a fresh index, starts array)
+    """
+    df = df.sort_values(by=["track_id", "frame"], kind="stable").reset_index(drop=True)
+    track_ids = df["track_id"].to_numpy()
+    starts = np.flatnonzero(np.r_[True, track_ids[1:] != track_ids[:-1]]) if len(df) else np.empty(0, dtype=int)
+    return df, starts
+
+
+def segment_mean(values, starts):
+    """
+    Per-segment mean of `values`, ignoring NaNs (NaN for segments with no valid value).
+    """
+    valid = ~np.isnan(values)
+    sums = np.add.reduceat(np.where(valid, values, 0.0), starts)
+    n_valid = np.add.reduceat(valid.astype(np.int64), starts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n_valid > 0, sums / n_valid, np.nan)
+
+
+def segment_max(values, starts):
+    """
+    Per-segment max of `values`, ignoring NaNs (NaN for segments with no valid value).
+    """
+    filled = np.where(np.isnan(values), -np.inf, values)
+    maxima = np.maximum.reduceat(filled, starts)
+    return np.where(np.isneginf(maxima), np.nan, maxima)
+
+
+def classify_speeds(avg_velocity):
+    """
+    Speed category of every track: "slow" below SLOW_LIMIT, "medium" below
+    MEDIUM_LIMIT, otherwise (NaN included) "fast".
+    """
+    return np.where(avg_velocity < SLOW_LIMIT, "slow",
+                    np.where(avg_velocity < MEDIUM_LIMIT, "medium", "fast"))
+
+
+def compute_track_kinematics(df):
+    """
+    Per-track kinematics for every track at once, using segment reductions over
+    a (track_id, frame)-sorted table instead of a Python loop per track.
+
+    Args:
+        df (pd.DataFrame): Tracks with frame, track_id, x_center, y_center columns.
+
+    Returns:
+        tuple: (sorted tracks DataFrame with dx/dy/velocity columns, starts array,
+                per-track DataFrame with track_id, duration_frames, avg_velocity,
+                max_velocity, speed_category, curvature_deviation - unrounded)
+    """
+    df, starts = sort_tracks(df)
+    n_rows = len(df)
+    if n_rows == 0:
+        raise ValueError("No track rows to summarize.")
+    counts = np.diff(np.append(starts, n_rows))
+    track_index = np.repeat(np.arange(len(starts)), counts)
+
+    frames = df["frame"].to_numpy()
+    x = df["x_center"].to_numpy(dtype=np.float64)
+    y = df["y_center"].to_numpy(dtype=np.float64)
+
+    # קפיצות בין שורות עוקבות באותו מסלול; השורה הראשונה של כל מסלול היא NaN
+    first_row = np.zeros(n_rows, dtype=bool)
+    first_row[starts] = True
+    dx = np.where(first_row, np.nan, x - np.roll(x, 1))
+    dy = np.where(first_row, np.nan, y - np.roll(y, 1))
+    velocity = np.sqrt(dx ** 2 + dy ** 2)
+    df["dx"], df["dy"], df["velocity"] = dx, dy, velocity
+
+    avg_velocity = segment_mean(velocity, starts)
+    max_velocity = segment_max(velocity, starts)
+
+    new_frame = first_row | (frames != np.roll(frames, 1))
+    duration = np.add.reduceat(new_frame.astype(np.int64), starts)
+
+    # סטייה ממוצעת מהקו הישר שבין הנקודה הראשונה לאחרונה (0 למסלול של פחות מ-3 נקודות)
+    ends = starts + counts - 1
+    p0x, p0y = x[starts], y[starts]
+    line_x, line_y = x[ends] - p0x, y[ends] - p0y
+    line_len = np.sqrt(line_x ** 2 + line_y ** 2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ux, uy = line_x / line_len, line_y / line_len
+    vx, vy = x - p0x[track_index], y - p0y[track_index]
+    projection = vx * ux[track_index] + vy * uy[track_index]
+    dev_x = x - (p0x[track_index] + projection * ux[track_index])
+    dev_y = y - (p0y[track_index] + projection * uy[track_index])
+    deviation = np.sqrt(dev_x ** 2 + dev_y ** 2)
+    curvature = np.add.reduceat(np.nan_to_num(deviation), starts) / counts
+    curvature = np.where((counts < 3) | (line_len == 0), 0.0, curvature)
+
+    per_track = pd.DataFrame({
+        "track_id": df["track_id"].to_numpy()[starts],
+        "duration_frames": duration,
+        "avg_velocity": avg_velocity,
+        "max_velocity": max_velocity,
+        "speed_category": classify_speeds(avg_velocity),
+        "curvature_deviation": curvature,
+    })
+    return df, starts, per_track
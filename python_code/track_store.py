@@ -0,0 +1,130 @@
+import numpy as np
+
+
+class TrackStore:
+    """
+    Struct-of-arrays store for the live tracks of a tracker.
+
+    Live tracks occupy slots [0, len(store)) of the arrays below. Retiring a track
+    swaps the last live slot into its place, so retirement is O(1) and per-frame
+    work only depends on how many tracks are alive, never on how many were
+    created since the start of the video. Retired tracks are only counted.
+    """
+
+    __slots__ = ('ids', 'centers', 'velocities', 'last_seen', 'ages', 'size',
+                 'next_id', 'retired_count')
+
+    def __init__(self, capacity=64):
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.centers = np.zeros((capacity, 2), dtype=np.float64)
+        self.velocities = np.zeros((capacity, 2), dtype=np.float64)
+        self.last_seen = np.zeros(capacity, dtype=np.int64)
+        self.ages = np.zeros(capacity, dtype=np.int64)
+        self.size = 0
+        self.next_id = 1
+        self.retired_count = 0
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self):
+        capacity = 2 * len(self.ids)
+        for name in ('ids', 'centers', 'velocities', 'last_seen', 'ages'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def add(self, center, frame):
+        """
+        Start a new track at `center`; returns its ID.
+        """
+        if self.size == len(self.ids):
+            self._grow()
+        slot = self.size
+        track_id = self.next_id
+        self.ids[slot] = track_id
+        self.centers[slot] = center
+        self.velocities[slot] = 0.0
+        self.last_seen[slot] = frame
+        self.ages[slot] = 1
+        self.size += 1
+        self.next_id += 1
+        return track_id
+
+    def add_many(self, centers, frame):
+        """
+        Start one new track per row of `centers`; returns their IDs.
+        """
+        n = len(centers)
+        while self.size + n > len(self.ids):
+            self._grow()
+        slots = slice(self.size, self.size + n)
+        new_ids = np.arange(self.next_id, self.next_id + n, dtype=np.int64)
+        self.ids[slots] = new_ids
+        self.centers[slots] = centers
+        self.velocities[slots] = 0.0
+        self.last_seen[slots] = frame
+        self.ages[slots] = 1
+        self.size += n
+        self.next_id += n
+        return new_ids
+
+    def update(self, slots, centers, frame, velocity_gain=1.0):
+        """
+        Move the tracks in `slots` (int or int array) to `centers` at `frame`.
+
+        Velocity is measured per frame, so gaps are accounted for. With
+        velocity_gain < 1 the new velocity is blended with the previous one
+        (alpha-beta / steady-state Kalman update); a track's first velocity is
+        always taken as measured.
+        """
+        gap = frame - self.last_seen[slots]
+        first = self.ages[slots] == 1
+        if np.ndim(gap):
+            gap = gap[:, None]
+            first = first[:, None]
+        measured = (centers - self.centers[slots]) / np.maximum(gap, 1)
+        gain = np.where(first, 1.0, velocity_gain)
+        self.velocities[slots] += gain * (measured - self.velocities[slots])
+        self.centers[slots] = centers
+        self.last_seen[slots] = frame
+        self.ages[slots] += 1
+
+    def retire(self, slot):
+        """
+        Remove the track in `slot` in O(1) by moving the last live track into it.
+        """
+        last = self.size - 1
+        if slot != last:
+            self.ids[slot] = self.ids[last]
+            self.centers[slot] = self.centers[last]
+            self.velocities[slot] = self.velocities[last]
+            self.last_seen[slot] = self.last_seen[last]
+            self.ages[slot] = self.ages[last]
+        self.size = last
+        self.retired_count += 1
+
+    def retire_stale(self, frame, max_gap=0):
+        """
+        Retire every live track not seen during the last `max_gap` frames before `frame`
+        (max_gap=0: every track that was not seen at `frame` itself).
+        """
+        stale = np.flatnonzero(frame - self.last_seen[:self.size] > max_gap)
+        # highest slots first, so the swaps never move a stale track we still need
+        for slot in stale[::-1]:
+            self.retire(slot)
+        return len(stale)
+
+    def predict(self, frame):
+        """
+        Constant-velocity prediction of every live track's center at `frame`.
+        """
+        gap = frame - self.last_seen[:self.size]
+        return self.centers[:self.size] + self.velocities[:self.size] * gap[:, None]
+
+    def live_slots(self):
+        """
+        Live slots in track creation order.
+        """
+        return np.argsort(self.ids[:self.size], kind='stable')
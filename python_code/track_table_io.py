@@ -0,0 +1,130 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+# תיקייה עם קובץ .npy לכל עמודה - נטען כ-memmap בלי העתקה
+COLUMNAR_SUFFIX = ".cols"
+SCHEMA_FILE = "_schema.json"
+
+DETECTION_SCHEMA = {
+    "frame": "int64",
+    "x1": "float64",
+    "y1": "float64",
+    "x2": "float64",
+    "y2": "float64",
+    "confidence": "float32",
+    "class": "int16",
+    "x_center": "float64",
+    "y_center": "float64",
+}
+
+TRACK_SCHEMA = {
+    "frame": "int64",
+    "track_id": "int64",
+    "x1": "float64",
+    "y1": "float64",
+    "x2": "float64",
+    "y2": "float64",
+    "x_center": "float64",
+    "y_center": "float64",
+}
+
+
+def ensure_centers(df):
+    """
+    Add x_center/y_center from the box corners, unless they are already there.
+    """
+    if "x_center" in df.columns and "y_center" in df.columns:
+        return df
+    df = df.copy()
+    df["x_center"] = (df["x1"] + df["x2"]) / 2
+    df["y_center"] = (df["y1"] + df["y2"]) / 2
+    return df
+
+
+def apply_schema(df, schema):
+    """
+    Order and cast the columns of `df` to `schema`; centers are derived if missing.
+    Columns not in the schema are kept at the end with their own dtype.
+    """
+    if "x_center" in schema:
+        df = ensure_centers(df)
+    missing = [col for col in schema if col not in df.columns]
+    if missing:
+        raise ValueError(f"Missing columns for schema: {missing}")
+    extra = [col for col in df.columns if col not in schema]
+    return df[list(schema) + extra].astype(schema)
+
+
+def write_table(df, path, schema=None):
+    """
+    Write a table as CSV, Parquet or a columnar .cols directory, by path extension.
+
+    Args:
+        df (pd.DataFrame): Table to write.
+        path (str): Output path ending in .csv, .parquet or .cols.
+        schema (dict): Optional column -> dtype mapping applied before writing.
+
+    Returns:
+        str: The path written.
+    """
+    if schema is not None:
+        df = apply_schema(df, schema)
+
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+
+    if path.endswith(COLUMNAR_SUFFIX):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.makedirs(path)
+        columns = []
+        for col in df.columns:
+            values = df[col].to_numpy()
+            if values.dtype == object:
+                raise ValueError(f"Column '{col}' is not numeric and cannot be stored in {COLUMNAR_SUFFIX}")
+            np.save(os.path.join(path, f"{col}.npy"), np.ascontiguousarray(values))
+            columns.append({"name": col, "dtype": str(values.dtype)})
+        with open(os.path.join(path, SCHEMA_FILE), "w") as f:
+            json.dump({"rows": len(df), "columns": columns}, f)
+    elif path.endswith(".parquet"):
+        try:
+            df.to_parquet(path, index=False)
+        except ImportError:
+            raise ImportError("Writing .parquet needs pyarrow (pip install pyarrow)")
+    else:
+        df.to_csv(path, index=False)
+    return path
+
+
+def read_columns(path, mmap=True):
+    """
+    Read a .cols directory as a dict of numpy arrays (memory-mapped when mmap=True).
+    """
+    with open(os.path.join(path, SCHEMA_FILE)) as f:
+        meta = json.load(f)
+    mode = "r" if mmap else None
+    return {
+        col["name"]: np.load(os.path.join(path, f"{col['name']}.npy"), mmap_mode=mode)
+        for col in meta["columns"]
+    }
+
+
+def read_table(path, mmap=True):
+    """
+    Read a table written by write_table (or any CSV).
+
+    .cols directories are memory-mapped column by column and wrapped in a
+    DataFrame without copying the data.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Input table not found: {path}")
+    if path.endswith(COLUMNAR_SUFFIX):
+        return pd.DataFrame(read_columns(path, mmap), copy=False)
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
@@ -1,12 +1,23 @@
 import os
+import re
 import sys
 import cv2
+import numpy as np
 from glob import glob
+from main_video_of_test_track_algoritem import write_labeled_video
+from from_out_model_to_csv_of_sort import read_yolo_labels
 
-def create_video_with_boxes(images_dir, labels_dir, output_video_path, image_width=256, image_height=256):
+def create_video_with_boxes(images_dir, labels_dir, output_video_path, detections=None, **video_options):
     """
     Create a video from images and YOLO label files,
     and save labeled frames as individual images (bounding boxes only, no text).
+
+    The labels are loaded with from_out_model_to_csv_of_sort.read_yolo_labels;
+    a job that already loaded them (e.g. for the SORT CSV) passes them as
+    `detections` so they are not parsed again. Images named frame_<N>.png get
+    the boxes of frame N; any other image gets those of the label file with
+    the same name (<name>.txt), like before.
+    video_options: codec, quality, labeled_frames (see write_labeled_video).
     """
     image_files = sorted(glob(os.path.join(images_dir, "*.png")))
     if not image_files:
@@ -16,50 +27,122 @@ def create_video_with_boxes(images_dir, labels_dir, output_video_path, image_wid
     if sample_img is None:
         raise ValueError("Sample image could not be loaded.")
 
+    # הקואורדינטות המנורמלות מומרות לפי גודל התמונה בפועל
     h, w, _ = sample_img.shape
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    video_writer = cv2.VideoWriter(output_video_path, fourcc, 10, (w, h))
-
-    # Create folder to store labeled frames
-    labeled_frames_dir = os.path.join(os.path.dirname(output_video_path), "labeled_frames")
-    os.makedirs(labeled_frames_dir, exist_ok=True)
-
-    for img_path in image_files:
-        img_name = os.path.basename(img_path)
-        label_name = os.path.splitext(img_name)[0] + '.txt'
-        label_path = os.path.join(labels_dir, label_name)
-
-        frame = cv2.imread(img_path)
-        if frame is None:
-            continue
-
-        if os.path.exists(label_path):
-            with open(label_path, 'r') as f:
-                for line in f:
-                    parts = line.strip().split()
-                    if len(parts) >= 5:
-                        cls_id, xc, yc, bw, bh = map(float, parts[:5])
-                        x1 = int((xc - bw / 2) * w)
-                        y1 = int((yc - bh / 2) * h)
-                        x2 = int((xc + bw / 2) * w)
-                        y2 = int((yc + bh / 2) * h)
-                        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-
-        # Write frame to video
-        video_writer.write(frame)
-
-        # Save labeled frame as image
-        labeled_frame_path = os.path.join(labeled_frames_dir, img_name)
-        cv2.imwrite(labeled_frame_path, frame)
-
-    video_writer.release()
+    if detections is None:
+        detections = read_yolo_labels(labels_dir, w, h)
+    return create_video_with_detections(images_dir, detections, output_video_path, fps=10, labels_dir=labels_dir,
+                                        **video_options)
+
+def create_video_with_detections(images_dir, detections, output_video_path, fps=10, labels_dir=None,
+                                 **video_options):
+    """
+    Same as create_video_with_boxes, but the boxes come from an in-memory
+    detection array (out_of_model_yolov.DETECTION_DTYPE or read_yolo_labels's
+    LABEL_DTYPE) instead of label files.
+
+    Images are matched to the array by the frame number in their name
+    (frame_<N>.png). An image without one is matched by name to a label file
+    in `labels_dir`; without labels_dir it raises ValueError, since its boxes
+    cannot be found.
+    """
+    image_files = sorted(glob(os.path.join(images_dir, "*.png")))
+    if not image_files:
+        raise FileNotFoundError("No images found in the directory.")
+
+    sample_img = cv2.imread(image_files[0])
+    if sample_img is None:
+        raise ValueError("Sample image could not be loaded.")
+
+    # Sort once by frame so each frame's boxes are a contiguous slice
+    detections = np.sort(detections, order='frame', kind='stable')
+    det_frames = detections['frame']
+    boxes = detection_boxes(detections)
+
+    unmatched = [os.path.basename(path) for path in image_files
+                 if not re.search(r'frame_(\d+)', os.path.basename(path))]
+    if unmatched and labels_dir is None:
+        raise ValueError(f"{len(unmatched)} images are not named frame_<N>.png and cannot be matched "
+                         f"to detections (e.g. {unmatched[0]})")
+
+    def labeled():
+        for img_path in image_files:
+            img_name = os.path.basename(img_path)
+            frame = cv2.imread(img_path)
+            if frame is None:
+                continue
+
+            match = re.search(r'frame_(\d+)', img_name)
+            if match:
+                frame_number = int(match.group(1))
+                start, end = np.searchsorted(det_frames, [frame_number, frame_number + 1])
+                draw_detections(frame, boxes[start:end])
+            else:
+                # אין מספר פריים בשם - קובץ התוויות עם אותו שם, כמו פעם
+                label_path = os.path.join(labels_dir, os.path.splitext(img_name)[0] + '.txt')
+                draw_detections(frame, label_file_boxes(label_path, frame.shape[1], frame.shape[0]))
+            yield img_name, frame
+
+    written = write_labeled_video(labeled(), output_video_path, fps, **video_options)
+    if written["output_video"] is None:
+        raise ValueError("None of the images could be loaded.")
     return {
         "success": True,
-        "output_video": output_video_path,
-        "labeled_frames_dir": labeled_frames_dir,
+        "output_video": written["output_video"],
+        "labeled_frames_dir": written["labeled_frames_dir"],
+        "codec": written["codec"],
         "num_frames": len(image_files)
     }
 
+def draw_detections(frame, boxes):
+    """
+    Draw detection boxes (int x1, y1, x2, y2 rows) on a BGR frame, in place.
+    """
+    for x1, y1, x2, y2 in boxes:
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+    return frame
+
+def label_file_boxes(label_path, image_width, image_height):
+    """
+    Integer (x1, y1, x2, y2) rows of one YOLO label file (none if it does not exist).
+    """
+    boxes = []
+    if os.path.exists(label_path):
+        with open(label_path, 'r') as f:
+            for line in f:
+                parts = line.strip().split()
+                if len(parts) >= 5:
+                    _, xc, yc, bw, bh = map(float, parts[:5])
+                    boxes.append((int((xc - bw / 2) * image_width), int((yc - bh / 2) * image_height),
+                                  int((xc + bw / 2) * image_width), int((yc + bh / 2) * image_height)))
+    return boxes
+
+def detection_boxes(detections):
+    """
+    Integer (x1, y1, x2, y2) rows of a DETECTION_DTYPE array.
+    """
+    return np.stack([detections['x1'], detections['y1'], detections['x2'], detections['y2']], axis=1).astype(int)
+
+def render_detection_frames(frames, detections, output_video_path, fps=10, **video_options):
+    """
+    Same as create_video_with_detections, but straight from in-memory frames
+    (frame i = frames[i]) instead of re-reading the PNG folder.
+    """
+    detections = np.sort(detections, order='frame', kind='stable')
+    det_frames = detections['frame']
+    boxes = detection_boxes(detections)
+
+    def labeled():
+        for frame_number, frame in enumerate(frames):
+            frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR) if frame.ndim == 2 else frame.copy()
+            start, end = np.searchsorted(det_frames, [frame_number, frame_number + 1])
+            yield f"frame_{frame_number:04d}.png", draw_detections(frame, boxes[start:end])
+
+    written = write_labeled_video(labeled(), output_video_path, fps, **video_options)
+    if written["output_video"] is None:
+        raise ValueError("No frames to render.")
+    return {"success": True, **written}
+
 if __name__ == "__main__":
     if len(sys.argv) != 4:
         print("Usage: python video_of_test_out_yolov.py <images_dir> <labels_dir> <output_video_path>")
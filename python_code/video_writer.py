@@ -0,0 +1,238 @@
+import os
+import queue
+import shutil
+import subprocess
+import threading
+
+import cv2
+import numpy as np
+
+# mp4v / avc1 - VideoWriter של OpenCV; h264 - ffmpeg (H.264 + faststart, מתנגן בדפדפן ישירות)
+VIDEO_CODECS = ("mp4v", "avc1", "h264")
+DEFAULT_CODEC = "mp4v"
+DEFAULT_ENCODER = "libx264"
+DEFAULT_QUEUE_SIZE = 32
+
+# הדגל של איכות קבועה לכל מקודד ffmpeg (libx264: CRF, 0-51, נמוך = איכות גבוהה)
+QUALITY_FLAGS = {
+    "libx264": "-crf",
+    "libx265": "-crf",
+    "h264_nvenc": "-cq",
+    "h264_qsv": "-global_quality",
+    "h264_videotoolbox": "-q:v",
+}
+
+_STOP = object()
+
+
+def find_ffmpeg():
+    """
+    The ffmpeg executable: $FFMPEG_BINARY if set, otherwise ffmpeg on the PATH (or None).
+    """
+    configured = os.environ.get("FFMPEG_BINARY")
+    if configured and os.path.exists(configured):
+        return configured
+    return shutil.which("ffmpeg")
+
+
+class _OpenCVEncoder:
+    def __init__(self, output_video, fps, size, fourcc):
+        self.writer = cv2.VideoWriter(output_video, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+        if not self.writer.isOpened():
+            self.writer.release()
+            raise IOError(f"OpenCV cannot encode '{fourcc}' video: {output_video}")
+
+    def write(self, frame):
+        self.writer.write(frame)
+
+    def close(self):
+        self.writer.release()
+
+
+class _FFmpegEncoder:
+    def __init__(self, ffmpeg, output_video, fps, size, quality, encoder):
+        width, height = size
+        cmd = [ffmpeg, "-y", "-loglevel", "error",
+               "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+               "-c:v", encoder, "-pix_fmt", "yuv420p",
+               # yuv420p דורש מימדים זוגיים
+               "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+               "-movflags", "+faststart"]
+        if quality is not None and encoder in QUALITY_FLAGS:
+            cmd += [QUALITY_FLAGS[encoder], str(quality)]
+        cmd.append(output_video)
+        self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write(self, frame):
+        try:
+            self.process.stdin.write(np.ascontiguousarray(frame).tobytes())
+        except BrokenPipeError:
+            self.close()
+            raise
+
+    def close(self):
+        if not self.process.stdin.closed:
+            try:
+                self.process.stdin.close()
+            except BrokenPipeError:
+                pass
+        stderr = self.process.stderr.read().decode(errors="replace").strip()
+        if self.process.wait() != 0:
+            raise IOError(f"ffmpeg encoding failed: {stderr}")
+
+
+def open_encoder(output_video, fps, size, codec=DEFAULT_CODEC, quality=None, encoder=DEFAULT_ENCODER):
+    """
+    Open a video encoder, falling back when the requested codec is not available
+    here: h264 (needs ffmpeg) -> avc1 (needs an OpenCV build with H.264) -> mp4v.
+
+    Returns:
+        tuple: (encoder object with write(frame)/close(), codec actually used).
+    """
+    if codec not in VIDEO_CODECS:
+        raise ValueError(f"Unknown video codec: {codec} (expected one of {VIDEO_CODECS})")
+
+    if codec == "h264":
+        ffmpeg = find_ffmpeg()
+        if ffmpeg is not None:
+            return _FFmpegEncoder(ffmpeg, output_video, fps, size, quality, encoder), "h264"
+        print("[WARN] ffmpeg not found, trying OpenCV's H.264 encoder")
+        codec = "avc1"
+    if codec == "avc1":
+        try:
+            return _OpenCVEncoder(output_video, fps, size, "avc1"), "avc1"
+        except IOError as e:
+            print(f"[WARN] {e}; writing mp4v instead")
+    return _OpenCVEncoder(output_video, fps, size, "mp4v"), "mp4v"
+
+
+class BackgroundVideoWriter:
+    """
+    Encode frames on a background thread, fed through a bounded queue.
+
+    The caller only pays for queueing a frame; the encoder (and, if frames_dir
+    is given, a second thread writing each frame as a PNG) run alongside it.
+    A full queue blocks write(), so memory stays bounded. Frames must not be
+    modified after they are passed to write(). An error on a background
+    thread is raised by the next write() or by close().
+    """
+
+    def __init__(self, output_video, fps, codec=DEFAULT_CODEC, quality=None, encoder=DEFAULT_ENCODER,
+                 frames_dir=None, queue_size=DEFAULT_QUEUE_SIZE):
+        if codec not in VIDEO_CODECS:
+            raise ValueError(f"Unknown video codec: {codec} (expected one of {VIDEO_CODECS})")
+        self.output_video = output_video
+        self.fps = fps
+        self.codec = codec
+        self.quality = quality
+        self.encoder = encoder
+        self.frames_dir = frames_dir
+        self.queue_size = queue_size
+        self.num_frames = 0
+        self._queues = []
+        self._threads = []
+        self._errors = []
+        self._closed = False
+
+    def _spawn(self, name, handle, finish):
+        items = queue.Queue(maxsize=self.queue_size)
+
+        def run():
+            try:
+                while True:
+                    item = items.get()
+                    if item is _STOP:
+                        break
+                    if not self._errors:
+                        handle(*item)
+            except BaseException as e:
+                self._errors.append(e)
+                # ממשיכים לרוקן את התור כדי ש-write() לא ייתקע
+                while items.get() is not _STOP:
+                    pass
+            finally:
+                try:
+                    finish()
+                except BaseException as e:
+                    self._errors.append(e)
+
+        thread = threading.Thread(target=run, name=name, daemon=True)
+        thread.start()
+        self._queues.append(items)
+        self._threads.append(thread)
+
+    def _start(self, frame):
+        height, width = frame.shape[:2]
+        os.makedirs(os.path.dirname(os.path.abspath(self.output_video)), exist_ok=True)
+        encoder, self.codec = open_encoder(self.output_video, self.fps, (width, height),
+                                           self.codec, self.quality, self.encoder)
+        self._spawn("video-encoder", lambda filename, frame: encoder.write(frame), encoder.close)
+        if self.frames_dir:
+            os.makedirs(self.frames_dir, exist_ok=True)
+
+            def save_png(filename, frame):
+                if not cv2.imwrite(os.path.join(self.frames_dir, filename), frame):
+                    raise IOError(f"Could not write frame: {filename}")
+
+            self._spawn("png-writer", save_png, lambda: None)
+
+    def write(self, frame, filename=None):
+        """
+        Queue one BGR frame. `filename` names its PNG in frames_dir.
+        """
+        if self._errors:
+            self.close()
+        if not self._threads:
+            self._start(frame)
+        item = (filename or f"frame_{self.num_frames:04d}.png", frame)
+        for items in self._queues:
+            items.put(item)
+        self.num_frames += 1
+
+    def close(self):
+        """
+        Wait until every queued frame is written and the video is finalized.
+
+        Returns:
+            str: output_video, or None if no frame was written (no file is created then).
+        """
+        if not self._closed:
+            self._closed = True
+            if not self._threads:
+                print(f"[WARN] No frames were written, video not created: {self.output_video}")
+            for items in self._queues:
+                items.put(_STOP)
+            for thread in self._threads:
+                thread.join()
+        if self._errors:
+            raise self._errors[0]
+        return self.output_video if self.num_frames else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            try:
+                self.close()
+            except Exception:
+                pass
+        return False
+
+
+def read_video_frame(video_path, index):
+    """
+    Decode frame `index` of a video (BGR), or None if it does not exist.
+    Used to produce labeled frames on request instead of writing them all.
+    """
+    capture = cv2.VideoCapture(video_path)
+    try:
+        if not capture.isOpened():
+            return None
+        capture.set(cv2.CAP_PROP_POS_FRAMES, index)
+        ok, frame = capture.read()
+        return frame if ok else None
+    finally:
+        capture.release()
@@ -1,6 +1,6 @@
-import tifffile as tiff
 import cv2
 import os
+from lsm_frame_source import iter_lsm_frames
 
 def convert_lsm_to_frames(lsm_path, output_folder):
     """
@@ -14,18 +14,8 @@ def convert_lsm_to_frames(lsm_path, output_folder):
     if not os.path.exists(lsm_path):
         raise FileNotFoundError(f"LSM file not found at {lsm_path}")
 
-    # Load the LSM file
-    print(f"Loading LSM file: {lsm_path}")
-    try:
-        lsm_data = tiff.imread(lsm_path)  # Load the LSM file
-    except Exception as e:
-        raise ValueError(f"Error loading LSM file: {e}")
-
-    print(f"LSM file loaded successfully! Shape: {lsm_data.shape}")
-    # Handle multiple channels if needed (e.g., shape: (frames, channels, height, width))
-    if len(lsm_data.shape) == 4:
-        print("Multiple channels detected. Averaging channels...")
-        lsm_data = lsm_data.mean(axis=1)  # Combine channels by averaging
+    # Frames are streamed one at a time (channels averaged, normalized to uint8)
+    print(f"Streaming LSM file: {lsm_path}")
 
     # Create output folder if it doesn't exist
     if not os.path.exists(output_folder):
@@ -34,10 +24,7 @@ def convert_lsm_to_frames(lsm_path, output_folder):
         print(f"Output folder exists: {output_folder}. Frames will overwrite existing files.")
 
     # Save each frame as an image
-    for i, frame in enumerate(lsm_data):
-        # Normalize the frame values to 0-255 for saving as an image
-        normalized_frame = cv2.normalize(frame, None, 0, 255, cv2.NORM_MINMAX).astype('uint8')
-
+    for i, normalized_frame in enumerate(iter_lsm_frames(lsm_path)):
         # Define the filename for the current frame
         frame_filename = os.path.join(output_folder, f"frame_{i:04d}.png")
 
@@ -0,0 +1,335 @@
+"""
+Python backend for the React client (same endpoints and port as index.js).
+
+Unlike index.js, which starts a new Python process (and reloads best.pt) for
+every upload, this server keeps a fixed pool of worker threads. Each worker
+loads the YOLO model once and reuses it for every job it runs. /upload only
+queues the job and answers right away with a job ID; the client polls
+/jobs/<job_id> until the results are ready.
+
+Needs Flask and flask-cors (pip install flask flask-cors).
+Set DETECTOR_BACKEND=onnx or openvino (and optionally DETECTOR_PRECISION=fp16/int8,
+with DETECTOR_CALIBRATION=<frames folder> for int8) to run the detector on an
+ONNX export instead of PyTorch; see python_code/inference_backend.py.
+
+Usage: python analysis_server.py [port] [workers] [max_queued]
+"""
+import os
+import queue
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import uuid
+import zipfile
+
+import cv2
+from flask import Flask, jsonify, request, send_from_directory
+from flask_cors import CORS
+from werkzeug.utils import secure_filename
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "python_code")))
+from pipeline_engine import run_pipeline, MODES, DEFAULT_MODEL_PATH, FINAL_VIDEO_NAMES
+from stage_cache import StageCache
+from graph_service import render_graph
+from video_writer import read_video_frame, find_ffmpeg as find_system_ffmpeg
+from inference_backend import load_detector
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+UPLOADS_DIR = os.path.join(SERVER_DIR, "uploads")
+SESSIONS_DIR = os.path.join(SERVER_DIR, "sessions")
+CACHE_DIR = os.path.join(SERVER_DIR, "cache")
+BUNDLED_FFMPEG = os.path.join(SERVER_DIR, "tools", "ffmpeg.exe")
+# מנוע ההרצה של המודל: torch, או onnx/openvino על CPU (ראו inference_backend)
+DETECTOR_BACKEND = os.environ.get("DETECTOR_BACKEND", "torch")
+DETECTOR_PRECISION = os.environ.get("DETECTOR_PRECISION", "fp32")
+DETECTOR_CALIBRATION = os.environ.get("DETECTOR_CALIBRATION")
+
+ALLOWED_EXTENSIONS = (".lsm", ".mp4", ".webm", ".ogg")
+ZIP_EXTENSIONS = (".mp4", ".csv", ".png")
+# כמה עבודות שהסתיימו נשמרות בזיכרון לצורך polling
+MAX_FINISHED_JOBS = 200
+
+LAZY_FRAME_PATTERN = re.compile(r"^labeled_frames/(frame_(\d+)\.png)$")
+TRACKS_CSV_NAMES = {
+    "tracking_noise": "simple_tracks.csv",
+    "tracking_filtered": "filtered_tracks.csv",
+}
+
+
+def find_ffmpeg():
+    if os.path.exists(BUNDLED_FFMPEG):
+        return BUNDLED_FFMPEG
+    return find_system_ffmpeg()
+
+
+def convert_video_to_fast_start(input_path, output_path):
+    """
+    Re-encode to H.264 with the index at the start, so browsers can stream it.
+    Returns the path to serve (the original video if ffmpeg is not available or fails).
+    """
+    ffmpeg = find_ffmpeg()
+    if ffmpeg is None:
+        print("[WARN] ffmpeg not found, serving the raw video")
+        return input_path
+    cmd = [ffmpeg, "-y", "-loglevel", "error", "-i", input_path,
+           "-c:v", "libx264", "-c:a", "aac", "-movflags", "+faststart", output_path]
+    completed = subprocess.run(cmd, capture_output=True, text=True)
+    if completed.returncode != 0:
+        print(f"[WARN] Video conversion failed: {completed.stderr.strip()}")
+        return input_path
+    return output_path
+
+
+def extract_labeled_frame(session_dir, file_name):
+    """
+    Write labeled_frames/frame_NNNN.png from the session's result video, if the
+    frames were not written during the run. Returns False if there is no such frame.
+    """
+    match = LAZY_FRAME_PATTERN.match(file_name)
+    if match is None:
+        return False
+    videos = [os.path.join(session_dir, name) for name in FINAL_VIDEO_NAMES.values()]
+    videos = [video for video in videos if os.path.exists(video)]
+    frame = read_video_frame(videos[0], int(match.group(2))) if videos else None
+    if frame is None:
+        return False
+    frames_path = os.path.join(session_dir, "labeled_frames")
+    os.makedirs(frames_path, exist_ok=True)
+    tmp_path = os.path.join(frames_path, f".{uuid.uuid4().hex}.png")
+    cv2.imwrite(tmp_path, frame)
+    os.replace(tmp_path, os.path.join(frames_path, match.group(1)))
+    return True
+
+
+def zip_session(session_dir):
+    zip_path = os.path.join(session_dir, "results.zip")
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name in sorted(os.listdir(session_dir)):
+            file_path = os.path.join(session_dir, name)
+            if os.path.isfile(file_path) and name.endswith(ZIP_EXTENSIONS):
+                archive.write(file_path, name)
+        frames_path = os.path.join(session_dir, "labeled_frames")
+        if os.path.isdir(frames_path):
+            for name in sorted(os.listdir(frames_path)):
+                archive.write(os.path.join(frames_path, name), f"labeled_frames/{name}")
+    return zip_path
+
+
+def build_result(session_id, session_dir, mode, outputs=None):
+    """
+    The response index.js returned for a finished upload (same keys).
+
+    `outputs` is what run_pipeline returned: a video already encoded as H.264
+    is served as is, and when the labeled frames were not written, frameFiles
+    lists the names session_file produces from the video on request. A run
+    that produced no video (no frames) gets no "video" key.
+    """
+    base = f"/sessions/{session_id}"
+    result = {"sessionId": session_id, "resultDir": base, "mode": mode,
+              "labeledFramesDir": f"{base}/labeled_frames"}
+    if mode != "detection":
+        result["summaryCSV"] = f"{base}/final_summary.csv"
+        result["graph"] = f"{base}/graph.png"
+        result["rawTracksCSV"] = f"{base}/{TRACKS_CSV_NAMES[mode]}"
+
+    outputs = outputs or {}
+    raw_video = outputs["video"] if "video" in outputs else os.path.join(session_dir, FINAL_VIDEO_NAMES[mode])
+    if raw_video is None or not os.path.exists(raw_video):
+        # סרטון בלי פריימים לא נוצר - התשובה בלי "video"
+        print(f"[WARN] No result video for session {session_id}")
+    elif outputs.get("video_codec") == "h264":
+        # כבר H.264 עם faststart - אין צורך בקידוד נוסף
+        result["video"] = f"{base}/{os.path.basename(raw_video)}"
+    else:
+        ready_video = convert_video_to_fast_start(raw_video, raw_video.replace(".mp4", "_ready.mp4"))
+        result["video"] = f"{base}/{os.path.basename(ready_video)}"
+
+    frames_path = os.path.join(session_dir, "labeled_frames")
+    if os.path.isdir(frames_path):
+        result["frameFiles"] = sorted(f for f in os.listdir(frames_path) if f.endswith(".png"))
+    elif outputs.get("num_frames"):
+        result["frameFiles"] = [f"frame_{i:04d}.png" for i in range(outputs["num_frames"])]
+
+    zip_session(session_dir)
+    result["zip"] = f"{base}/results.zip"
+    return result
+
+
+class JobQueue:
+    """
+    Bounded job queue served by a fixed pool of worker threads.
+
+    Each worker loads its own YOLO model the first time it gets a job and keeps
+    it for the life of the server (one model per thread, so predict calls never
+    share a model). submit() raises queue.Full when max_queued jobs are waiting.
+    """
+
+    def __init__(self, workers=1, max_queued=8, model_path=DEFAULT_MODEL_PATH, cache_dir=CACHE_DIR):
+        self.model_path = model_path
+        self.cache = StageCache(cache_dir)
+        # ffmpeg שמגיע עם השרת משמש גם לקידוד H.264 בזמן הריצה
+        if os.path.exists(BUNDLED_FFMPEG):
+            os.environ.setdefault("FFMPEG_BINARY", BUNDLED_FFMPEG)
+        self.pending = queue.Queue(maxsize=max_queued)
+        self.jobs = {}
+        self.finished = []
+        self.lock = threading.Lock()
+        self.threads = [threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+                        for i in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, video_path, session_id, mode):
+        job_id = uuid.uuid4().hex
+        job = {"jobId": job_id, "sessionId": session_id, "mode": mode, "status": "queued",
+               "stages": [], "submitted": time.time(), "videoPath": video_path}
+        with self.lock:
+            self.pending.put_nowait(job_id)
+            self.jobs[job_id] = job
+        return job_id
+
+    def status(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            public = {k: v for k, v in job.items() if k != "videoPath"}
+            public["stages"] = [name for name, _ in job["stages"]]
+            if job["status"] == "queued":
+                waiting = list(self.pending.queue)
+                public["queuePosition"] = waiting.index(job_id) + 1 if job_id in waiting else 0
+            return public
+
+    def _load_model(self):
+        print(f"[INFO] {threading.current_thread().name}: loading {self.model_path} ({DETECTOR_BACKEND})")
+        # כל העובדים חולקים את המעבד
+        threads = max(1, (os.cpu_count() or 1) // len(self.threads))
+        return load_detector(self.model_path, DETECTOR_BACKEND, DETECTOR_PRECISION, threads,
+                             calibration_images=DETECTOR_CALIBRATION)
+
+    def _worker(self):
+        model = None
+        while True:
+            job_id = self.pending.get()
+            with self.lock:
+                job = self.jobs[job_id]
+                job["status"] = "running"
+                job["started"] = time.time()
+            session_dir = os.path.join(SESSIONS_DIR, job["sessionId"])
+            try:
+                if model is None:
+                    model = self._load_model()
+                # הסרטון מקודד ישר ל-H.264, והפריימים המתויגים נוצרים רק כשמבקשים אותם
+                outputs = run_pipeline(job["videoPath"], session_dir, job["mode"], model_path=self.model_path,
+                                       model=model, cache=self.cache, save_frames=False, streaming=True,
+                                       timings=job["stages"], video_codec="h264", labeled_frames=False,
+                                       backend=DETECTOR_BACKEND, precision=DETECTOR_PRECISION)
+                result = build_result(job["sessionId"], session_dir, job["mode"], outputs)
+                with self.lock:
+                    job["status"] = "done"
+                    job["result"] = result
+            except Exception as e:
+                print(f"[ERROR] Job {job_id} failed: {e}")
+                with self.lock:
+                    job["status"] = "failed"
+                    job["error"] = str(e)
+            finally:
+                with self.lock:
+                    job["finished"] = time.time()
+                    self.finished.append(job_id)
+                    while len(self.finished) > MAX_FINISHED_JOBS:
+                        self.jobs.pop(self.finished.pop(0), None)
+                self.pending.task_done()
+
+
+def create_app(jobs):
+    app = Flask(__name__)
+    CORS(app)
+    @app.post("/upload")
+    def upload():
+        video = request.files.get("video")
+        mode = request.form.get("mode")
+        if video is None or not video.filename or not mode:
+            return jsonify({"message": "Missing file or mode"}), 400
+        if mode not in MODES:
+            return jsonify({"message": "Invalid processing mode"}), 400
+        if not video.filename.lower().endswith(ALLOWED_EXTENSIONS):
+            return jsonify({"message": "Unsupported file type"}), 400
+
+        session_id = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:6]}"
+        os.makedirs(os.path.join(SESSIONS_DIR, session_id))
+        video_path = os.path.join(UPLOADS_DIR, f"{session_id}-{secure_filename(video.filename)}")
+        video.save(video_path)
+
+        try:
+            job_id = jobs.submit(video_path, session_id, mode)
+        except queue.Full:
+            os.remove(video_path)
+            shutil.rmtree(os.path.join(SESSIONS_DIR, session_id), ignore_errors=True)
+            return jsonify({"message": "Server is busy, try again later"}), 503
+        return jsonify({"jobId": job_id, "sessionId": session_id, "mode": mode, "status": "queued"}), 202
+
+    @app.get("/jobs/<job_id>")
+    def job_status(job_id):
+        job = jobs.status(job_id)
+        if job is None:
+            return jsonify({"message": "Job not found"}), 404
+        return jsonify(job)
+
+    @app.get("/sessions/<session_id>/<path:file_name>")
+    def session_file(session_id, file_name):
+        session_dir = os.path.join(SESSIONS_DIR, secure_filename(session_id))
+        if not os.path.exists(os.path.join(session_dir, file_name)):
+            extract_labeled_frame(session_dir, file_name)
+        # send_from_directory תומך ב-Range, כך שהדפדפן יכול לדלג בסרטון
+        return send_from_directory(session_dir, file_name, as_attachment=file_name == "graph_custom.png")
+
+    @app.post("/generate-graph")
+    def generate_graph():
+        body = request.get_json(silent=True) or {}
+        session_id = secure_filename(str(body.get("sessionId", "")))
+        session_dir = os.path.join(SESSIONS_DIR, session_id)
+        if not session_id or not os.path.isdir(session_dir):
+            return jsonify({"message": "Session not found"}), 404
+
+        tracks_path = os.path.join(session_dir, "tracks.cols")
+        if not os.path.exists(tracks_path):
+            csv_name = TRACKS_CSV_NAMES.get(body.get("mode"), "simple_tracks.csv")
+            tracks_path = os.path.join(session_dir, csv_name)
+            if not os.path.exists(tracks_path):
+                return jsonify({"message": f"{csv_name} not found"}), 404
+
+        try:
+            limit = int(body["limit"]) if body.get("limit") else None
+            min_duration = int(body["minDuration"]) if body.get("minDuration") else None
+            track_ids = [int(i) for i in body["trackIds"]] if body.get("trackIds") else None
+            forced_ids = [int(i) for i in body["forcedIds"]] if body.get("forcedIds") else None
+        except (TypeError, ValueError):
+            return jsonify({"message": "Invalid graph parameters"}), 400
+
+        # טבלת המסלולים והתמונות נשמרות בזיכרון - בקשה חוזרת לא מציירת מחדש
+        try:
+            render_graph(tracks_path, os.path.join(session_dir, "graph_custom.png"), preset=body.get("preset"),
+                         limit=limit, speed_category=body.get("speedCategory"), min_duration=min_duration,
+                         track_ids=track_ids, forced_ids=forced_ids)
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+        return jsonify({"graph": f"/sessions/{session_id}/graph_custom.png"})
+
+    return app
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    max_queued = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+
+    os.makedirs(UPLOADS_DIR, exist_ok=True)
+    os.makedirs(SESSIONS_DIR, exist_ok=True)
+
+    app = create_app(JobQueue(workers=workers, max_queued=max_queued))
+    print(f"[INFO] Server running at http://localhost:{port} ({workers} workers)")
+    app.run(host="0.0.0.0", port=port, threaded=True)
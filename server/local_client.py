@@ -0,0 +1,101 @@
+"""
+Local test client for analysis_server.py: uploads a video, polls the job until
+it finishes, downloads the results and (for tracking modes) asks for a custom graph.
+Only uses the standard library.
+
+Usage: python local_client.py <input_video> <mode> [server_url] [graph_limit]
+"""
+import json
+import mimetypes
+import os
+import sys
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+DEFAULT_URL = "http://localhost:5000"
+
+
+def _request(url, data=None, headers=None):
+    req = urllib.request.Request(url, data=data, headers=headers or {})
+    try:
+        with urllib.request.urlopen(req) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def _multipart(fields, file_field, file_path):
+    boundary = uuid.uuid4().hex
+    lines = []
+    for name, value in fields.items():
+        lines.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    content_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+    lines.append((f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; '
+                  f'filename="{os.path.basename(file_path)}"\r\nContent-Type: {content_type}\r\n\r\n').encode())
+    with open(file_path, "rb") as f:
+        lines.append(f.read())
+    lines.append(f"\r\n--{boundary}--\r\n".encode())
+    return b"".join(lines), f"multipart/form-data; boundary={boundary}"
+
+
+def upload(server_url, video_path, mode):
+    body, content_type = _multipart({"mode": mode}, "video", video_path)
+    status, payload = _request(f"{server_url}/upload", body, {"Content-Type": content_type})
+    if status != 202:
+        raise RuntimeError(f"Upload failed ({status}): {payload.decode(errors='replace')}")
+    return json.loads(payload)
+
+
+def wait_for_job(server_url, job_id, poll_seconds=1.0, timeout=3600):
+    start = time.time()
+    last_stages = None
+    while time.time() - start < timeout:
+        status, payload = _request(f"{server_url}/jobs/{job_id}")
+        if status != 200:
+            raise RuntimeError(f"Polling failed ({status}): {payload.decode(errors='replace')}")
+        job = json.loads(payload)
+        if job["stages"] != last_stages:
+            last_stages = job["stages"]
+            print(f"[INFO] {job['status']}: {', '.join(last_stages) or 'waiting'}")
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(poll_seconds)
+    raise TimeoutError(f"Job {job_id} did not finish in {timeout}s")
+
+
+def main(video_path, mode, server_url=DEFAULT_URL, graph_limit=None):
+    started = time.time()
+    submitted = upload(server_url, video_path, mode)
+    print(f"[INFO] Job {submitted['jobId']} queued (session {submitted['sessionId']})")
+
+    job = wait_for_job(server_url, submitted["jobId"])
+    if job["status"] == "failed":
+        print(f" Job failed: {job.get('error')}")
+        return 1
+
+    result = job["result"]
+    for key in ("video", "summaryCSV", "graph", "rawTracksCSV", "zip"):
+        if key in result:
+            status, payload = _request(f"{server_url}{result[key]}")
+            print(f"[OUTPUT] {key}: {result[key]} ({status}, {len(payload)} bytes)")
+    print(f"[OUTPUT] Labeled frames: {len(result.get('frameFiles', []))}")
+
+    if graph_limit and mode != "detection":
+        body = json.dumps({"sessionId": result["sessionId"], "limit": graph_limit, "mode": mode}).encode()
+        status, payload = _request(f"{server_url}/generate-graph", body, {"Content-Type": "application/json"})
+        print(f"[OUTPUT] Custom graph ({status}): {payload.decode(errors='replace')}")
+
+    print(f"[INFO] Finished in {time.time() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4, 5):
+        print("Usage: python local_client.py <input_video> <mode> [server_url] [graph_limit]")
+        sys.exit(1)
+
+    url = sys.argv[3] if len(sys.argv) > 3 else DEFAULT_URL
+    limit = int(sys.argv[4]) if len(sys.argv) > 4 else None
+    sys.exit(main(sys.argv[1], sys.argv[2], url, limit))